@@ -0,0 +1,321 @@
+"""Load test for the POV backend.
+
+Drives POST /api/generate-pov at a fixed arrival rate while listing
+/api/tasks, then reports request latency percentiles, end-to-end video
+latency, throughput and the server's thread count and RSS.
+
+By default it starts the mock providers (src/mock_providers.py) and a
+backend pointed at them, with a throwaway database, so nothing is billed:
+
+    python benchmarks/load_test.py --rate 20 --duration 60 --json run.json
+    POV_WORKFLOW_ENGINE=asyncio python benchmarks/load_test.py --baseline run.json
+
+POV_* variables in the environment are passed on to the spawned backend and
+mock servers (e.g. POV_WORKERS, POV_MOCK_RUNWAY_RENDER_TIME). --gunicorn runs
+the backend the way production does, and --webhooks has the mock Runway
+report finished renders by signed callback instead of being polled for them.
+Use --url and --pid to measure a backend
+that is already running. Threads and RSS include the child processes of
+the sampled pid, i.e. the gunicorn workers.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(values):
+    return {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99)}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_stats(pid):
+    """Thread count and RSS (MiB) of a local process plus its children (gunicorn workers), from /proc (Linux only)."""
+    stats = {}
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    for process_id in [pid] + children:
+        try:
+            with open(f"/proc/{process_id}/status") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key == "Threads":
+                        stats["threads"] = stats.get("threads", 0) + int(value)
+                    elif key == "VmRSS":
+                        stats["rss_mb"] = stats.get("rss_mb", 0) + int(value.split()[0]) / 1024
+        except OSError:
+            pass
+    return stats
+
+
+def wait_for(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn_servers(workdir, use_gunicorn=False, webhooks=False):
+    """Starts the mock providers and a backend using them; returns (backend_url, backend_process, processes)."""
+    mock_port, backend_port = free_port(), free_port()
+    backend_url = f"http://127.0.0.1:{backend_port}"
+    env = dict(os.environ)
+    if webhooks:
+        env.update({
+            "POV_RUNWAY_WEBHOOK_SECRET": "load-test",
+            "POV_MOCK_RUNWAY_WEBHOOK_SECRET": "load-test",
+            "POV_MOCK_RUNWAY_WEBHOOK_URL": f"{backend_url}/api/webhooks/runway",
+        })
+    mock = subprocess.Popen([sys.executable, "-m", "src.mock_providers", "--port", str(mock_port)],
+                            cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL)
+    env.update({
+        "PORT": str(backend_port),
+        "POV_MOCK_PROVIDERS_URL": f"http://127.0.0.1:{mock_port}",
+        "DATABASE_URL": env.get("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}"),
+        "POV_IMAGE_STORE_DIR": env.get("POV_IMAGE_STORE_DIR", os.path.join(workdir, "images")),
+        "POV_VIDEO_STORE_DIR": env.get("POV_VIDEO_STORE_DIR", os.path.join(workdir, "videos")),
+    })
+    env.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+    command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "src.wsgi:app"] if use_gunicorn \
+        else [sys.executable, os.path.join("src", "main.py")]
+    backend = subprocess.Popen(command,
+                               cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{mock_port}/v1/tasks/none")
+    wait_for(f"{backend_url}/api/health")
+    return backend_url, backend, [backend, mock]
+
+
+async def run_load(url, rate, duration, list_rate, pid, drain_timeout):
+    submit_latencies, submit_statuses, list_latencies = [], {}, []
+    samples = []
+    task_ids = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+
+        async def submit(i):
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/generate-pov", json={"scene_description": f"Benchmark scene {i} {time.time()}"})
+                status = response.status_code
+                if status == 202:
+                    task_ids.append(response.json()["task_id"])
+            except httpx.HTTPError:
+                status = "error"
+            submit_latencies.append(time.perf_counter() - started)
+            submit_statuses[status] = submit_statuses.get(status, 0) + 1
+
+        async def list_tasks(stop_at):
+            while time.monotonic() < stop_at:
+                started = time.perf_counter()
+                try:
+                    await client.get("/api/tasks", params={"view": "summary", "limit": 100})
+                    list_latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(1 / list_rate)
+
+        async def sample(stop):
+            while not stop.is_set():
+                if pid:
+                    samples.append(process_stats(pid))
+                await asyncio.sleep(1)
+
+        stop_sampling = asyncio.Event()
+        sampler = asyncio.create_task(sample(stop_sampling))
+        started = time.monotonic()
+        lister = asyncio.create_task(list_tasks(started + duration)) if list_rate > 0 else None
+        requests_in_flight = []
+        for i in range(int(rate * duration)):
+            await asyncio.sleep(max(0, started + i / rate - time.monotonic()))
+            requests_in_flight.append(asyncio.create_task(submit(i)))
+        await asyncio.gather(*requests_in_flight)
+        if lister:
+            await lister
+        load_seconds = time.monotonic() - started
+
+        # Let admitted videos finish, then read their timings back from the task listing.
+        tasks = await collect_tasks(client, set(task_ids), drain_timeout)
+        stop_sampling.set()
+        await sampler
+        metrics = await scrape_metrics(client)
+
+    return {
+        "submit_latencies": submit_latencies,
+        "submit_statuses": submit_statuses,
+        "list_latencies": list_latencies,
+        "tasks": tasks,
+        "samples": samples,
+        "load_seconds": load_seconds,
+        "metrics": metrics,
+    }
+
+
+async def scrape_metrics(client):
+    """Unlabelled samples of /api/metrics as {name: value} (one worker's view under gunicorn)."""
+    try:
+        response = await client.get("/api/metrics")
+    except httpx.HTTPError:
+        return {}
+    metrics = {}
+    for line in response.text.splitlines():
+        name, _, value = line.partition(" ")
+        if line.startswith("#") or "{" in name:
+            continue
+        try:
+            metrics[name] = float(value)
+        except ValueError:
+            pass
+    return metrics
+
+
+async def collect_tasks(client, task_ids, drain_timeout):
+    deadline = time.monotonic() + drain_timeout
+    while True:
+        tasks, cursor = {}, None
+        while True:
+            params = {"view": "summary", "limit": 500}
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get("/api/tasks", params=params)
+            for task in response.json():
+                if task["id"] in task_ids:
+                    tasks[task["id"]] = task
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        unfinished = [task for task in tasks.values() if task["status"] not in ("completed", "error")]
+        if not unfinished or time.monotonic() >= deadline:
+            return list(tasks.values())
+        await asyncio.sleep(2)
+
+
+def build_report(raw, rate, duration):
+    tasks = raw["tasks"]
+    finished = [task for task in tasks if task["status"] in ("completed", "error")]
+    completed = [task for task in tasks if task["status"] == "completed"]
+    end_to_end = [task["updated_at"] - task["created_at"] for task in completed]
+    by_status = {}
+    for task in tasks:
+        by_status[task["status"]] = by_status.get(task["status"], 0) + 1
+    span = (max(task["updated_at"] for task in finished) - min(task["created_at"] for task in finished)) if finished else 0
+    samples = [sample for sample in raw["samples"] if sample]
+    polls, videos = raw["metrics"].get("pov_runway_polls_per_video_sum"), raw["metrics"].get("pov_runway_polls_per_video_count")
+    return {
+        "target_rate": rate,
+        "duration": duration,
+        "submit_latency": summarize(raw["submit_latencies"]),
+        "submit_statuses": {str(status): count for status, count in raw["submit_statuses"].items()},
+        "list_latency": summarize(raw["list_latencies"]),
+        "end_to_end_latency": summarize(end_to_end),
+        "tasks_by_status": by_status,
+        "submit_throughput": raw["submit_statuses"].get(202, 0) / raw["load_seconds"],
+        "completion_throughput": len(completed) / span if span else 0,
+        "peak_threads": max((sample.get("threads", 0) for sample in samples), default=None),
+        "peak_rss_mb": max((sample.get("rss_mb", 0) for sample in samples), default=None),
+        "runway_checks_per_video": polls / videos if videos else None,
+    }
+
+
+def format_seconds(value):
+    return "-" if value is None else f"{value * 1000:.1f} ms" if value < 1 else f"{value:.2f} s"
+
+
+def print_report(report, baseline=None):
+    def delta(path):
+        if baseline is None:
+            return ""
+        new, old = report, baseline
+        for key in path:
+            new, old = (new or {}).get(key), (old or {}).get(key)
+        if not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or not old:
+            return ""
+        return f"  ({(new - old) / old * 100:+.1f}% vs baseline)"
+
+    print(f"Target rate {report['target_rate']}/s for {report['duration']}s")
+    for name in ("submit_latency", "list_latency", "end_to_end_latency"):
+        stats = report[name]
+        print(f"{name:>20}: n={stats['count']}")
+        for pct in ("p50", "p95", "p99"):
+            print(f"{pct:>24} {format_seconds(stats[pct])}{delta((name, pct))}")
+    print(f"{'submit statuses':>20}: {report['submit_statuses']}")
+    print(f"{'tasks by status':>20}: {report['tasks_by_status']}")
+    print(f"{'accepted':>20}: {report['submit_throughput']:.2f}/s{delta(('submit_throughput',))}")
+    print(f"{'completions':>20}: {report['completion_throughput']:.2f}/s{delta(('completion_throughput',))}")
+    print(f"{'peak threads':>20}: {report['peak_threads']}{delta(('peak_threads',))}")
+    checks = report["runway_checks_per_video"]
+    print(f"{'runway checks/video':>20}: {'-' if checks is None else f'{checks:.2f}'}{delta(('runway_checks_per_video',))}")
+    rss = report["peak_rss_mb"]
+    print(f"{'peak RSS':>20}: {'-' if rss is None else f'{rss:.1f} MiB'}{delta(('peak_rss_mb',))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=10, help="submissions per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--list-rate", type=float, default=2, help="GET /api/tasks per second during the load")
+    parser.add_argument("--drain-timeout", type=float, default=300, help="seconds to wait for admitted videos to finish")
+    parser.add_argument("--url", help="backend to measure instead of spawning one with mock providers")
+    parser.add_argument("--pid", type=int, help="backend process id, for thread and RSS samples with --url")
+    parser.add_argument("--gunicorn", action="store_true", help="spawn the backend under gunicorn instead of the Flask dev server")
+    parser.add_argument("--webhooks", action="store_true", help="have the mock Runway send completion callbacks")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report from an earlier run to compare against")
+    args = parser.parse_args()
+
+    processes = []
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            url, pid = args.url, args.pid
+            if url is None:
+                url, backend, processes = spawn_servers(workdir, args.gunicorn, args.webhooks)
+                pid = backend.pid
+            raw = asyncio.run(run_load(url, args.rate, args.duration, args.list_rate, pid, args.drain_timeout))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+    report = build_report(raw, args.rate, args.duration)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Cold start benchmark for the POV backend.
+
+Starts fresh interpreters that import src.main, build the app and answer a
+first GET /api/health, and reports how long that took. The slowest imports
+come from ``python -X importtime``. Exits with status 1 when the median
+startup exceeds the budget or a lazily loaded module was imported at
+startup, so it can gate CI:
+
+    python benchmarks/startup_time.py --runs 5 --budget-ms 1000
+
+POV_* variables in the environment are passed on to the measured process.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use only; loading any of them at startup is a regression.
+LAZY_MODULES = ("googleapiclient", "google.oauth2", "google_auth_httplib2", "httplib2", "httpx")
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from src.main import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+status = app.test_client().get("/api/health").status_code
+answered = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "create_app": created - imported,
+    "first_request": answered - created,
+    "total": answered - started,
+    "status": status,
+    "lazy_loaded": [name for name in LAZY_MODULES if name in sys.modules],
+}))
+"""
+
+
+def measure(workdir, importtime=False):
+    """Runs one cold start; returns (timings, stderr)."""
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": env.get("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'startup.db')}"),
+        "POV_RESUME_TASKS": "false",
+    })
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    script = f"LAZY_MODULES = {LAZY_MODULES!r}\n{STARTUP_SCRIPT}"
+    result = subprocess.run(command + ["-c", script], cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime_output, count):
+    """Top-level imports by cumulative time (microseconds), from -X importtime output."""
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Direct imports of the measured script are the least indented ones.
+        if len(name) - len(name.lstrip()) <= 3:
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to measure")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("POV_STARTUP_BUDGET_MS", 1000)),
+                        help="maximum median time to the first /api/health response")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = [measure(workdir)[0] for _ in range(args.runs)]
+        _, importtime_output = measure(workdir, importtime=True)
+
+    report = {phase: statistics.median(run[phase] for run in runs) for phase in ("import", "create_app", "first_request", "total")}
+    report["budget"] = args.budget_ms / 1000
+    report["lazy_loaded"] = sorted({name for run in runs for name in run["lazy_loaded"]})
+    report["slowest_imports"] = [{"module": name, "seconds": cumulative / 1e6}
+                                 for cumulative, name in slowest_imports(importtime_output, args.top)]
+
+    print(f"Cold start, median of {args.runs} runs")
+    for phase in ("import", "create_app", "first_request", "total"):
+        print(f"{phase:>15}: {report[phase] * 1000:.1f} ms")
+    print(f"{'budget':>15}: {args.budget_ms:.0f} ms")
+    print("Slowest imports:")
+    for entry in report["slowest_imports"]:
+        print(f"{entry['seconds'] * 1000:>10.1f} ms  {entry['module']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if report["lazy_loaded"]:
+        print(f"Loaded at startup but meant to be lazy: {', '.join(report['lazy_loaded'])}")
+        failed = True
+    if report["total"] > report["budget"]:
+        print(f"Startup took {report['total'] * 1000:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
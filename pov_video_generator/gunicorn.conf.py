@@ -0,0 +1,44 @@
+# Gunicorn settings for the POV backend: gunicorn -c gunicorn.conf.py src.wsgi:app
+#
+# Each worker process builds its own app after the fork (no preload), so the
+# worker pool, Runway poller and other background threads start in the worker
+# that uses them. Tasks live in the shared SQL task store and are leased per
+# process, so a worker that dies has its tasks resumed by another one.
+import multiprocessing
+import os
+import signal
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Threaded workers: SSE streams and long-polls hold a thread while they wait.
+worker_class = "gthread"
+threads = int(os.environ.get("POV_GUNICORN_THREADS", 16))
+timeout = 120
+keepalive = 5
+
+_shutdown_timeout = float(os.environ.get("POV_SHUTDOWN_TIMEOUT", 25))
+# Open requests finish first, then worker_exit drains the workflows.
+graceful_timeout = int(_shutdown_timeout) + 15
+
+if os.environ.get("POV_TASK_STORE") == "memory" and workers > 1:
+    print("POV_TASK_STORE=memory keeps tasks per process; running a single worker.")
+    workers = 1
+
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    # Gunicorn's SIGTERM handler only stops the accept loop; also stop
+    # admitting workflows and end open task streams so the worker can exit.
+    from src.workflow import begin_shutdown
+
+    def handle_exit(sig, frame):
+        begin_shutdown()
+        worker.handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_exit)
+
+
+def worker_exit(server, worker):
+    from src.workflow import shutdown_workflows
+    shutdown_workflows(_shutdown_timeout)
@@ -0,0 +1,95 @@
+import asyncio
+
+import httpx
+
+from src.http_client import http_request_async
+from src.integrations import (
+    OPENAI_CHAT_COMPLETIONS_URL,
+    RUNWAY_API_BASE_URL,
+    build_gpt4_prompt_request,
+    parse_gpt4_prompt_response,
+    build_runway_video_request,
+    parse_runway_video_response,
+    build_runway_status_headers,
+    format_error_details,
+    generate_image_with_flux,
+    download_runway_video,
+    add_to_google_sheet,
+    send_email_with_gmail,
+    prepare_gmail_service,
+)
+
+# asyncio variants of the functions in integrations.py. They take a shared
+# httpx.AsyncClient and return the same values (or {"error": ...} dicts).
+
+async def request_gpt4_completion_async(client, headers, data, timeout):
+    """Returns the completion text of a (non-streamed) chat request."""
+    response = await http_request_async(client, "openai", "POST", OPENAI_CHAT_COMPLETIONS_URL, headers=headers, json=data, timeout=timeout)
+    response.raise_for_status()
+    return parse_gpt4_prompt_response(response.json())
+
+async def generate_prompt_with_gpt4_async(client, scene_description, api_key):
+    """Generates a detailed prompt using OpenAI GPT-4."""
+    headers, data = build_gpt4_prompt_request(scene_description, api_key)
+    try:
+        return await request_gpt4_completion_async(client, headers, data, 30)
+    except httpx.HTTPStatusError as http_err:
+        return {"error": f"OpenAI API request failed with HTTPError: {str(http_err)} - Details: {http_err.response.text}"}
+    except httpx.HTTPError as e:
+        return {"error": f"OpenAI API request failed: {str(e)}"}
+    except (KeyError, IndexError, ValueError) as e:
+        return {"error": f"Failed to parse OpenAI API response: {str(e)}"}
+
+async def generate_image_with_flux_async(client, prompt, api_key):
+    """Generates an image using HuggingFace FLUX and returns the URL of the stored copy."""
+    # Streams to disk with blocking writes, so it runs on the default executor;
+    # the "flux" stage limit keeps the number of such threads small.
+    return await asyncio.to_thread(generate_image_with_flux, prompt, api_key)
+
+async def download_runway_video_async(client, video_url):
+    """Downloads a finished Runway video into the local video store and returns its name."""
+    # Like FLUX images, the video is streamed to disk with blocking writes on the default executor.
+    return await asyncio.to_thread(download_runway_video, video_url)
+
+async def create_video_with_runway_async(client, image_url_param, prompt, api_key):
+    """Initiates video generation with RunwayML using an image and returns a task ID."""
+    headers, data = build_runway_video_request(image_url_param, prompt, api_key)
+    try:
+        response = await http_request_async(client, "runway", "POST", f"{RUNWAY_API_BASE_URL}/image_to_video", headers=headers, json=data, timeout=60)
+        response.raise_for_status()
+        return parse_runway_video_response(response.json())
+    except httpx.HTTPStatusError as http_err:
+        error_details = format_error_details(http_err.response.text)
+        return {"error": f"RunwayML API request failed with HTTPError: {str(http_err)} - Details: {error_details}"}
+    except httpx.HTTPError as e:
+        return {"error": f"RunwayML API request failed: {str(e)}"}
+    except KeyError as e:
+        return {"error": f"Failed to parse RunwayML API response for task creation: {str(e)} - Response: {response.text}"}
+
+async def check_runway_video_status_async(client, task_id, api_key):
+    """Checks the status of a video generation task on RunwayML."""
+    headers = build_runway_status_headers(api_key)
+    try:
+        response = await http_request_async(client, "runway", "GET", f"{RUNWAY_API_BASE_URL}/tasks/{task_id}", headers=headers, timeout=30)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as http_err:
+        error_details = format_error_details(http_err.response.text)
+        return {"error": f"RunwayML API status check failed with HTTPError: {str(http_err)} - Details: {error_details}"}
+    except httpx.HTTPError as e:
+        return {"error": f"RunwayML API status check failed: {str(e)}"}
+
+# The Google client libraries are blocking only, so these run on the default
+# executor. They happen once per video, unlike the Runway polling.
+
+async def add_to_google_sheet_async(spreadsheet_id, range_name, values):
+    """Adds a new row to a Google Sheet. Relies on GOOGLE_APPLICATION_CREDENTIALS env var."""
+    return await asyncio.to_thread(add_to_google_sheet, spreadsheet_id, range_name, values)
+
+async def send_email_with_gmail_async(recipient_email, subject, body_text):
+    """Sends an email using Gmail API. Relies on GOOGLE_APPLICATION_CREDENTIALS env var."""
+    return await asyncio.to_thread(send_email_with_gmail, recipient_email, subject, body_text)
+
+async def prepare_gmail_service_async():
+    """Builds the Gmail client and refreshes its token ahead of the first notification; never raises."""
+    await asyncio.to_thread(prepare_gmail_service)
@@ -0,0 +1,358 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+import httpx
+
+from src.async_integrations import (
+    generate_prompt_with_gpt4_async,
+    generate_image_with_flux_async,
+    create_video_with_runway_async,
+    check_runway_video_status_async,
+    send_email_with_gmail_async,
+    prepare_gmail_service_async,
+    download_runway_video_async,
+)
+from src.credentials_manager import get_credentials
+from src.http_client import get_http_settings
+from src.result_cache import get_result_cache, prompt_cache_key, image_cache_key, video_cache_key
+from src.runway_poller import RUNWAY_TERMINAL_STATUSES, PollSchedule, RunwayPollError, get_poller_settings, polls_per_video, render_times
+from src.stage_graph import StageGraph
+from src.task_store import get_task_store
+from src.worker_pool import ClientQuotaError, QueueFullError, PoolClosedError
+from src.workflow import (
+    worker_settings,
+    stage_limiter,
+    runway_fallback_interval,
+    begin_workflow,
+    start_step,
+    update_step,
+    update_task,
+    fail_workflow,
+    complete_stage,
+    extract_video_url,
+    should_update_sheet,
+    should_send_email,
+    queue_sheet_row,
+    build_notification_email,
+    record_notification_result,
+    finish_task,
+    hand_off_task,
+    keep_stored_video,
+    video_store_settings,
+)
+
+
+class AsyncWorkflowEngine:
+    """Runs workflows as coroutines on a single event loop owned by a background thread.
+
+    A pipeline waiting on Runway is just a sleeping coroutine, so the number of
+    concurrent videos is bounded by ``max_pipelines`` rather than by threads.
+    There is no queue to schedule fairly: each client may run at most
+    ``client_max_in_flight`` pipelines and is refused beyond that.
+
+    Task store and result cache calls block (SQLite commits), so pipelines
+    make them through ``blocking``, on ``store_workers`` threads of their
+    own, and the loop keeps serving the other pipelines meanwhile.
+    """
+
+    def __init__(self, max_pipelines, stage_limits, poller_settings, limiter=None, client_max_in_flight=0, store_workers=4):
+        self.max_pipelines = max_pipelines
+        self.client_max_in_flight = client_max_in_flight
+        self.stage_limits = dict(stage_limits)
+        # Shared with the threaded workflow for rate tokens and saturation stats.
+        self.limiter = limiter
+        self.poller_settings = dict(poller_settings)
+        self.client = None
+        self._loop = None
+        self._thread = None
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._client_in_flight = {}
+        self._closed = False
+        self._runway_callbacks = {}
+        self._store_pool = ThreadPoolExecutor(store_workers, thread_name_prefix="pov-async-store")
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="pov-async-engine", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in self.stage_limits.items()}
+        http_settings = get_http_settings()
+        self.client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=http_settings["pool_size"] * len(self.stage_limits),
+            max_keepalive_connections=http_settings["pool_size"],
+        ))
+        ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self.client.aclose())
+        self._loop.close()
+
+    def submit(self, coro_fn, *args, client=None, admitted=False):
+        """Starts ``coro_fn(engine, *args)``; ``admitted`` work (the tasks of an accepted batch) skips the client quota."""
+        with self._lock:
+            if self._closed:
+                raise PoolClosedError("Async workflow engine is shutting down.")
+            if self._in_flight >= self.max_pipelines:
+                raise QueueFullError(self._in_flight, self.max_pipelines)
+            running = self._client_in_flight.get(client, 0)
+            if not admitted and client is not None and self.client_max_in_flight and running >= self.client_max_in_flight:
+                raise ClientQuotaError(client, self.client_max_in_flight)
+            self._ensure_started()
+            self._in_flight += 1
+            self._client_in_flight[client] = running + 1
+        return asyncio.run_coroutine_threadsafe(self._run(coro_fn, client, *args), self._loop)
+
+    async def _run(self, coro_fn, client, *args):
+        try:
+            await coro_fn(self, *args)
+        except Exception as e:
+            print(f"Unhandled error in async workflow: {e}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._client_in_flight[client] -= 1
+                if not self._client_in_flight[client]:
+                    del self._client_in_flight[client]
+
+    async def blocking(self, fn, *args, **kwargs):
+        """Runs a blocking task store or result cache call off the event loop and returns its result."""
+        return await self._loop.run_in_executor(self._store_pool, partial(fn, *args, **kwargs))
+
+    @asynccontextmanager
+    async def slot(self, stage):
+        semaphore = self._semaphores.get(stage)
+        if semaphore is None:
+            yield
+            return
+        if self.limiter is None:
+            async with semaphore:
+                yield
+            return
+        started = self.limiter.begin_wait(stage)
+        async with semaphore:
+            await asyncio.sleep(self.limiter.reserve(stage))
+            self.limiter.end_wait(stage, started)
+            try:
+                yield
+            finally:
+                self.limiter.release(stage)
+
+    def expect_runway_callback(self, runway_task_id):
+        """Returns a loop future that deliver_runway_callback resolves with the final status of the task."""
+        future = self._loop.create_future()
+        with self._lock:
+            self._runway_callbacks[runway_task_id] = future
+        return future
+
+    def forget_runway_callback(self, runway_task_id):
+        with self._lock:
+            self._runway_callbacks.pop(runway_task_id, None)
+
+    def deliver_runway_callback(self, runway_task_id, response):
+        """Hands a final status received by callback to the pipeline polling that task; False if there is none."""
+        with self._lock:
+            future = self._runway_callbacks.get(runway_task_id)
+        if future is None:
+            return False
+        self._loop.call_soon_threadsafe(lambda: future.done() or future.set_result(response))
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": self._in_flight, "max_pipelines": self.max_pipelines}
+
+    def close(self):
+        """Refuses new workflows; running ones carry on."""
+        with self._lock:
+            self._closed = True
+
+    def shutdown(self):
+        """Stops the event loop; workflows still running are abandoned."""
+        self.close()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self._store_pool.shutdown(wait=False, cancel_futures=True)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_async_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncWorkflowEngine(
+                worker_settings["async_max_pipelines"],
+                worker_settings["stage_limits"],
+                dict(get_poller_settings(), fallback_interval=runway_fallback_interval),
+                stage_limiter,
+                worker_settings["client_max_in_flight"],
+                worker_settings["async_store_workers"],
+            )
+        return _engine
+
+def deliver_runway_callback(runway_task_id, response):
+    """deliver_runway_callback of the engine, if one is running in this process."""
+    return _engine is not None and _engine.deliver_runway_callback(runway_task_id, response)
+
+async def poll_runway_async(engine, task_id, runway_task_id, runway_api_key, submitted_at=None):
+    """Waits for a Runway task on the same schedule as RunwayPoller and returns its final status."""
+    settings = engine.poller_settings
+    schedule = PollSchedule(render_times, submitted_at, settings["base_interval"], settings["max_interval"],
+                            settings["backoff"], settings["jitter"], settings["timeout"], settings.get("fallback_interval"))
+    callback = engine.expect_runway_callback(runway_task_id)
+    current_runway_status = None
+    try:
+        while True:
+            try:
+                status_response = await asyncio.wait_for(asyncio.shield(callback), schedule.next_delay())
+                delivered = True
+            except asyncio.TimeoutError:
+                async with engine.slot("runway"):
+                    status_response = await check_runway_video_status_async(engine.client, runway_task_id, runway_api_key)
+                delivered = False
+            if isinstance(status_response, dict) and "error" in status_response:
+                schedule.record(None)
+                raise RunwayPollError(f"RunwayML Status Check Error: {status_response['error']}")
+            previous_status, current_runway_status = current_runway_status, status_response.get("status")
+            schedule.record(current_runway_status, delivered)
+            if current_runway_status != previous_status:
+                await engine.blocking(update_step, task_id, current_runway_status=current_runway_status) # Log current status
+            if current_runway_status in RUNWAY_TERMINAL_STATUSES:
+                return status_response
+            if schedule.time_left() <= 0:
+                raise RunwayPollError("RunwayML video generation timed out after polling.")
+    finally:
+        engine.forget_runway_callback(runway_task_id)
+        polls_per_video.observe(schedule.polls)
+
+async def run_pov_workflow_async(engine, task_id, scene_description, detailed_prompt=None):
+    try:
+        credentials = get_credentials()
+        if not await engine.blocking(begin_workflow, task_id, credentials):
+            return
+        openai_api_key = credentials.get("openai")
+        huggingface_api_key = credentials.get("huggingface")
+        runway_api_key = credentials.get("runwayml")
+
+        cache = get_result_cache()
+
+        # 1. Generate Prompt with GPT-4 (already done when the task came in a batch)
+        async def prompt_stage():
+            await engine.blocking(start_step, task_id, "GPT-4 Prompt Generation")
+            if detailed_prompt is not None:
+                await engine.blocking(complete_stage, task_id, detailed_prompt)
+                prompt = detailed_prompt
+            else:
+                prompt_key = prompt_cache_key(scene_description)
+                prompt = await engine.blocking(cache.get, "prompt", prompt_key)
+                if prompt is None:
+                    async with engine.slot("openai"):
+                        prompt = await generate_prompt_with_gpt4_async(engine.client, scene_description, openai_api_key)
+                    if isinstance(prompt, dict) and "error" in prompt:
+                        raise Exception(f"GPT-4 Error: {prompt['error']}")
+                    await engine.blocking(cache.put, "prompt", prompt_key, prompt)
+                    await engine.blocking(complete_stage, task_id, prompt)
+                else:
+                    await engine.blocking(complete_stage, task_id, prompt, cached=True)
+            await engine.blocking(update_task, task_id, prompt=prompt)
+            return prompt
+
+        # 2. Generate Image with HuggingFace FLUX
+        async def image_stage(prompt):
+            await engine.blocking(start_step, task_id, "FLUX Image Generation")
+            image_key = image_cache_key(prompt)
+            image_url = await engine.blocking(cache.get, "image", image_key)
+            if image_url is None:
+                async with engine.slot("flux"):
+                    image_url = await generate_image_with_flux_async(engine.client, prompt, huggingface_api_key)
+                if isinstance(image_url, dict) and "error" in image_url:
+                    raise Exception(f"FLUX Image Generation Error: {image_url['error']}")
+                await engine.blocking(cache.put, "image", image_key, image_url)
+                await engine.blocking(complete_stage, task_id, image_url)
+            else:
+                await engine.blocking(complete_stage, task_id, image_url, cached=True)
+            await engine.blocking(update_task, task_id, image_url=image_url)
+            return image_url
+
+        # 3. Create Video with RunwayML; None when another worker took the task over.
+        async def video_stage(prompt, image_url):
+            await engine.blocking(start_step, task_id, "RunwayML Video Generation")
+            video_key = video_cache_key(image_url, prompt)
+            video_url = await engine.blocking(cache.get, "video", video_key)
+            if video_url is not None:
+                await engine.blocking(complete_stage, task_id, video_url, cached=True)
+            else:
+                async with engine.slot("runway"):
+                    runway_task_obj = await create_video_with_runway_async(engine.client, image_url, prompt, runway_api_key)
+                if isinstance(runway_task_obj, dict) and "error" in runway_task_obj:
+                    raise Exception(f"RunwayML Video Creation Error: {runway_task_obj['error']}")
+                runway_task_id = runway_task_obj.get("id") or runway_task_obj.get("uuid")
+                if not runway_task_id:
+                    raise Exception(f"RunwayML Video Creation did not return a task ID. Response: {json.dumps(runway_task_obj)}")
+                runway_submitted_at = time.time()
+                await engine.blocking(update_step, task_id, status="submitted", runway_task_id=runway_task_id)
+                await engine.blocking(update_task, task_id, runway_task_id=runway_task_id, runway_submitted_at=runway_submitted_at)
+
+                # 4. Check RunwayML Video Status (Polling)
+                await engine.blocking(start_step, task_id, "RunwayML Video Processing", status="polling")
+                status_response = await poll_runway_async(engine, task_id, runway_task_id, runway_api_key, runway_submitted_at)
+                if not await engine.blocking(get_task_store().hold, task_id):
+                    await engine.blocking(hand_off_task, task_id)
+                    return None
+                await engine.blocking(update_task, task_id, runway_result_at=time.time())
+                video_url = extract_video_url(status_response)
+                await engine.blocking(update_step, task_id, status="completed", output=video_url)
+                if video_store_settings["enabled"]:
+                    await engine.blocking(start_step, task_id, "Video Post-processing")
+                    async with engine.slot("video"):
+                        name = await download_runway_video_async(engine.client, video_url)
+                    video_url = await engine.blocking(keep_stored_video, task_id, video_url, name)
+                await engine.blocking(cache.put, "video", video_key, video_url)
+            await engine.blocking(update_task, task_id, video_url=video_url)
+            return video_url
+
+        async def notify_stage(prompt, image_url, video_url, gmail_client=None):
+            if video_url is None:
+                return
+            # 5. Add to Google Sheets
+            if should_update_sheet(credentials):
+                await engine.blocking(queue_sheet_row, task_id, credentials, scene_description, prompt, image_url, video_url)
+
+            # 6. Send Email with Gmail
+            if should_send_email(credentials):
+                await engine.blocking(start_step, task_id, "Gmail Notification")
+                email_subject, email_body = build_notification_email(scene_description, prompt, image_url, video_url)
+                email_response = await send_email_with_gmail_async(credentials["gmail_recipient"], email_subject, email_body)
+                await engine.blocking(record_notification_result, task_id, email_response, "Gmail")
+
+            await engine.blocking(finish_task, task_id, video_url)
+
+        graph = StageGraph()
+        graph.add("prompt", prompt_stage)
+        graph.add("image", image_stage, after=("prompt",))
+        graph.add("video", video_stage, after=("prompt", "image"))
+        if should_send_email(credentials):
+            # The Gmail client is built while the video is made, not after it.
+            graph.add("gmail_client", prepare_gmail_service_async)
+            graph.add("notify", notify_stage, after=("prompt", "image", "video", "gmail_client"))
+        else:
+            graph.add("notify", notify_stage, after=("prompt", "image", "video"))
+        await graph.run_async()
+
+    except Exception as e:
+        await engine.blocking(fail_workflow, task_id, str(e))
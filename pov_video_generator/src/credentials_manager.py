@@ -13,6 +13,10 @@ def get_credentials():
         # For Google JSON, its content will be read from GOOGLE_CREDENTIALS_JSON_CONTENT
         # and handled directly in main.py or integrations.py
     }
+    if os.environ.get("POV_MOCK_PROVIDERS_URL"):
+        # The mock providers accept any key
+        for key in ("openai", "huggingface", "runwayml"):
+            creds[key] = creds[key] or "mock"
     # Remove keys with None values to avoid issues if some are not set
     return {k: v for k, v in creds.items() if v is not None}
 
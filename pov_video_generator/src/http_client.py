@@ -0,0 +1,183 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.metrics import HistogramFamily
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def get_http_settings():
+    """Reads connection pool and retry settings for outbound integrations from the environment."""
+    return {
+        "pool_size": int(os.environ.get("POV_HTTP_POOL_SIZE", 10)),
+        "retries": int(os.environ.get("POV_HTTP_RETRIES", 3)),
+        "backoff": float(os.environ.get("POV_HTTP_BACKOFF", 0.5)),
+        "max_backoff": float(os.environ.get("POV_HTTP_MAX_BACKOFF", 30)),
+    }
+
+
+def is_retryable(method, status_code):
+    # A POST that failed with a 5xx may still have been executed by the provider
+    # (e.g. a paid Runway render), so only a 429 rejection is safe to resend.
+    if status_code not in RETRY_STATUS_CODES:
+        return False
+    return method.upper() != "POST" or status_code == 429
+
+
+def parse_retry_after(value):
+    """Returns the delay in seconds requested by a Retry-After header, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt, retry_after, settings):
+    if retry_after is not None:
+        return min(retry_after, settings["max_backoff"])
+    delay = settings["backoff"] * (2 ** attempt)
+    return min(delay * random.uniform(0.5, 1.5), settings["max_backoff"])
+
+
+class _ProviderRetry(Retry):
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if self.total is not None and self.total <= 0:
+            return False
+        return is_retryable(method, status_code)
+
+    def parse_retry_after(self, retry_after):
+        # urllib3 only accepts integer seconds or a date; also cap the wait.
+        seconds = parse_retry_after(retry_after)
+        return 0 if seconds is None else min(seconds, _settings["max_backoff"])
+
+
+_settings = get_http_settings()
+_sessions = {}
+_latency = HistogramFamily()
+_errors = {}
+_lock = threading.Lock()
+
+
+def get_latency_histogram(provider):
+    return _latency.labels(provider)
+
+
+def get_latency_histograms():
+    return _latency.snapshots()
+
+
+def record_provider_error(provider, reason):
+    """Counts a failed outbound call; ``reason`` is the HTTP status code or "exception"."""
+    with _lock:
+        key = (provider, str(reason))
+        _errors[key] = _errors.get(key, 0) + 1
+
+
+def get_error_counts():
+    """Returns {(provider, reason): count} for every outbound call that failed."""
+    with _lock:
+        return dict(_errors)
+
+
+def _record_response(provider, started, response):
+    get_latency_histogram(provider).observe(time.perf_counter() - started)
+    if response is None:
+        record_provider_error(provider, "exception")
+    elif response.status_code >= 400:
+        record_provider_error(provider, response.status_code)
+
+
+@contextmanager
+def provider_call(provider):
+    """Times a call made through another client library (e.g. the Google API client)."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_provider_error(provider, "exception")
+        raise
+    finally:
+        get_latency_histogram(provider).observe(time.perf_counter() - started)
+
+
+def get_session(provider):
+    """Returns the shared keep-alive session for a provider, creating it on first use."""
+    with _lock:
+        session = _sessions.get(provider)
+        if session is None:
+            retry = _ProviderRetry(
+                total=_settings["retries"],
+                connect=_settings["retries"],
+                read=0,
+                status=_settings["retries"],
+                backoff_factor=_settings["backoff"],
+                backoff_max=_settings["max_backoff"],
+                status_forcelist=RETRY_STATUS_CODES,
+                allowed_methods=None,
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_settings["pool_size"], max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[provider] = session
+        return session
+
+
+def http_request(provider, method, url, **kwargs):
+    """Sends a request through the provider's pooled session and records its latency."""
+    started = time.perf_counter()
+    response = None
+    try:
+        response = get_session(provider).request(method, url, **kwargs)
+        return response
+    finally:
+        _record_response(provider, started, response)
+
+
+async def http_request_async(client, provider, method, url, **kwargs):
+    """Async counterpart of http_request for an httpx.AsyncClient, with the same retry policy.
+
+    With ``stream=True`` the body is left unread and the caller closes the response.
+    """
+    stream = kwargs.pop("stream", False)
+    started = time.perf_counter()
+    response = None
+    try:
+        attempt = 0
+        while True:
+            if stream:
+                response = await client.send(client.build_request(method, url, **kwargs), stream=True)
+            else:
+                response = await client.request(method, url, **kwargs)
+            if attempt >= _settings["retries"] or not is_retryable(method, response.status_code):
+                return response
+            delay = retry_delay(attempt, parse_retry_after(response.headers.get("Retry-After")), _settings)
+            await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+    finally:
+        _record_response(provider, started, response)
+
+
+def close_sessions():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
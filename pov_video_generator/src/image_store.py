@@ -0,0 +1,118 @@
+import base64
+import hashlib
+import os
+import re
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMAGE_ROUTE = "/api/images/"
+IMAGE_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+IMAGE_CONTENT_TYPES = {extension: content_type for content_type, extension in IMAGE_EXTENSIONS.items()}
+_IMAGE_NAME = re.compile(r"^[0-9a-f]{64}\.(png|jpg|webp)$")
+
+
+def get_image_store_settings():
+    """Reads where generated images are kept and how they are addressed."""
+    return {
+        "root": os.environ.get("POV_IMAGE_STORE_DIR", os.path.join(BASE_DIR, "storage", "images")),
+        # Public address of this backend, e.g. https://pov-video-backend.onrender.com.
+        # Without it Runway gets the image inline as a data URI.
+        "public_base_url": os.environ.get("POV_PUBLIC_BASE_URL", "").rstrip("/"),
+        "max_bytes": int(os.environ.get("POV_IMAGE_MAX_BYTES", 10 * 1024 * 1024)),
+    }
+
+
+class ImageTooLargeError(Exception):
+    """Raised when a streamed image exceeds the configured size limit."""
+
+
+class LocalImageStore:
+    """Content-addressed image files on local disk.
+
+    Images are named by the sha256 of their bytes, so generating the same
+    image twice stores a single file. Bytes are hashed and written to disk as
+    they arrive; the file is renamed into place once complete.
+    """
+
+    def __init__(self, root, public_base_url="", max_bytes=10 * 1024 * 1024):
+        self.root = root
+        self.public_base_url = public_base_url
+        self.max_bytes = max_bytes
+
+    def path_for(self, name):
+        if not _IMAGE_NAME.match(name):
+            return None
+        return os.path.join(self.root, name[:2], name)
+
+    def put_stream(self, chunks, content_type):
+        """Stores an image from an iterable of byte chunks and returns its name ("<sha256>.<ext>")."""
+        extension = IMAGE_EXTENSIONS[content_type]
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageTooLargeError(f"Image is larger than {self.max_bytes} bytes.")
+                    digest.update(chunk)
+                    f.write(chunk)
+            name = f"{digest.hexdigest()}.{extension}"
+            path = self.path_for(name)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return name
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def url_for(self, name):
+        """URL the image is served at; relative to this backend unless a public base URL is set."""
+        return f"{self.public_base_url}{IMAGE_ROUTE}{name}"
+
+    def name_from_url(self, url):
+        """Returns the stored image name if ``url`` points at this store, else None."""
+        if not isinstance(url, str):
+            return None
+        prefix = f"{self.public_base_url}{IMAGE_ROUTE}"
+        if url.startswith(prefix):
+            name = url[len(prefix):]
+        elif url.startswith(IMAGE_ROUTE):
+            name = url[len(IMAGE_ROUTE):]
+        else:
+            return None
+        return name if self.path_for(name) else None
+
+    def data_uri(self, name):
+        extension = name.rsplit(".", 1)[1]
+        with open(self.path_for(name), "rb") as f:
+            encoded = base64.b64encode(f.read()).decode()
+        return f"data:{IMAGE_CONTENT_TYPES[extension]};base64,{encoded}"
+
+    def prompt_image(self, url):
+        """What to send Runway as ``promptImage`` for an image URL.
+
+        Images of this store are only reachable by Runway when a public base
+        URL is configured; otherwise they are inlined as a data URI.
+        """
+        name = self.name_from_url(url)
+        if name is None or (self.public_base_url and url.startswith(self.public_base_url)):
+            return url
+        return self.data_uri(name)
+
+
+_store = None
+
+def get_image_store():
+    global _store
+    if _store is None:
+        settings = get_image_store_settings()
+        _store = LocalImageStore(settings["root"], settings["public_base_url"], settings["max_bytes"])
+    return _store
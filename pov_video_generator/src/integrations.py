@@ -2,80 +2,280 @@ import requests
 import time
 import os
 import json
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+import threading
 import base64
 from email.mime.text import MIMEText
 
-# Placeholder functions for API interactions
-# Replace with actual API calls and error handling
+from src.http_client import http_request, provider_call
+from src.image_store import IMAGE_EXTENSIONS, ImageTooLargeError, get_image_store
+from src.video_store import GENERIC_CONTENT_TYPES, VIDEO_EXTENSIONS, VideoTooLargeError, get_video_store, get_video_store_settings
 
-def generate_prompt_with_gpt4(scene_description, api_key):
-    """Generates a detailed prompt using OpenAI GPT-4."""
+# Offline mode: every provider is served by src/mock_providers.py at this URL.
+MOCK_PROVIDERS_URL = os.environ.get("POV_MOCK_PROVIDERS_URL", "").rstrip("/")
+
+OPENAI_CHAT_COMPLETIONS_URL = f"{MOCK_PROVIDERS_URL or 'https://api.openai.com'}/v1/chat/completions"
+RUNWAY_API_BASE_URL = f"{MOCK_PROVIDERS_URL or 'https://api.runwayml.com'}/v1"
+RUNWAY_API_VERSION = "2024-11-06"
+GPT4_MODEL = "gpt-4" # Or use "gpt-3.5-turbo" if gpt-4 access is an issue
+GPT4_MAX_TOKENS = 300
+# Batch completions are streamed: each prompt is used as soon as it is complete, and a
+# stalled stream fails after this many seconds without a chunk. A single-scene prompt is
+# only used once complete, so it is requested in one piece.
+GPT4_STREAM = os.environ.get("POV_GPT4_STREAM", "true").lower() == "true"
+GPT4_STREAM_IDLE_TIMEOUT = float(os.environ.get("POV_GPT4_STREAM_IDLE_TIMEOUT", 20))
+FLUX_MODEL = os.environ.get("POV_FLUX_MODEL", "black-forest-labs/FLUX.1-schnell")
+# HuggingFace Inference API by default; point it at any endpoint that takes
+# {"inputs": prompt} and answers with image bytes (e.g. a local stand-in).
+FLUX_ENDPOINT = os.environ.get("POV_FLUX_ENDPOINT") or (
+    f"{MOCK_PROVIDERS_URL}/flux" if MOCK_PROVIDERS_URL else f"https://api-inference.huggingface.co/models/{FLUX_MODEL}")
+FLUX_PLACEHOLDER_IMAGE_URL = "https://images.pexels.com/photos/356056/pexels-photo-356056.jpeg?auto=compress&cs=tinysrgb&w=1260&h=750&dpr=1" # Placeholder image of a futuristic scene
+IMAGE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# How much of an unexpected streamed body is read into an error message
+ERROR_BODY_PREVIEW_BYTES = 500
+VIDEO_DOWNLOAD_CHUNK_SIZE = get_video_store_settings()["chunk_size"]
+
+PROMPT_SYSTEM_MESSAGE = "You are an assistant that generates detailed, vivid, and creative prompts for an image generation model. The user will provide a simple scene description, and you should expand it into a rich prompt suitable for creating a POV (Point of View) image. Focus on visual details, atmosphere, and emotion. The output should be only the prompt itself."
+
+BATCH_PROMPT_SYSTEM_MESSAGE = PROMPT_SYSTEM_MESSAGE + " You will receive a JSON array of scene descriptions instead of a single one. Reply only with a JSON object of the form {\"prompts\": [...]} holding one prompt per scene, in the same order."
+
+# Request builders and response parsers are shared by the blocking functions
+# below and the asyncio variants in async_integrations.py.
+
+def build_gpt4_prompt_request(scene_description, api_key):
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
     data = {
-        "model": "gpt-4", # Or use "gpt-3.5-turbo" if gpt-4 access is an issue
+        "model": GPT4_MODEL,
         "messages": [
-            {"role": "system", "content": "You are an assistant that generates detailed, vivid, and creative prompts for an image generation model. The user will provide a simple scene description, and you should expand it into a rich prompt suitable for creating a POV (Point of View) image. Focus on visual details, atmosphere, and emotion. The output should be only the prompt itself."},
+            {"role": "system", "content": PROMPT_SYSTEM_MESSAGE},
             {"role": "user", "content": scene_description}
         ],
-        "max_tokens": 300
+        "max_tokens": GPT4_MAX_TOKENS
     }
+    return headers, data
+
+def parse_gpt4_prompt_response(response_data):
+    return response_data["choices"][0]["message"]["content"].strip()
+
+def parse_gpt4_stream_line(line):
+    """Returns (text, done) for one line of a streamed completion (server-sent events)."""
+    if not line.startswith("data:"):
+        return "", False
+    payload = line[len("data:"):].strip()
+    if payload == "[DONE]":
+        return "", True
+    choice = json.loads(payload)["choices"][0]
+    return choice.get("delta", {}).get("content") or "", False
+
+class PromptArrayParser:
+    """Picks complete prompts out of a streamed {"prompts": [...]} completion as they arrive."""
+
+    def __init__(self):
+        self.text = ""
+        self.count = 0
+        self._pos = None # where the next prompt string may start, once the array has opened
+        self._start = None # opening quote of the prompt string being read
+
+    def feed(self, chunk):
+        """Adds streamed text; returns the prompts completed by it, in order."""
+        self.text += chunk
+        prompts = []
+        if self._pos is None:
+            key = self.text.find('"prompts"')
+            opening = self.text.find("[", key) if key >= 0 else -1
+            if opening < 0:
+                return prompts
+            self._pos = opening + 1
+        text, pos = self.text, self._pos
+        while pos < len(text):
+            if self._start is None:
+                if text[pos] == "]":
+                    break
+                if text[pos] == '"':
+                    self._start = pos
+                pos += 1
+            elif text[pos] == "\\":
+                if pos + 1 == len(text):
+                    break # finish the escape when the next chunk arrives
+                pos += 2
+            elif text[pos] == '"':
+                prompts.append(json.loads(text[self._start:pos + 1]).strip())
+                self._start = None
+                pos += 1
+            else:
+                pos += 1
+        self._pos = pos
+        self.count += len(prompts)
+        return prompts
+
+def build_gpt4_batch_prompt_request(scene_descriptions, api_key):
+    headers, data = build_gpt4_prompt_request(json.dumps(scene_descriptions), api_key)
+    data["messages"][0]["content"] = BATCH_PROMPT_SYSTEM_MESSAGE
+    data["max_tokens"] = GPT4_MAX_TOKENS * len(scene_descriptions)
+    if GPT4_STREAM:
+        data["stream"] = True
+    return headers, data
+
+def parse_gpt4_batch_prompt_response(response_data, expected_count):
+    """Splits a packed completion back into one prompt per scene; raises ValueError if it does not line up."""
+    prompts = json.loads(parse_gpt4_prompt_response(response_data))["prompts"]
+    if len(prompts) != expected_count or not all(isinstance(prompt, str) and prompt.strip() for prompt in prompts):
+        raise ValueError(f"expected {expected_count} prompts, got {len(prompts)}")
+    return [prompt.strip() for prompt in prompts]
+
+def build_runway_video_request(image_url_param, prompt, api_key):
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "X-Runway-Version": RUNWAY_API_VERSION  # Added required version header
+    }
+    # Corrected parameter names according to RunwayML documentation
+    data = {
+        "promptImage": get_image_store().prompt_image(image_url_param), # Changed from image_url to promptImage
+        "promptText": prompt,          # Changed from text_prompt to promptText
+        # Add other parameters if needed by RunwayML Gen-2/Gen-3, e.g., motion, seed, model
+        # "model": "gen_4_turbo" # Example if a specific model needs to be specified
+    }
+    return headers, data
+
+def parse_runway_video_response(response_data):
+    # The task ID is typically returned as 'id' in the response for image_to_video endpoint
+    task_id = response_data.get("id") or response_data.get("uuid") # 'id' is more common for this endpoint
+    if not task_id:
+        return {"error": f"RunwayML API did not return a task ID. Full response: {json.dumps(response_data)}"}
+    return {"id": task_id} # Return as a dict to match expected structure in main.py, using 'id'
+
+def build_runway_status_headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "X-Runway-Version": RUNWAY_API_VERSION  # Added required version header
+    }
+
+def format_error_details(response_text):
+    """Renders a provider error body, pretty-printing it when it is JSON."""
     try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=data, timeout=30)
+        error_details = json.loads(response_text)
+    except json.JSONDecodeError:
+        return response_text
+    return json.dumps(error_details) if isinstance(error_details, dict) else response_text
+
+def read_body_preview(response, limit=ERROR_BODY_PREVIEW_BYTES):
+    """Reads at most ``limit`` bytes of a streamed response body as text; the rest is never downloaded."""
+    chunk = next(response.iter_content(limit), b"")[:limit]
+    return chunk.decode(response.encoding or "utf-8", errors="replace")
+
+def read_gpt4_stream(response, on_text=None):
+    """Reads a streamed completion to its end; ``on_text`` gets each new piece of text."""
+    text = ""
+    for line in response.iter_lines(decode_unicode=True):
+        piece, done = parse_gpt4_stream_line(line or "")
+        if done:
+            break
+        if piece:
+            text += piece
+            if on_text:
+                on_text(piece)
+    return text
+
+def request_gpt4_completion(headers, data, timeout, on_text=None):
+    """Returns the completion text of a chat request, read as a stream when the request asks for one."""
+    if not data.get("stream"):
+        response = http_request("openai", "POST", OPENAI_CHAT_COMPLETIONS_URL, headers=headers, json=data, timeout=timeout)
         response.raise_for_status() # Raises an HTTPError for bad responses (4XX or 5XX)
-        return response.json()["choices"][0]["message"]["content"].strip()
+        return parse_gpt4_prompt_response(response.json())
+    # The read timeout applies between chunks, so only a stalled stream times out.
+    with http_request("openai", "POST", OPENAI_CHAT_COMPLETIONS_URL, headers=headers, json=data, stream=True,
+                      timeout=(10, min(timeout, GPT4_STREAM_IDLE_TIMEOUT))) as response:
+        response.raise_for_status()
+        return read_gpt4_stream(response, on_text).strip()
+
+def generate_prompt_with_gpt4(scene_description, api_key):
+    """Generates a detailed prompt using OpenAI GPT-4."""
+    headers, data = build_gpt4_prompt_request(scene_description, api_key)
+    try:
+        return request_gpt4_completion(headers, data, 30)
     except requests.exceptions.HTTPError as http_err:
         # Try to get more details from the response body if available
         error_details = http_err.response.text
         return {"error": f"OpenAI API request failed with HTTPError: {str(http_err)} - Details: {error_details}"}
     except requests.exceptions.RequestException as e:
         return {"error": f"OpenAI API request failed: {str(e)}"}
-    except (KeyError, IndexError) as e:
+    except (KeyError, IndexError, ValueError) as e:
         return {"error": f"Failed to parse OpenAI API response: {str(e)}"}
 
+def generate_prompts_with_gpt4(scene_descriptions, api_key, on_prompt=None):
+    """Generates detailed prompts for several scenes with a single OpenAI GPT-4 call.
+
+    With a streamed completion, ``on_prompt(index, prompt)`` is called for each
+    prompt as soon as it is complete, before the rest has arrived. Prompts past
+    the number of scenes are not passed on.
+    """
+    headers, data = build_gpt4_batch_prompt_request(scene_descriptions, api_key)
+    parser = PromptArrayParser()
+
+    def on_text(piece):
+        first = parser.count
+        for offset, prompt in enumerate(parser.feed(piece)):
+            if on_prompt and first + offset < len(scene_descriptions) and prompt:
+                on_prompt(first + offset, prompt)
+
+    try:
+        content = request_gpt4_completion(headers, data, 60, on_text)
+        return parse_gpt4_batch_prompt_response({"choices": [{"message": {"content": content}}]}, len(scene_descriptions))
+    except requests.exceptions.HTTPError as http_err:
+        error_details = http_err.response.text
+        return {"error": f"OpenAI API request failed with HTTPError: {str(http_err)} - Details: {error_details}"}
+    except requests.exceptions.RequestException as e:
+        return {"error": f"OpenAI API request failed: {str(e)}"}
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        return {"error": f"Failed to parse OpenAI API batch response: {str(e)}"}
+
+def build_flux_request(prompt, api_key):
+    headers = {"Accept": "image/png"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    return headers, {"inputs": prompt}
+
 def generate_image_with_flux(prompt, api_key):
-    """Generates an image using HuggingFace FLUX model (placeholder)."""
-    if not api_key:
+    """Generates an image using HuggingFace FLUX and returns the URL of the stored copy.
+
+    The image is streamed straight into the local image store, never held
+    in memory as a whole.
+    """
+    if not api_key and FLUX_ENDPOINT.startswith("https://api-inference.huggingface.co/"):
         print("HuggingFace API key not provided for FLUX, proceeding with placeholder.")
-    print(f"Simulating FLUX image generation for prompt: {prompt[:50]}...")
-    # Using a more relevant placeholder or a service like Pexels for variety
-    return "https://images.pexels.com/photos/356056/pexels-photo-356056.jpeg?auto=compress&cs=tinysrgb&w=1260&h=750&dpr=1" # Placeholder image of a futuristic scene
+        return FLUX_PLACEHOLDER_IMAGE_URL
+    headers, data = build_flux_request(prompt, api_key)
+    try:
+        with http_request("flux", "POST", FLUX_ENDPOINT, headers=headers, json=data, stream=True, timeout=120) as response:
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as http_err:
+                error_details = format_error_details(read_body_preview(response))
+                return {"error": f"FLUX API request failed with HTTPError: {str(http_err)} - Details: {error_details}"}
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+            if content_type not in IMAGE_EXTENSIONS:
+                return {"error": f"FLUX endpoint did not return an image ({content_type or 'no content type'}): {read_body_preview(response)}"}
+            name = get_image_store().put_stream(response.iter_content(IMAGE_DOWNLOAD_CHUNK_SIZE), content_type)
+        return get_image_store().url_for(name)
+    except requests.exceptions.RequestException as e:
+        return {"error": f"FLUX API request failed: {str(e)}"}
+    except (ImageTooLargeError, OSError) as e:
+        return {"error": f"Could not store FLUX image: {str(e)}"}
 
 def create_video_with_runway(image_url_param, prompt, api_key):
     """Initiates video generation with RunwayML using an image and returns a task ID."""
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "X-Runway-Version": "2024-11-06"  # Added required version header
-    }
-    # Corrected parameter names according to RunwayML documentation
-    data = {
-        "promptImage": image_url_param, # Changed from image_url to promptImage
-        "promptText": prompt,          # Changed from text_prompt to promptText
-        # Add other parameters if needed by RunwayML Gen-2/Gen-3, e.g., motion, seed, model
-        # "model": "gen_4_turbo" # Example if a specific model needs to be specified
-    }
+    headers, data = build_runway_video_request(image_url_param, prompt, api_key)
     try:
         # Corrected endpoint according to RunwayML documentation
-        response = requests.post("https://api.runwayml.com/v1/image_to_video", headers=headers, json=data, timeout=60) # Increased timeout
+        response = http_request("runway", "POST", f"{RUNWAY_API_BASE_URL}/image_to_video", headers=headers, json=data, timeout=60) # Increased timeout
         response.raise_for_status() # Raises an HTTPError for bad responses (4XX or 5XX)
-        response_data = response.json()
-        # The task ID is typically returned as 'id' in the response for image_to_video endpoint
-        task_id = response_data.get("id") or response_data.get("uuid") # 'id' is more common for this endpoint
-        if not task_id:
-            return {"error": f"RunwayML API did not return a task ID. Full response: {json.dumps(response_data)}"}
-        return {"id": task_id} # Return as a dict to match expected structure in main.py, using 'id'
+        return parse_runway_video_response(response.json())
     except requests.exceptions.HTTPError as http_err:
-        error_details = "No additional details in response."
-        try:
-            error_details = http_err.response.json()
-        except json.JSONDecodeError:
-            error_details = http_err.response.text
-        return {"error": f"RunwayML API request failed with HTTPError: {str(http_err)} - Details: {json.dumps(error_details) if isinstance(error_details, dict) else error_details}"}
+        error_details = format_error_details(http_err.response.text)
+        return {"error": f"RunwayML API request failed with HTTPError: {str(http_err)} - Details: {error_details}"}
     except requests.exceptions.RequestException as e:
         return {"error": f"RunwayML API request failed: {str(e)}"}
     except KeyError as e:
@@ -83,44 +283,117 @@ def create_video_with_runway(image_url_param, prompt, api_key):
 
 def check_runway_video_status(task_id, api_key):
     """Checks the status of a video generation task on RunwayML."""
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "X-Runway-Version": "2024-11-06"  # Added required version header
-    }
+    headers = build_runway_status_headers(api_key)
     try:
         # Endpoint for checking task status remains /v1/tasks/{id}
-        response = requests.get(f"https://api.runwayml.com/v1/tasks/{task_id}", headers=headers, timeout=30)
+        response = http_request("runway", "GET", f"{RUNWAY_API_BASE_URL}/tasks/{task_id}", headers=headers, timeout=30)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.HTTPError as http_err:
-        error_details = "No additional details in response."
-        try:
-            error_details = http_err.response.json()
-        except json.JSONDecodeError:
-            error_details = http_err.response.text
-        return {"error": f"RunwayML API status check failed with HTTPError: {str(http_err)} - Details: {json.dumps(error_details) if isinstance(error_details, dict) else error_details}"}
+        error_details = format_error_details(http_err.response.text)
+        return {"error": f"RunwayML API status check failed with HTTPError: {str(http_err)} - Details: {error_details}"}
     except requests.exceptions.RequestException as e:
         return {"error": f"RunwayML API status check failed: {str(e)}"}
     except KeyError as e:
         return {"error": f"Failed to parse RunwayML API status response: {str(e)} - Response: {response.text}"}
 
+def download_runway_video(video_url):
+    """Downloads a finished Runway video into the local video store and returns its name.
+
+    The video is written to disk chunk by chunk as it arrives.
+    """
+    store = get_video_store()
+    try:
+        # The read timeout applies between chunks, so a long download only fails when it stalls.
+        with http_request("runway_video", "GET", video_url, stream=True, timeout=(10, 60)) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+            if content_type not in VIDEO_EXTENSIONS and content_type not in GENERIC_CONTENT_TYPES:
+                return {"error": f"Runway video URL did not return a video ({content_type})"}
+            if int(response.headers.get("Content-Length") or 0) > store.max_bytes:
+                return {"error": f"Runway video is larger than {store.max_bytes} bytes."}
+            return store.put_stream(response.iter_content(VIDEO_DOWNLOAD_CHUNK_SIZE), content_type)
+    except requests.exceptions.HTTPError as http_err:
+        return {"error": f"Runway video download failed with HTTPError: {str(http_err)}"}
+    except requests.exceptions.RequestException as e:
+        return {"error": f"Runway video download failed: {str(e)}"}
+    except (VideoTooLargeError, OSError) as e:
+        return {"error": f"Could not store Runway video: {str(e)}"}
+
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+GMAIL_SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
+
+# Authorized Google service objects are built once per process and reused.
+# Credentials are refreshed under a lock before expiry; the httplib2 transport
+# is not thread-safe, so each thread executes requests through its own one.
+# The Google client libraries are imported on first use: they take longer to
+# import than the rest of the app and are not needed when Sheets and Gmail
+# are not configured.
+_google_lock = threading.Lock()
+_google_services = {}
+_google_http = threading.local()
+
+def get_google_service(api_name, api_version, scopes):
+    """Returns a cached (service, credentials) pair with a valid access token."""
+    from google.auth.transport.requests import Request as GoogleAuthRequest
+    from google.oauth2.service_account import Credentials
+    from googleapiclient.discovery import build
+
+    google_creds_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+    key = (api_name, api_version, google_creds_path)
+    with _google_lock:
+        cached = _google_services.get(key)
+        if cached is None:
+            creds = Credentials.from_service_account_file(google_creds_path, scopes=scopes)
+            service = build(api_name, api_version, credentials=creds, cache_discovery=False)
+            cached = _google_services[key] = (service, creds)
+        service, creds = cached
+        if not creds.valid:
+            creds.refresh(GoogleAuthRequest())
+    return service, creds
+
+def prepare_gmail_service():
+    """Builds the Gmail client and refreshes its token ahead of the first notification; never raises."""
+    if not os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"):
+        return
+    try:
+        get_google_service("gmail", "v1", GMAIL_SCOPES)
+    except Exception as e:
+        print(f"Could not prepare the Gmail client: {e}")
+
+def get_google_http(creds):
+    """Returns this thread's authorized transport for the given credentials."""
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+
+    transports = getattr(_google_http, "transports", None)
+    if transports is None:
+        transports = _google_http.transports = {}
+    http = transports.get(id(creds))
+    if http is None:
+        http = transports[id(creds)] = AuthorizedHttp(creds, http=httplib2.Http(timeout=30))
+    return http
+
 def add_to_google_sheet(spreadsheet_id, range_name, values):
     """Adds a new row to a Google Sheet. Relies on GOOGLE_APPLICATION_CREDENTIALS env var."""
+    return append_rows_to_google_sheet(spreadsheet_id, range_name, [values])
+
+def append_rows_to_google_sheet(spreadsheet_id, range_name, rows):
+    """Adds several rows to a Google Sheet in a single append call."""
     try:
         google_creds_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
         if not google_creds_path:
             return {"error": "GOOGLE_APPLICATION_CREDENTIALS environment variable not set."}
         
-        creds = Credentials.from_service_account_file(
-            google_creds_path, scopes=["https://www.googleapis.com/auth/spreadsheets"])
-        service = build("sheets", "v4", credentials=creds)
+        service, creds = get_google_service("sheets", "v4", SHEETS_SCOPES)
 
         body = {
-            "values": [values]
+            "values": rows
         }
-        result = service.spreadsheets().values().append(
-            spreadsheetId=spreadsheet_id, range=range_name,
-            valueInputOption="USER_ENTERED", body=body).execute()
+        with provider_call("google_sheets"):
+            result = service.spreadsheets().values().append(
+                spreadsheetId=spreadsheet_id, range=range_name,
+                valueInputOption="USER_ENTERED", body=body).execute(http=get_google_http(creds))
         return result
     except FileNotFoundError:
         return {"error": f"Google credentials file not found at {google_creds_path}. Check GOOGLE_APPLICATION_CREDENTIALS."}
@@ -134,9 +407,7 @@ def send_email_with_gmail(recipient_email, subject, body_text):
         if not google_creds_path:
             return {"error": "GOOGLE_APPLICATION_CREDENTIALS environment variable not set."}
 
-        creds = Credentials.from_service_account_file(
-            google_creds_path, scopes=["https://www.googleapis.com/auth/gmail.send"])
-        service = build("gmail", "v1", credentials=creds)
+        service, creds = get_google_service("gmail", "v1", GMAIL_SCOPES)
 
         message = MIMEText(body_text)
         message["to"] = recipient_email
@@ -145,12 +416,11 @@ def send_email_with_gmail(recipient_email, subject, body_text):
         raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
         body = {"raw": raw_message}
         
-        send_message_response = service.users().messages().send(userId="me", body=body).execute()
+        with provider_call("gmail"):
+            send_message_response = service.users().messages().send(userId="me", body=body).execute(http=get_google_http(creds))
         return send_message_response
     except FileNotFoundError:
         return {"error": f"Google credentials file not found at {google_creds_path}. Check GOOGLE_APPLICATION_CREDENTIALS."}
     except Exception as e:
         return {"error": f"Gmail API error: {str(e)}"}
 
-print("Integration functions are defined. Run main.py to start the Flask server.")
-
@@ -0,0 +1,144 @@
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+# Optional: a faster JSON encoder and brotli compression, used when installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def get_response_settings():
+    """Reads JSON encoding, snapshot cache and compression settings from the environment."""
+    return {
+        # "auto" uses orjson when it is installed, "json" always uses the standard library
+        "encoder": os.environ.get("POV_JSON_ENCODER", "auto"),
+        "snapshot_cache_size": int(os.environ.get("POV_SNAPSHOT_CACHE_SIZE", 5000)),
+        "page_cache_size": int(os.environ.get("POV_TASK_PAGE_CACHE_SIZE", 64)),
+        # Bodies smaller than this are sent uncompressed
+        "compress_min_bytes": int(os.environ.get("POV_COMPRESS_MIN_BYTES", 1024)),
+        "gzip_level": int(os.environ.get("POV_GZIP_LEVEL", 5)),
+        "brotli_quality": int(os.environ.get("POV_BROTLI_QUALITY", 4)),
+    }
+
+
+_settings = get_response_settings()
+_use_orjson = orjson is not None and _settings["encoder"] != "json"
+
+
+def dumps(obj):
+    """Encodes ``obj`` as compact UTF-8 JSON bytes."""
+    if _use_orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=_settings["brotli_quality"])
+    return gzip.compress(body, compresslevel=_settings["gzip_level"], mtime=0)
+
+
+def accepted_encoding(size):
+    """The encoding to compress a body of ``size`` bytes with for this request, or None."""
+    if size < _settings["compress_min_bytes"]:
+        return None
+    offers = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offers)
+
+
+class EncodedBody:
+    """A JSON body encoded once, with its compressed variants made on first request."""
+
+    __slots__ = ("body", "_compressed")
+
+    def __init__(self, body):
+        self.body = body
+        self._compressed = None
+
+    def variant(self, encoding):
+        if encoding is None:
+            return self.body
+        compressed = self._compressed
+        if compressed is None or encoding not in compressed:
+            # Racing threads may both compress; either result is the same.
+            compressed = dict(compressed or {})
+            compressed[encoding] = compress(self.body, encoding)
+            self._compressed = compressed
+        return compressed[encoding]
+
+
+class SnapshotCache:
+    """Encoded bodies kept while the version they were made from is current.
+
+    For tasks the key is (task id, view) and the version the task's
+    ``version`` counter, so a task is encoded once per change however often
+    it is polled. Least recently used entries go first.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, encoded):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (version, encoded)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def encode(self, key, task):
+        """Returns the EncodedBody of a task dict, encoding it only if its version is not cached."""
+        encoded = self.get(key, task["version"])
+        if encoded is None:
+            encoded = EncodedBody(dumps(task))
+            self.put(key, task["version"], encoded)
+        return encoded
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+snapshots = SnapshotCache(_settings["snapshot_cache_size"])
+# Task list pages by query string, valid while the listing's ETag is unchanged
+task_pages = SnapshotCache(_settings["page_cache_size"])
+
+
+def json_response(payload, status=200, etag=None):
+    """Builds a JSON response from an object, bytes or an EncodedBody, compressed when large enough."""
+    if not isinstance(payload, EncodedBody):
+        payload = EncodedBody(payload if isinstance(payload, bytes) else dumps(payload))
+    encoding = accepted_encoding(len(payload.body))
+    response = Response(payload.variant(encoding), status=status, mimetype="application/json")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    if _settings["compress_min_bytes"] <= len(payload.body):
+        response.vary.add("Accept-Encoding")
+    if etag is not None:
+        response.set_etag(etag)
+    return response
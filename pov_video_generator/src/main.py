@@ -5,41 +5,96 @@ import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, BASE_DIR)
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS # Import CORS
-import threading
+from werkzeug.middleware.proxy_fix import ProxyFix
+import hashlib
+import hmac
+import json
 import time
-import json # Ensure json is imported for error details
-
-from src.integrations import (
-    generate_prompt_with_gpt4,
-    generate_image_with_flux,
-    create_video_with_runway,
-    check_runway_video_status,
-    add_to_google_sheet,
-    send_email_with_gmail
-)
+
 from src.credentials_manager import get_credentials, save_credentials
+from src.worker_pool import PRIORITIES, ClientQuotaError, QueueFullError, PoolClosedError
+from src.models.user import db
+from src.image_store import get_image_store
+from src.video_store import get_video_store
+from src.json_responses import EncodedBody, dumps, json_response, snapshots, task_pages
+from src.metrics import PrometheusText
+from src.metrics_exporter import render_metrics
+from src.migrations import upgrade_schema
+from src.result_cache import create_result_cache, set_result_cache
+from src.task_events import task_events
+from src.task_store import FINISHED_STATUSES, create_task_store, get_task_store, set_task_store
+from src.webhooks import SIGNATURE_HEADER, record_event, verify_signature
+from src.workflow import (create_task, discard_task, submit_workflow, create_batch, submit_batch, handle_runway_callback, lease_keeper,
+                          shutdown_workflows, webhook_settings, worker_settings)
 
-app = Flask(__name__)
+api = Blueprint("api", __name__)
 
 # Configuração do CORS para permitir a origem específica do frontend
 # e as origens padrão para desenvolvimento local, se necessário.
 # Esta configuração DEVE estar ativa no Render para resolver os erros de CORS.
-CORS(app, resources={r"/api/*": {"origins": [
+CORS_ORIGINS = [
     "https://pov-video-frontend.vercel.app",
     "http://localhost:5173", 
     "http://localhost:5174"
-]}})
+]
+
+def create_app():
+    """Builds the Flask app and wires up the shared task store, cache and background services.
+
+    Call it once per process: under gunicorn each worker builds its own app
+    after the fork (see gunicorn.conf.py and src/wsgi.py).
+    """
+    app = Flask(__name__)
+    if TRUSTED_PROXY_HOPS:
+        # request.remote_addr becomes the address the proxy saw, not a hop the client wrote itself.
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
+        "DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'database', 'app.db')}")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        # Workflow threads write task updates concurrently with request handlers.
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"check_same_thread": False, "timeout": 30}}
+        os.makedirs(os.path.join(BASE_DIR, "database"), exist_ok=True)
+    db.init_app(app)
+    with app.app_context():
+        if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+            # WAL lets the gunicorn workers read while one of them writes.
+            with db.engine.connect() as connection:
+                connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+        db.create_all()
+        upgraded = upgrade_schema(db.engine, db.metadata)
+        if upgraded:
+            print(f"Upgraded database schema: {', '.join(upgraded)}")
+    set_task_store(create_task_store(app))
+    set_result_cache(create_result_cache(app))
+
+    CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS, "expose_headers": ["ETag", "X-Next-Cursor"]}})
+    app.register_blueprint(api)
 
-tasks = {}
-task_id_counter = 0
+    # Picks up tasks left unfinished by a previous run (or a worker that died).
+    if os.environ.get("POV_RESUME_TASKS", "true").lower() != "false":
+        lease_keeper.start()
+    return app
 
-@app.route("/api/health", methods=["GET"])
+# Proxies in front of the app that append to X-Forwarded-For (Render has one).
+TRUSTED_PROXY_HOPS = int(os.environ.get("POV_TRUSTED_PROXY_HOPS", 1))
+# API keys clients may identify themselves with (comma-separated); other keys are ignored.
+CLIENT_API_KEYS = [key.strip() for key in os.environ.get("POV_CLIENT_API_KEYS", "").split(",") if key.strip()]
+TASKS_PAGE_SIZE = int(os.environ.get("POV_TASKS_PAGE_SIZE", 100))
+TASKS_MAX_PAGE_SIZE = 500
+TASK_WAIT_MAX_TIMEOUT = 60
+IMAGE_MAX_AGE = 365 * 24 * 3600
+# Waiters re-read the store this often, to see changes made by other workers
+TASK_EVENTS_RECHECK_INTERVAL = float(os.environ.get("POV_TASK_EVENTS_RECHECK", 5))
+TASK_STREAM_MAX_DURATION = float(os.environ.get("POV_TASK_STREAM_MAX_DURATION", 600))
+
+@api.route("/api/health", methods=["GET"])
 def health_check():
     return jsonify({"status": "healthy"}), 200
 
-@app.route("/api/credentials", methods=["GET", "POST"])
+@api.route("/api/credentials", methods=["GET", "POST"])
 def manage_credentials():
     if request.method == "GET":
         creds = get_credentials()
@@ -50,174 +105,303 @@ def manage_credentials():
         save_credentials(data) 
         return jsonify({"message": "Credentials are managed by environment variables in production."})
 
-def run_pov_workflow(task_id, scene_description):
-    tasks[task_id]["status"] = "processing"
-    tasks[task_id]["steps"].append({"name": "Starting workflow", "status": "completed", "timestamp": time.time()})
+@api.route("/api/images/<name>", methods=["GET"])
+def get_image(name):
+    # Images are content-addressed, so a given URL never changes.
+    path = get_image_store().path_for(name)
+    if path is None or not os.path.exists(path):
+        return jsonify({"error": "Image not found"}), 404
+    return send_file(path, conditional=True, max_age=IMAGE_MAX_AGE)
+
+@api.route("/api/videos/<name>", methods=["GET"])
+def get_video(name):
+    # Content-addressed like images. Files are streamed from disk; Range
+    # requests get 206 partial content, so players can seek.
+    path = get_video_store().path_for(name)
+    if path is None or not os.path.exists(path):
+        return jsonify({"error": "Video not found"}), 404
+    return send_file(path, conditional=True, max_age=IMAGE_MAX_AGE)
 
+@api.route("/api/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(), content_type=PrometheusText.CONTENT_TYPE)
+
+@api.route("/api/webhooks/runway", methods=["POST"])
+def runway_webhook():
+    """Runway completion callback, signed with POV_RUNWAY_WEBHOOK_SECRET (see src/webhooks.py)."""
+    secret = webhook_settings["runway_secret"]
+    if not secret:
+        return jsonify({"error": "Runway webhooks are not enabled"}), 404
+    body = request.get_data()
+    if not verify_signature(secret, request.headers.get(SIGNATURE_HEADER, ""), body, webhook_settings["tolerance"]):
+        record_event("runway", "rejected")
+        return jsonify({"error": "Invalid webhook signature"}), 401
     try:
-        credentials = get_credentials()
-        openai_api_key = credentials.get("openai")
-        huggingface_api_key = credentials.get("huggingface")
-        runway_api_key = credentials.get("runwayml")
-        google_spreadsheet_id = credentials.get("google_spreadsheet_id")
-        gmail_recipient = credentials.get("gmail_recipient")
-
-        if not all([openai_api_key, runway_api_key]):
-            error_msg = "Missing API credentials for OpenAI or RunwayML."
-            tasks[task_id]["status"] = "error"
-            tasks[task_id]["error"] = error_msg
-            tasks[task_id]["steps"].append({"name": "Credential Check", "status": "error", "message": error_msg, "timestamp": time.time()})
-            return
-
-        # 1. Generate Prompt with GPT-4
-        tasks[task_id]["steps"].append({"name": "GPT-4 Prompt Generation", "status": "processing", "timestamp": time.time()})
-        detailed_prompt = generate_prompt_with_gpt4(scene_description, openai_api_key)
-        if isinstance(detailed_prompt, dict) and "error" in detailed_prompt:
-            raise Exception(f"GPT-4 Error: {detailed_prompt['error']}")
-        tasks[task_id]["steps"][-1]["status"] = "completed"
-        tasks[task_id]["steps"][-1]["output"] = detailed_prompt
-        tasks[task_id]["prompt"] = detailed_prompt
-
-        # 2. Generate Image with HuggingFace FLUX
-        tasks[task_id]["steps"].append({"name": "FLUX Image Generation", "status": "processing", "timestamp": time.time()})
-        image_url = generate_image_with_flux(detailed_prompt, huggingface_api_key)
-        if isinstance(image_url, dict) and "error" in image_url:
-            raise Exception(f"FLUX Image Generation Error: {image_url['error']}")
-        tasks[task_id]["steps"][-1]["status"] = "completed"
-        tasks[task_id]["steps"][-1]["output"] = image_url
-        tasks[task_id]["image_url"] = image_url
-
-        # 3. Create Video with RunwayML
-        tasks[task_id]["steps"].append({"name": "RunwayML Video Generation", "status": "processing", "timestamp": time.time()})
-        runway_task_obj = create_video_with_runway(image_url, detailed_prompt, runway_api_key)
-        if isinstance(runway_task_obj, dict) and "error" in runway_task_obj:
-            # The error from create_video_with_runway should now be more detailed
-            raise Exception(f"RunwayML Video Creation Error: {runway_task_obj['error']}")
-        runway_task_id = runway_task_obj.get("uuid")
-        if not runway_task_id:
-             raise Exception(f"RunwayML Video Creation did not return a task ID. Response: {json.dumps(runway_task_obj)}")
-        tasks[task_id]["steps"][-1]["status"] = "submitted"
-        tasks[task_id]["steps"][-1]["runway_task_id"] = runway_task_id
-
-        # 4. Check RunwayML Video Status (Polling)
-        video_url = None
-        max_retries = 30 # Approx 5 minutes (30 * 10 seconds)
-        retry_count = 0
-        tasks[task_id]["steps"].append({"name": "RunwayML Video Processing", "status": "polling", "timestamp": time.time()})
-        while retry_count < max_retries:
-            status_response = check_runway_video_status(runway_task_id, runway_api_key)
-            if isinstance(status_response, dict) and "error" in status_response:
-                # The error from check_runway_video_status should now be more detailed
-                raise Exception(f"RunwayML Status Check Error: {status_response['error']}")
-
-            current_runway_status = status_response.get("status")
-            tasks[task_id]["steps"][-1]["current_runway_status"] = current_runway_status # Log current status
-
-            if current_runway_status == "succeeded":
-                video_url = status_response.get("outputs", [{}])[0].get("video") # Adjusted based on typical RunwayML Gen-2 response
-                if not video_url:
-                    video_url = status_response.get("url") # Fallback for older or different formats
-                if not video_url:
-                    raw_output = status_response.get("output") # Another fallback
-                    if isinstance(raw_output, str) and raw_output.startswith("http"):
-                        video_url = raw_output
-                
-                if video_url:
-                    tasks[task_id]["steps"][-1]["status"] = "completed"
-                    tasks[task_id]["steps"][-1]["output"] = video_url
-                    break
-                else:
-                    # If status is succeeded but no URL, log the response for debugging
-                    raise Exception(f"RunwayML Succeeded but no video URL found. Response: {json.dumps(status_response)}")
-            elif current_runway_status == "failed":
-                error_message = status_response.get('error_message', status_response.get('error', 'Unknown RunwayML error'))
-                raise Exception(f"RunwayML Video Generation Failed: {error_message} - Full Response: {json.dumps(status_response)}")
-
-            time.sleep(10)
-            retry_count += 1
-        else: # Loop finished without break (timeout)
-            raise Exception("RunwayML video generation timed out after polling.")
-        tasks[task_id]["video_url"] = video_url
-
-        # 5. Add to Google Sheets
-        if google_spreadsheet_id and os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"):
-            tasks[task_id]["steps"].append({"name": "Google Sheets Update", "status": "processing", "timestamp": time.time()})
-            sheet_response = add_to_google_sheet(
-                google_spreadsheet_id,
-                "Sheet1",
-                [scene_description, detailed_prompt, image_url, video_url, "Completed", time.ctime()]
-            )
-            if isinstance(sheet_response, dict) and "error" in sheet_response:
-                tasks[task_id]["steps"][-1]["status"] = "warning"
-                tasks[task_id]["steps"][-1]["message"] = f"Google Sheets Error: {sheet_response['error']}"
-            else:
-                tasks[task_id]["steps"][-1]["status"] = "completed"
-
-        # 6. Send Email with Gmail
-        if gmail_recipient and os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"):
-            tasks[task_id]["steps"].append({"name": "Gmail Notification", "status": "processing", "timestamp": time.time()})
-            email_subject = f"POV Video Generated: {scene_description[:30]}..."
-            email_body = f"Your POV video for the scene '{scene_description}' has been generated.\n\nPrompt: {detailed_prompt}\nImage URL: {image_url}\nVideo URL: {video_url}"
-            email_response = send_email_with_gmail(
-                gmail_recipient,
-                email_subject,
-                email_body
-            )
-            if isinstance(email_response, dict) and "error" in email_response:
-                tasks[task_id]["steps"][-1]["status"] = "warning"
-                tasks[task_id]["steps"][-1]["message"] = f"Gmail Error: {email_response['error']}"
-            else:
-                tasks[task_id]["steps"][-1]["status"] = "completed"
-
-        tasks[task_id]["status"] = "completed"
-        tasks[task_id]["result"] = video_url
-        tasks[task_id]["steps"].append({"name": "Workflow Finished", "status": "completed", "timestamp": time.time()})
-
-    except Exception as e:
-        error_str = str(e)
-        tasks[task_id]["status"] = "error"
-        tasks[task_id]["error"] = error_str
-        # Ensure the last processing/polling step is marked as error
-        current_step_index = -1
-        if tasks[task_id]["steps"]:
-            if tasks[task_id]["steps"][current_step_index]["status"] in ["processing", "polling", "submitted"]:
-                tasks[task_id]["steps"][current_step_index]["status"] = "error"
-                tasks[task_id]["steps"][current_step_index]["message"] = error_str
-            else: # If last step was already completed or errored, add a new error step
-                 tasks[task_id]["steps"].append({"name": "Workflow Error", "status": "error", "message": error_str, "timestamp": time.time()})
-        else: # No steps initiated yet
-            tasks[task_id]["steps"].append({"name": "Workflow Initialization Error", "status": "error", "message": error_str, "timestamp": time.time()})
-
-@app.route("/api/generate-pov", methods=["POST"])
+        event = json.loads(body)
+    except ValueError:
+        event = None
+    if not isinstance(event, dict) or not event.get("id"):
+        return jsonify({"error": "Expected a Runway task object with an id"}), 400
+    if task_events.closed:
+        # Shutting down: let Runway retry against another worker.
+        return jsonify({"error": "Server is shutting down, try again later."}), 503
+    outcome = handle_runway_callback(event)
+    record_event("runway", outcome)
+    if outcome == "unknown":
+        return jsonify({"error": "No task for this Runway task id", "outcome": outcome}), 404
+    return jsonify({"outcome": outcome}), 202 if outcome == "owned" else 200
+
+def _queue_full_response(e):
+    response = jsonify({"error": "Too many videos in progress, try again later.", "queue_depth": e.queue_depth, "max_queue_size": e.max_queue_size})
+    response.headers["Retry-After"] = "30"
+    return response, 429
+
+def _client_quota_response(e):
+    response = jsonify({"error": "You already have too many videos waiting, try again later.", "limit": e.limit})
+    response.headers["Retry-After"] = "30"
+    return response, 429
+
+def request_client():
+    """Who the request is from, for fair scheduling: its API key if it is a known one, else its address.
+
+    Neither can be picked by the client: unknown keys are ignored and the
+    address is the one the proxy saw (see TRUSTED_PROXY_HOPS).
+    """
+    api_key = request.headers.get("X-API-Key", "").encode()
+    if api_key and any(hmac.compare_digest(api_key, known.encode()) for known in CLIENT_API_KEYS):
+        return "key:" + hashlib.sha256(api_key).hexdigest()[:16]
+    return "ip:" + (request.remote_addr or "unknown")
+
+@api.route("/api/generate-pov", methods=["POST"])
 def generate_pov_endpoint():
-    global task_id_counter
     data = request.get_json()
     scene_description = data.get("scene_description")
 
     if not scene_description:
         return jsonify({"error": "Scene description is required"}), 400
+    priority = data.get("priority", "interactive")
+    if priority not in PRIORITIES:
+        return jsonify({"error": f"priority must be one of {', '.join(PRIORITIES)}"}), 400
 
-    task_id = task_id_counter
-    task_id_counter += 1
-    tasks[task_id] = {"id": task_id, "status": "pending", "description": scene_description, "result": None, "error": None, "steps": []}
+    client = request_client()
+    task_id = create_task(scene_description, client, priority)
 
-    thread = threading.Thread(target=run_pov_workflow, args=(task_id, scene_description))
-    thread.start()
+    try:
+        submit_workflow(task_id, scene_description, client, priority)
+    except QueueFullError as e:
+        discard_task(task_id)
+        return _queue_full_response(e)
+    except ClientQuotaError as e:
+        discard_task(task_id)
+        return _client_quota_response(e)
+    except PoolClosedError:
+        discard_task(task_id)
+        return jsonify({"error": "Server is shutting down, try again later."}), 503
 
     return jsonify({"message": "POV generation started", "task_id": task_id}), 202
 
-@app.route("/api/tasks/<int:task_id>", methods=["GET"])
+@api.route("/api/generate-pov/batch", methods=["POST"])
+def generate_pov_batch_endpoint():
+    data = request.get_json() or {}
+    scene_descriptions = data.get("scene_descriptions")
+
+    if not isinstance(scene_descriptions, list) or not scene_descriptions:
+        return jsonify({"error": "scene_descriptions must be a non-empty list"}), 400
+    if not all(isinstance(scene, str) and scene.strip() for scene in scene_descriptions):
+        return jsonify({"error": "Every scene description must be a non-empty string"}), 400
+    if len(scene_descriptions) > worker_settings["batch_max_size"]:
+        return jsonify({"error": f"A batch can hold at most {worker_settings['batch_max_size']} scenes"}), 400
+    priority = data.get("priority", "bulk")
+    if priority not in PRIORITIES:
+        return jsonify({"error": f"priority must be one of {', '.join(PRIORITIES)}"}), 400
+
+    client = request_client()
+    batch_id, task_ids = create_batch(scene_descriptions, client, priority)
+
+    try:
+        submit_batch(batch_id, task_ids, scene_descriptions, client, priority)
+    except QueueFullError as e:
+        for task_id in task_ids:
+            discard_task(task_id)
+        return _queue_full_response(e)
+    except ClientQuotaError as e:
+        for task_id in task_ids:
+            discard_task(task_id)
+        return _client_quota_response(e)
+    except PoolClosedError:
+        for task_id in task_ids:
+            discard_task(task_id)
+        return jsonify({"error": "Server is shutting down, try again later."}), 503
+
+    return jsonify({"message": "POV batch generation started", "batch_id": batch_id, "task_ids": task_ids}), 202
+
+@api.route("/api/batches/<batch_id>", methods=["GET"])
+def get_batch_status(batch_id):
+    batch_tasks = get_task_store().list_tasks(batch_id=batch_id, summary=True)
+    if not batch_tasks:
+        return jsonify({"error": "Batch not found"}), 404
+    counts = {}
+    for task in batch_tasks:
+        counts[task["status"]] = counts.get(task["status"], 0) + 1
+    finished = sum(counts.get(status, 0) for status in FINISHED_STATUSES)
+    return json_response({
+        "batch_id": batch_id,
+        "total": len(batch_tasks),
+        "counts": counts,
+        "finished": finished,
+        "done": finished == len(batch_tasks),
+        "tasks": batch_tasks
+    })
+
+def _task_etag(task_id, version):
+    return f"{task_id}-{version!r}"
+
+@api.route("/api/tasks/<int:task_id>", methods=["GET"])
 def get_task_status(task_id):
-    task = tasks.get(task_id)
-    if task:
-        return jsonify(task)
-    return jsonify({"error": "Task not found"}), 404
+    # The task is only read and encoded when it changed since it was last
+    # served; otherwise the cached bytes go out (or a 304 with If-None-Match).
+    store = get_task_store()
+    version = store.version(task_id)
+    if version is None:
+        return jsonify({"error": "Task not found"}), 404
+    if _task_etag(task_id, version) in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(_task_etag(task_id, version))
+        return response
+    encoded = snapshots.get((task_id, "full"), version)
+    if encoded is None:
+        task = store.get(task_id)
+        if task is None:
+            return jsonify({"error": "Task not found"}), 404
+        version = task["version"]
+        encoded = snapshots.encode((task_id, "full"), task)
+    return json_response(encoded, etag=_task_etag(task_id, version))
+
+@api.route("/api/tasks/<int:task_id>/wait", methods=["GET"])
+def wait_for_task_change(task_id):
+    # Long-poll fallback for the event stream: pass the task's last seen
+    # version as ?version= and the request returns as soon as it changes,
+    # or with 304 after ?timeout= seconds (default 25).
+    try:
+        version = int(request.args["version"]) if "version" in request.args else None
+        timeout = min(float(request.args.get("timeout", 25)), TASK_WAIT_MAX_TIMEOUT)
+    except ValueError:
+        return jsonify({"error": "version must be an integer and timeout a number"}), 400
+    deadline = time.monotonic() + timeout
+    store = get_task_store()
+    while True:
+        event = task_events.subscribe(task_id)
+        task = store.get(task_id)
+        if task is None:
+            task_events.unsubscribe(task_id, event)
+            return jsonify({"error": "Task not found"}), 404
+        if task["version"] != version:
+            task_events.unsubscribe(task_id, event)
+            return json_response(snapshots.encode((task_id, "full"), task), etag=_task_etag(task_id, task["version"]))
+        remaining = deadline - time.monotonic()
+        if task["status"] in FINISHED_STATUSES or remaining <= 0 or task_events.closed:
+            task_events.unsubscribe(task_id, event)
+            return "", 304
+        task_events.wait(task_id, event, min(remaining, TASK_EVENTS_RECHECK_INTERVAL))
+
+def _sse_message(event, data, event_id=None):
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {dumps(data).decode()}\n\n"
 
-@app.route("/api/tasks", methods=["GET"])
+@api.route("/api/tasks/<int:task_id>/events", methods=["GET"])
+def stream_task_events(task_id):
+    # Server-Sent Events: a "snapshot" of the task, then a "step" event for
+    # every new or changed step, a "status" event when the task status moves,
+    # and "end" once the task is finished (or the stream hits its max duration).
+    store = get_task_store()
+    task = store.get(task_id)
+    if task is None:
+        return jsonify({"error": "Task not found"}), 404
+
+    def generate(task):
+        yield _sse_message("snapshot", task, task["version"])
+        deadline = time.monotonic() + TASK_STREAM_MAX_DURATION
+        while task["status"] not in FINISHED_STATUSES and time.monotonic() < deadline:
+            if task_events.closed:
+                # Shutting down: drop the connection without "end" so the client reconnects.
+                return
+            event = task_events.subscribe(task_id)
+            latest = store.get(task_id)
+            if latest is None:
+                task_events.unsubscribe(task_id, event)
+                break
+            if latest["version"] == task["version"]:
+                if not task_events.wait(task_id, event, TASK_EVENTS_RECHECK_INTERVAL):
+                    yield ": keepalive\n\n"
+                continue
+            task_events.unsubscribe(task_id, event)
+            # Indexes count from the task's first step, including steps dropped from its history.
+            dropped, previously_dropped = latest.get("steps_dropped", 0), task.get("steps_dropped", 0)
+            for position, step in enumerate(latest["steps"]):
+                index, previous = dropped + position, dropped + position - previously_dropped
+                if previous >= len(task["steps"]) or step != task["steps"][previous]:
+                    yield _sse_message("step", {"index": index, "step": step}, latest["version"])
+            if latest["status"] != task["status"]:
+                yield _sse_message("status", {"status": latest["status"], "result": latest["result"], "error": latest["error"]}, latest["version"])
+            task = latest
+        yield _sse_message("end", {"status": task["status"]})
+
+    return Response(stream_with_context(generate(task)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api.route("/api/tasks", methods=["GET"])
 def get_all_tasks():
-    return jsonify(list(tasks.values())) # Return a list of tasks for easier frontend iteration
+    # Query parameters:
+    #   status=<status>        only tasks in this status
+    #   batch_id=<id>          only tasks of this batch
+    #   view=summary           leave out each task's steps
+    #   limit=<n>, cursor=<id> page through tasks in id order; the next cursor
+    #                          is returned in the X-Next-Cursor header. Without
+    #                          either, every matching task is returned.
+    #   updated_since=<epoch>  only tasks changed after this time
+    # Responses carry an ETag, so an unchanged poll with If-None-Match gets a 304.
+    status = request.args.get("status")
+    summary = request.args.get("view") == "summary"
+    try:
+        paginated = "limit" in request.args or "cursor" in request.args
+        limit = min(int(request.args.get("limit", TASKS_PAGE_SIZE)), TASKS_MAX_PAGE_SIZE) if paginated else None
+        cursor = int(request.args["cursor"]) if "cursor" in request.args else None
+        updated_since = float(request.args["updated_since"]) if "updated_since" in request.args else None
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers and updated_since a timestamp"}), 400
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+
+    store = get_task_store()
+    marker = store.change_marker(status)
+    etag = hashlib.sha1(f"{request.query_string!r}|{marker!r}".encode()).hexdigest()
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    cached = task_pages.get(request.query_string, etag)
+    if cached is None:
+        page = store.list_tasks(status=status, after_id=cursor, limit=limit + 1 if limit else None, updated_since=updated_since, summary=summary,
+                                batch_id=request.args.get("batch_id"))
+        # Return a list of tasks for easier frontend iteration, joined from the tasks' cached encodings
+        view = "summary" if summary else "full"
+        body = b"[" + b",".join(snapshots.encode((task["id"], view), task).body for task in page[:limit]) + b"]"
+        cached = (EncodedBody(body), str(page[limit - 1]["id"]) if limit and len(page) > limit else None)
+        task_pages.put(request.query_string, etag, cached)
+    encoded, next_cursor = cached
+    response = json_response(encoded, etag=etag)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 if __name__ == "__main__":
+    # Development server; production runs gunicorn with gunicorn.conf.py.
     port = int(os.environ.get("PORT", 5001))
-    app.run(debug=False, host="0.0.0.0", port=port)
+    try:
+        create_app().run(debug=False, host="0.0.0.0", port=port)
+    finally:
+        shutdown_workflows()
 
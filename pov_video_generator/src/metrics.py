@@ -0,0 +1,100 @@
+import threading
+
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """Thread-safe cumulative bucket histogram (Prometheus style)."""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * len(self.buckets)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._count += 1
+            self._sum += value
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    self._counts[i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "buckets": dict(zip(self.buckets, self._counts)),
+                "count": self._count,
+                "sum": self._sum,
+            }
+
+
+class HistogramFamily:
+    """Histograms sharing a bucket layout, one per label value (e.g. per stage)."""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, key):
+        with self._lock:
+            histogram = self._children.get(key)
+            if histogram is None:
+                histogram = self._children[key] = Histogram(self.buckets)
+            return histogram
+
+    def snapshots(self):
+        with self._lock:
+            children = dict(self._children)
+        return {key: histogram.snapshot() for key, histogram in children.items()}
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class PrometheusText:
+    """Builds a document in the Prometheus text exposition format (version 0.0.4)."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._lines = []
+
+    def add(self, name, kind, help_text, samples):
+        """Adds a gauge or counter; ``samples`` is a list of (labels dict, value) pairs."""
+        self._lines.append(f"# HELP {name} {help_text}")
+        self._lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self._lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def add_histogram(self, name, help_text, snapshots):
+        """Adds a histogram; ``snapshots`` is a list of (labels dict, Histogram.snapshot()) pairs."""
+        self._lines.append(f"# HELP {name} {help_text}")
+        self._lines.append(f"# TYPE {name} histogram")
+        for labels, snapshot in snapshots:
+            for upper_bound, count in snapshot["buckets"].items():
+                bucket_labels = dict(labels, le=_format_value(float(upper_bound)))
+                self._lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+            self._lines.append(f"{name}_bucket{_format_labels(dict(labels, le='+Inf'))} {snapshot['count']}")
+            self._lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(snapshot['sum']))}")
+            self._lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+
+    def render(self):
+        return "\n".join(self._lines) + "\n"
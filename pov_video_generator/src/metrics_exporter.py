@@ -0,0 +1,110 @@
+from src.http_client import get_error_counts, get_latency_histograms
+from src.json_responses import snapshots, task_pages
+from src.metrics import PrometheusText
+from src.result_cache import get_result_cache
+from src.runway_poller import polls_per_video, render_times
+from src.task_store import get_task_store
+from src.webhooks import get_event_counts
+from src import workflow
+
+
+def _async_engine():
+    if workflow.worker_settings["engine"] != "asyncio":
+        return None
+    from src.async_workflow import get_async_engine
+    return get_async_engine()
+
+
+def render_metrics():
+    """Renders the /api/metrics document.
+
+    Everything except the task counts is local to this process; with several
+    gunicorn workers each one reports its own series.
+    """
+    out = PrometheusText()
+    out.add_histogram("pov_stage_duration_seconds", "Time spent in each pipeline stage.",
+                      [({"stage": stage}, snapshot) for stage, snapshot in sorted(workflow.stage_durations.snapshots().items())])
+    out.add_histogram("pov_task_duration_seconds", "Time from task creation until it finished.",
+                      [({"status": status}, snapshot) for status, snapshot in sorted(workflow.task_durations.snapshots().items())])
+    out.add_histogram("pov_provider_request_duration_seconds", "Latency of outbound provider calls, retries included.",
+                      [({"provider": provider}, snapshot) for provider, snapshot in sorted(get_latency_histograms().items())])
+    out.add("pov_provider_errors_total", "counter", "Outbound provider calls that failed, by HTTP status or \"exception\".",
+            [({"provider": provider, "reason": reason}, count) for (provider, reason), count in sorted(get_error_counts().items())])
+    out.add_histogram("pov_runway_polls_per_video", "Status checks needed per Runway task.", [({}, polls_per_video.snapshot())])
+
+    pool = workflow.workflow_pool
+    pool_stats = pool.stats()
+    out.add_histogram("pov_queue_wait_seconds", "Time work waited in the worker pool before a worker picked it up.", [
+        ({"lane": "admission"}, pool.queue_wait.snapshot()),
+        ({"lane": "continuation"}, pool.continuation_wait.snapshot()),
+    ])
+    out.add("pov_worker_pool_busy_workers", "gauge", "Worker threads currently running a workflow stage.", [({}, pool_stats["busy_workers"])])
+    out.add("pov_worker_pool_workers", "gauge", "Worker threads in the pool.", [({}, pool_stats["workers"])])
+    out.add("pov_worker_pool_queue_depth", "gauge", "Work items waiting for a worker thread.", [
+        ({"lane": "admission"}, pool_stats["queue_depth"]),
+        ({"lane": "continuation"}, pool_stats["continuations"]),
+    ])
+    scheduling = pool_stats["scheduling"]
+    out.add_histogram("pov_queue_wait_by_priority_seconds", "Time new work waited for a worker, by priority class.",
+                      [({"priority": priority}, snapshot) for priority, snapshot in sorted(pool.priority_wait.snapshots().items())])
+    out.add("pov_scheduler_queued", "gauge", "Work items waiting for a worker, by priority class.",
+            [({"priority": priority}, count) for priority, count in scheduling["queued"].items()])
+    out.add("pov_scheduler_queued_clients", "gauge", "Clients with work waiting for a worker.", [({}, scheduling["queued_clients"])])
+    out.add("pov_scheduler_in_flight", "gauge", "Workflows started and not finished that count against client quotas.",
+            [({}, scheduling["in_flight"])])
+
+    engine = _async_engine()
+    if engine is not None:
+        out.add("pov_async_pipelines_in_flight", "gauge", "Workflows running on the asyncio engine.", [({}, engine.stats()["in_flight"])])
+
+    limiter = workflow.stage_limiter
+    governor = sorted(limiter.stats().items())
+    out.add("pov_provider_slots_in_use", "gauge", "Concurrent calls in progress per provider.",
+            [({"provider": stage}, stats["in_use"]) for stage, stats in governor])
+    out.add("pov_provider_slots_limit", "gauge", "Concurrency limit per provider.",
+            [({"provider": stage}, stats["limit"]) for stage, stats in governor])
+    out.add("pov_provider_waiting", "gauge", "Calls waiting for a concurrency slot or rate token per provider.",
+            [({"provider": stage}, stats["waiting"]) for stage, stats in governor])
+    out.add("pov_provider_calls_total", "counter", "Calls let through the provider governor.",
+            [({"provider": stage}, stats["calls"]) for stage, stats in governor])
+    out.add("pov_provider_throttled_total", "counter", "Calls delayed by the provider rate limit.",
+            [({"provider": stage}, stats["throttled"]) for stage, stats in governor])
+    out.add("pov_provider_rate_limit", "gauge", "Requests per second allowed per provider.",
+            [({"provider": stage}, stats["rate"]) for stage, stats in governor if "rate" in stats])
+    out.add("pov_provider_rate_tokens", "gauge", "Rate tokens available per provider; negative while calls are queued for a token.",
+            [({"provider": stage}, stats["tokens"]) for stage, stats in governor if "tokens" in stats])
+    out.add_histogram("pov_provider_slot_wait_seconds", "Time spent waiting for a provider slot and rate token.",
+                      [({"provider": stage}, histogram.snapshot()) for stage, histogram in sorted(limiter.wait_times.items())])
+
+    out.add("pov_runway_tasks_polling", "gauge", "Runway tasks tracked by the shared poller.", [({}, workflow.runway_poller.in_flight())])
+    render_stats = render_times.stats()
+    out.add("pov_runway_render_seconds", "gauge", "Recent Runway render times the polling plan is based on, by quantile.",
+            [({"quantile": q}, seconds) for q, seconds in render_stats["quantiles"].items() if seconds is not None])
+    out.add("pov_runway_render_samples", "gauge", "Recent Runway render times kept for adaptive polling.", [({}, render_stats["samples"])])
+    out.add("pov_webhook_events_total", "counter", "Provider completion callbacks received, by outcome.",
+            [({"provider": provider, "outcome": outcome}, count) for (provider, outcome), count in sorted(get_event_counts().items())])
+    sink_stats = workflow.sheets_sink.stats()
+    out.add("pov_sheets_rows_pending", "gauge", "Result rows waiting to be appended to Google Sheets.", [({}, sink_stats["pending"])])
+    out.add("pov_sheets_rows_spilled", "gauge", "Pending Google Sheets rows kept only in the spool file, beyond POV_SHEETS_MAX_PENDING.",
+            [({}, sink_stats["spilled"])])
+    out.add("pov_sheets_rows_dropped_total", "counter", "Result rows dropped because the Google Sheets buffer was full and there is no spool.",
+            [({}, sink_stats["dropped"])])
+    out.add("pov_sheets_consecutive_failures", "gauge", "Failed Google Sheets appends since the last success.", [({}, sink_stats["consecutive_failures"])])
+
+    cache_stats = get_result_cache().stats()
+    out.add("pov_cache_hits_total", "counter", "Result cache hits per layer.",
+            [({"layer": layer}, count) for layer, count in cache_stats["hits"].items()])
+    out.add("pov_cache_misses_total", "counter", "Result cache misses per layer.",
+            [({"layer": layer}, count) for layer, count in cache_stats["misses"].items()])
+
+    response_caches = [("tasks", snapshots.stats()), ("pages", task_pages.stats())]
+    out.add("pov_response_cache_entries", "gauge", "Encoded task and task list bodies cached for polling clients.",
+            [({"cache": name}, stats["entries"]) for name, stats in response_caches])
+    out.add("pov_response_cache_hits_total", "counter", "Bodies served without reading and encoding them again.",
+            [({"cache": name}, stats["hits"]) for name, stats in response_caches])
+    out.add("pov_response_cache_misses_total", "counter", "Bodies encoded because they changed or were not cached.",
+            [({"cache": name}, stats["misses"]) for name, stats in response_caches])
+
+    out.add("pov_tasks", "gauge", "Tasks in the store by status.",
+            [({"status": status}, count) for status, count in sorted(get_task_store().count_by_status().items())])
+    return out.render()
@@ -0,0 +1,65 @@
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+
+def _missing_columns(connection, table):
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    return [column for column in table.columns if column.name not in existing]
+
+
+def _missing_indexes(connection, table):
+    existing = {index["name"] for index in inspect(connection).get_indexes(table.name)}
+    return [index for index in table.indexes if index.name not in existing]
+
+
+def _needs_autoincrement(connection, table):
+    if connection.dialect.name != "sqlite" or not table.dialect_options["sqlite"].get("autoincrement"):
+        return False
+    sql = connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)).scalar()
+    return "AUTOINCREMENT" not in (sql or "").upper()
+
+
+def _rebuild_sqlite_table(connection, table):
+    """Recreates a SQLite table from its model, keeping its rows; table options cannot be changed in place."""
+    old_name = f"{table.name}_before_upgrade"
+    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old_name}"')
+    # The renamed table keeps its indexes, whose names the new table needs.
+    for (name,) in connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (old_name,)).all():
+        connection.exec_driver_sql(f'DROP INDEX "{name}"')
+    table.create(connection)
+    columns = ", ".join(f'"{column.name}"' for column in table.columns)
+    connection.exec_driver_sql(f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{old_name}"')
+    connection.exec_driver_sql(f'DROP TABLE "{old_name}"')
+
+
+def upgrade_schema(engine, metadata):
+    """Brings tables made by an earlier version up to the models; returns what was changed.
+
+    ``create_all`` only creates tables that are missing, so columns and
+    indexes added to a model since are added here, and SQLite tables are
+    rebuilt when a table option such as AUTOINCREMENT changed. New columns
+    must be nullable or have a server default. Every change runs in one
+    transaction, which on SQLite also keeps gunicorn workers that start
+    together from upgrading twice.
+    """
+    changes = []
+    with engine.connect() as connection:
+        if connection.dialect.name == "sqlite":
+            # Takes the write lock up front; another worker waits here and then finds nothing to do.
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        for table in metadata.sorted_tables:
+            if not inspect(connection).has_table(table.name):
+                continue
+            for column in _missing_columns(connection, table):
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}')
+                changes.append(f"{table.name}.{column.name}")
+            for index in _missing_indexes(connection, table):
+                index.create(connection)
+                changes.append(f"{table.name}:{index.name}")
+            if _needs_autoincrement(connection, table):
+                _rebuild_sqlite_table(connection, table)
+                changes.append(f"{table.name}:autoincrement")
+        connection.commit()
+    return changes
@@ -0,0 +1,230 @@
+"""Offline stand-ins for OpenAI, HuggingFace FLUX and RunwayML.
+
+Run ``python -m src.mock_providers --port 8099`` and start the backend with
+``POV_MOCK_PROVIDERS_URL=http://127.0.0.1:8099``: the code in integrations.py
+then talks to this server over HTTP, so pooling, retries, rate limits and
+metrics behave as they do against the real providers, at no cost.
+
+Latencies are drawn from distributions given as "fixed:S", "uniform:A,B",
+"lognormal:MEDIAN,SIGMA" or "exponential:MEAN" (seconds). Every random draw
+is seeded from POV_MOCK_SEED and the request content, so a run with the same
+requests makes the same draws.
+
+Chat completions take POV_MOCK_OPENAI_TOKEN_TIME seconds per word on top of
+the latency, and are streamed as server-sent events when asked to.
+
+With POV_MOCK_RUNWAY_WEBHOOK_URL and POV_MOCK_RUNWAY_WEBHOOK_SECRET set, every
+finished render is also posted there as a signed completion callback;
+POV_MOCK_RUNWAY_WEBHOOK_LOSS_RATE drops a share of them.
+
+Rendered videos are served at /videos/<task id>.mp4 as POV_MOCK_RUNWAY_VIDEO_BYTES
+of filler bytes, for downloads with POV_VIDEO_POSTPROCESS.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+
+import requests
+from flask import Flask, Response, jsonify, request
+
+from src.webhooks import SIGNATURE_HEADER, sign_payload
+
+MOCK_PROVIDERS = ("openai", "flux", "runway")
+
+
+def parse_distribution(spec):
+    """Turns a distribution spec into a function that draws a value from a random.Random."""
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",")] if params else []
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exponential":
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise ValueError(f"Unknown distribution: {spec}")
+
+
+def get_mock_settings():
+    """Reads latency, failure and render time settings of the mock providers from the environment."""
+    defaults = {"openai": "lognormal:1.5,0.3", "flux": "lognormal:3,0.3", "runway": "uniform:0.1,0.4"}
+    settings = {
+        "seed": os.environ.get("POV_MOCK_SEED", "0"),
+        "render_time": parse_distribution(os.environ.get("POV_MOCK_RUNWAY_RENDER_TIME", "uniform:30,90")),
+        "render_failure_rate": float(os.environ.get("POV_MOCK_RUNWAY_RENDER_FAILURE_RATE", 0)),
+        "image_size": int(os.environ.get("POV_MOCK_FLUX_IMAGE_SIZE", 256)),
+        "video_bytes": int(os.environ.get("POV_MOCK_RUNWAY_VIDEO_BYTES", 4 * 1024 * 1024)),
+        "token_time": float(os.environ.get("POV_MOCK_OPENAI_TOKEN_TIME", 0)),
+        "webhook_url": os.environ.get("POV_MOCK_RUNWAY_WEBHOOK_URL", ""),
+        "webhook_secret": os.environ.get("POV_MOCK_RUNWAY_WEBHOOK_SECRET", ""),
+        "webhook_loss_rate": float(os.environ.get("POV_MOCK_RUNWAY_WEBHOOK_LOSS_RATE", 0)),
+    }
+    for provider in MOCK_PROVIDERS:
+        prefix = f"POV_MOCK_{provider.upper()}"
+        settings[provider] = {
+            "latency": parse_distribution(os.environ.get(f"{prefix}_LATENCY", defaults[provider])),
+            # Share of calls answered with a 500 / a 429 with Retry-After
+            "failure_rate": float(os.environ.get(f"{prefix}_FAILURE_RATE", 0)),
+            "rate_limit_rate": float(os.environ.get(f"{prefix}_RATE_LIMIT_RATE", 0)),
+        }
+    return settings
+
+
+def solid_png(size, rgb):
+    """A size x size PNG of a single colour."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    row = b"\x00" + bytes(rgb) * size
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(row * size)) + chunk(b"IEND", b"")
+
+
+def create_mock_app(settings=None):
+    settings = settings or get_mock_settings()
+    app = Flask(__name__)
+    lock = threading.Lock()
+    draws = {}
+    renders = {}
+
+    def rng_for(provider, key):
+        # Repeated calls with the same content get the next draw of their own sequence.
+        with lock:
+            count = draws.get((provider, key), 0)
+            draws[(provider, key)] = count + 1
+        return random.Random(f"{settings['seed']}:{provider}:{key}:{count}")
+
+    def simulate_call(provider, key):
+        """Sleeps for the provider latency; returns an error response to send instead, or None."""
+        rng = rng_for(provider, key)
+        time.sleep(max(0, settings[provider]["latency"](rng)))
+        roll = rng.random()
+        if roll < settings[provider]["rate_limit_rate"]:
+            response = jsonify({"error": {"message": "Mock rate limit"}})
+            response.headers["Retry-After"] = "1"
+            return response, 429
+        if roll < settings[provider]["rate_limit_rate"] + settings[provider]["failure_rate"]:
+            return jsonify({"error": {"message": "Mock provider failure"}}), 500
+        return None
+
+    def task_object(task_id, host_url):
+        ready_at, fails = renders[task_id]
+        if time.monotonic() < ready_at:
+            return {"id": task_id, "status": "running"}
+        if fails:
+            return {"id": task_id, "status": "failed", "error": "Mock render failure"}
+        return {"id": task_id, "status": "succeeded", "outputs": [{"video": f"{host_url}videos/{task_id}.mp4"}]}
+
+    def send_callback(task_id, host_url):
+        with lock:
+            body = json.dumps(task_object(task_id, host_url)).encode()
+        try:
+            requests.post(settings["webhook_url"], data=body, timeout=10, headers={
+                "Content-Type": "application/json",
+                SIGNATURE_HEADER: sign_payload(settings["webhook_secret"], body),
+            })
+        except requests.exceptions.RequestException as e:
+            print(f"Mock Runway callback for {task_id} failed: {e}")
+
+    @app.route("/v1/chat/completions", methods=["POST"])
+    def chat_completions():
+        data = request.get_json()
+        content = data["messages"][-1]["content"]
+        error = simulate_call("openai", content)
+        if error:
+            return error
+        try:
+            scenes = json.loads(content)
+        except ValueError:
+            scenes = None
+        if isinstance(scenes, list):
+            content = json.dumps({"prompts": [f"A detailed POV shot of {scene}" for scene in scenes]})
+        else:
+            content = f"A detailed POV shot of {content}"
+        words = content.split(" ")
+        pieces = [word + " " for word in words[:-1]] + words[-1:]
+        if not data.get("stream"):
+            time.sleep(settings["token_time"] * len(pieces))
+            return jsonify({"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+        def events():
+            for piece in pieces:
+                time.sleep(settings["token_time"])
+                yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]})}\n\n"
+            yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+            yield "data: [DONE]\n\n"
+        return Response(events(), content_type="text/event-stream")
+
+    @app.route("/flux", methods=["POST"])
+    def flux():
+        prompt = request.get_json()["inputs"]
+        error = simulate_call("flux", prompt)
+        if error:
+            return error
+        digest = hashlib.sha256(prompt.encode()).digest()
+        return Response(solid_png(settings["image_size"], digest[:3]), content_type="image/png")
+
+    @app.route("/v1/image_to_video", methods=["POST"])
+    def image_to_video():
+        data = request.get_json()
+        key = hashlib.sha256(f"{data.get('promptImage')}|{data.get('promptText')}".encode()).hexdigest()
+        error = simulate_call("runway", key)
+        if error:
+            return error
+        rng = rng_for("runway-render", key)
+        task_id = f"mock-{hashlib.sha256(f'{key}:{rng.random()}'.encode()).hexdigest()[:24]}"
+        render_time = settings["render_time"](rng)
+        with lock:
+            renders[task_id] = (time.monotonic() + render_time, rng.random() < settings["render_failure_rate"])
+        if settings["webhook_url"] and rng.random() >= settings["webhook_loss_rate"]:
+            timer = threading.Timer(render_time, send_callback, args=(task_id, request.host_url))
+            timer.daemon = True
+            timer.start()
+        return jsonify({"id": task_id})
+
+    @app.route("/v1/tasks/<task_id>", methods=["GET"])
+    def task_status(task_id):
+        error = simulate_call("runway", task_id)
+        if error:
+            return error
+        with lock:
+            if task_id not in renders:
+                return jsonify({"error": "Task not found"}), 404
+            return jsonify(task_object(task_id, request.host_url))
+
+    @app.route("/videos/<task_id>.mp4", methods=["GET"])
+    def video(task_id):
+        # Filler bytes standing in for a render, streamed in chunks like a CDN would send them.
+        seed = hashlib.sha256(f"{settings['seed']}:video:{task_id}".encode()).digest()
+        block = seed * (64 * 1024 // len(seed))
+        size = settings["video_bytes"]
+
+        def chunks():
+            for start in range(0, size, len(block)):
+                yield block[:size - start]
+
+        return Response(chunks(), mimetype="video/mp4", headers={"Content-Length": str(size)})
+
+    return app
+
+
+if __name__ == "__main__":
+    from werkzeug.serving import make_server
+
+    parser = argparse.ArgumentParser(description="Serve mock OpenAI, FLUX and RunwayML APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server(args.host, args.port, create_mock_app(), threaded=True)
+    print(f"Mock providers listening on http://{args.host}:{args.port}")
+    server.serve_forever()
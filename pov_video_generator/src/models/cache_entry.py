@@ -0,0 +1,13 @@
+from src.models.user import db
+
+class CacheEntry(db.Model):
+    __tablename__ = 'cache_entries'
+
+    key = db.Column(db.String(80), primary_key=True)
+    layer = db.Column(db.String(20), nullable=False, index=True)
+    value = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+    expires_at = db.Column(db.Float, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<CacheEntry {self.key}>'
@@ -0,0 +1,48 @@
+from src.models.user import db
+
+class Task(db.Model):
+    __tablename__ = 'tasks'
+    # AUTOINCREMENT: SQLite would otherwise hand the id of a deleted newest task out again,
+    # while list cursors and per-task caches still refer to it.
+    __table_args__ = (db.Index('ix_tasks_status_created_at', 'status', 'created_at'), {'sqlite_autoincrement': True})
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+    description = db.Column(db.Text, nullable=False)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    batch_id = db.Column(db.String(32), index=True)
+    steps = db.Column(db.JSON, nullable=False, default=list)
+    # Looked up when a provider completion callback arrives
+    runway_task_id = db.Column(db.String(64), index=True)
+    # Workflow outputs (prompt, image_url, video_url, ...) that have no column of their own
+    data = db.Column(db.JSON, nullable=False, default=dict)
+    # Lease held by the process running the task; see task_store.LeaseKeeper
+    owner = db.Column(db.String(32), index=True)
+    heartbeat_at = db.Column(db.Float, index=True)
+    created_at = db.Column(db.Float, nullable=False, index=True)
+    updated_at = db.Column(db.Float, nullable=False, index=True)
+    # Bumped on every change; unlike updated_at, two changes in one clock tick still differ
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<Task {self.id} {self.status}>'
+
+    def to_dict(self, include_steps=True):
+        task = dict(self.data or {})
+        task.update({
+            'id': self.id,
+            'status': self.status,
+            'description': self.description,
+            'result': self.result,
+            'error': self.error,
+            'batch_id': self.batch_id,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'version': self.version or 0
+        })
+        if self.runway_task_id is not None:
+            task['runway_task_id'] = self.runway_task_id
+        if include_steps:
+            task['steps'] = list(self.steps or [])
+        return task
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from src.integrations import (
+    GPT4_MODEL,
+    GPT4_MAX_TOKENS,
+    PROMPT_SYSTEM_MESSAGE,
+    FLUX_MODEL,
+    FLUX_ENDPOINT,
+    RUNWAY_API_VERSION,
+)
+from src.models.cache_entry import CacheEntry, db
+
+CACHE_LAYERS = ("prompt", "image", "video")
+
+
+def get_result_cache_settings():
+    """Reads result cache size and per-layer TTL settings from the environment."""
+    return {
+        "enabled": os.environ.get("POV_CACHE_ENABLED", "true").lower() != "false",
+        "backend": os.environ.get("POV_CACHE_BACKEND", "sqlite"),
+        "max_entries": int(os.environ.get("POV_CACHE_MAX_ENTRIES", 1000)),
+        "ttls": {
+            "prompt": float(os.environ.get("POV_CACHE_TTL_PROMPT", 30 * 24 * 3600)),
+            "image": float(os.environ.get("POV_CACHE_TTL_IMAGE", 7 * 24 * 3600)),
+            # Runway output URLs are signed and expire, so keep these short.
+            "video": float(os.environ.get("POV_CACHE_TTL_VIDEO", 12 * 3600)),
+        },
+    }
+
+
+def normalize_description(scene_description):
+    return " ".join(scene_description.lower().split())
+
+
+def content_key(layer, *parts):
+    digest = hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+    return f"{layer}:{digest}"
+
+# Keys include every model and version parameter that changes the output, so
+# switching models never serves a stale result.
+
+def prompt_cache_key(scene_description):
+    return content_key("prompt", normalize_description(scene_description), GPT4_MODEL, GPT4_MAX_TOKENS, PROMPT_SYSTEM_MESSAGE)
+
+def image_cache_key(detailed_prompt):
+    return content_key("image", detailed_prompt, FLUX_MODEL, FLUX_ENDPOINT)
+
+def video_cache_key(image_url, detailed_prompt):
+    return content_key("video", image_url, detailed_prompt, RUNWAY_API_VERSION)
+
+
+class SqlCacheBackend:
+    """Persists cache entries in the Flask-SQLAlchemy database, shared by all workers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def get(self, key):
+        with self.app.app_context():
+            entry = db.session.get(CacheEntry, key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                return None
+            return entry.value, entry.expires_at
+
+    def put(self, key, layer, value, expires_at):
+        with self.app.app_context():
+            db.session.merge(CacheEntry(key=key, layer=layer, value=value, created_at=time.time(), expires_at=expires_at))
+            db.session.commit()
+
+    def purge_expired(self):
+        with self.app.app_context():
+            CacheEntry.query.filter(CacheEntry.expires_at <= time.time()).delete(synchronize_session=False)
+            db.session.commit()
+
+
+class ResultCache:
+    """Per-layer cache of pipeline outputs: an in-process LRU in front of an optional persistent backend."""
+
+    def __init__(self, backend=None, max_entries=1000, ttls=None, enabled=True, purge_interval=600):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttls = dict(ttls or {})
+        self.enabled = enabled
+        self.purge_interval = purge_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+        self.hits = dict.fromkeys(CACHE_LAYERS, 0)
+        self.misses = dict.fromkeys(CACHE_LAYERS, 0)
+
+    def get(self, layer, key):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                value, expires_at = cached
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits[layer] += 1
+                    return value
+                del self._entries[key]
+        cached = self.backend.get(key) if self.backend else None
+        with self._lock:
+            if cached is None:
+                self.misses[layer] += 1
+                return None
+            self.hits[layer] += 1
+            self._remember(key, *cached)
+            return cached[0]
+
+    def put(self, layer, key, value):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttls.get(layer, 0)
+        with self._lock:
+            self._remember(key, value, expires_at)
+        if self.backend:
+            self.backend.put(key, layer, value, expires_at)
+            if time.monotonic() - self._last_purge >= self.purge_interval:
+                self._last_purge = time.monotonic()
+                self.backend.purge_expired()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": dict(self.hits), "misses": dict(self.misses)}
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class InFlightRegistry:
+    """Lets identical requests attach to the pipeline that is already producing their result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leaders = {}
+        self._followers = {}
+
+    def claim(self, key, task_id):
+        """Returns the id of the task already running for ``key``, or None if ``task_id`` now leads it."""
+        with self._lock:
+            leader = self._leaders.get(key)
+            if leader is not None:
+                self._followers[leader][1].append(task_id)
+                return leader
+            self._leaders[key] = task_id
+            self._followers[task_id] = (key, [])
+            return None
+
+    def release(self, task_id):
+        """Ends a leader's run and returns the tasks that were waiting on it."""
+        with self._lock:
+            entry = self._followers.pop(task_id, None)
+            if entry is None:
+                return []
+            key, followers = entry
+            self._leaders.pop(key, None)
+            return followers
+
+    def detach(self, task_id):
+        """Takes a follower off the task it was waiting on, e.g. when it is discarded before running."""
+        with self._lock:
+            for _, followers in self._followers.values():
+                if task_id in followers:
+                    followers.remove(task_id)
+                    return
+
+
+_cache = ResultCache(enabled=False)
+
+def get_result_cache():
+    return _cache
+
+def set_result_cache(cache):
+    global _cache
+    _cache = cache
+
+def create_result_cache(app):
+    """Builds the cache selected by POV_CACHE_* settings ("sqlite" or "memory" backend)."""
+    settings = get_result_cache_settings()
+    backend = SqlCacheBackend(app) if settings["backend"] == "sqlite" else None
+    return ResultCache(backend, settings["max_entries"], settings["ttls"], settings["enabled"])
@@ -0,0 +1,344 @@
+import heapq
+import itertools
+import os
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from src.metrics import Histogram
+
+RUNWAY_TERMINAL_STATUSES = ("succeeded", "failed")
+POLL_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# Status checks needed per Runway task, whether it finished, failed or timed out.
+polls_per_video = Histogram(POLL_COUNT_BUCKETS)
+
+
+def get_poller_settings():
+    """Reads Runway polling schedule settings from the environment."""
+    return {
+        "base_interval": float(os.environ.get("POV_RUNWAY_POLL_INTERVAL", 10)),
+        "max_interval": float(os.environ.get("POV_RUNWAY_POLL_MAX_INTERVAL", 30)),
+        "backoff": float(os.environ.get("POV_RUNWAY_POLL_BACKOFF", 1.5)),
+        "jitter": float(os.environ.get("POV_RUNWAY_POLL_JITTER", 0.2)),
+        "timeout": float(os.environ.get("POV_RUNWAY_POLL_TIMEOUT", 300)),
+        "max_parallel_checks": int(os.environ.get("POV_RUNWAY_POLL_PARALLELISM", 4)),
+    }
+
+
+def get_render_time_settings():
+    """Reads the settings of the render-time model that drives adaptive polling."""
+    return {
+        "enabled": os.environ.get("POV_RUNWAY_ADAPTIVE_POLLING", "true").lower() != "false",
+        "window": int(os.environ.get("POV_RUNWAY_RENDER_WINDOW", 200)),
+        "min_samples": int(os.environ.get("POV_RUNWAY_RENDER_MIN_SAMPLES", 5)),
+        # Status checks are placed at these quantiles of the observed render times.
+        "quantiles": [float(q) for q in os.environ.get("POV_RUNWAY_POLL_QUANTILES", "0.25,0.5,0.65,0.8,0.9,0.95").split(",")],
+        "min_interval": float(os.environ.get("POV_RUNWAY_POLL_MIN_INTERVAL", 2)),
+        # Timeout is timeout_factor x the 99th percentile, clamped to [min_timeout, max_timeout].
+        "timeout_factor": float(os.environ.get("POV_RUNWAY_TIMEOUT_FACTOR", 2)),
+        "min_timeout": float(os.environ.get("POV_RUNWAY_MIN_TIMEOUT", 120)),
+        "max_timeout": float(os.environ.get("POV_RUNWAY_MAX_TIMEOUT", 1800)),
+    }
+
+
+def backoff_delay(polls, base_interval, max_interval, backoff, jitter):
+    """Delay before the next status check of a task that has been polled ``polls`` times."""
+    delay = min(max_interval, base_interval * (backoff ** polls))
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
+class RenderTimeModel:
+    """Render times of recently finished Runway tasks and the polling plan derived from them.
+
+    Once ``min_samples`` renders have been seen, a task is checked when its
+    age reaches each of ``quantiles`` of the recent render times, so checks are
+    sparse before the expected completion and dense around it. Past the last
+    quantile the caller falls back to backoff. Until then, and when disabled,
+    ``next_delay`` returns None and ``timeout`` the configured default.
+
+    The first check is an early probe at ``PROBE_FRACTION`` of the first
+    planned one. A render that is done by then is recorded as taking at most
+    the probe time, so when renders get faster the plan moves down with them
+    instead of staying at its first checkpoint.
+    """
+
+    PROBE_FRACTION = 0.5
+
+    def __init__(self, enabled=True, window=200, min_samples=5, quantiles=(0.25, 0.5, 0.65, 0.8, 0.9, 0.95),
+                 min_interval=2, timeout_factor=2, min_timeout=120, max_timeout=1800):
+        self.enabled = enabled
+        self.min_samples = min_samples
+        self.quantiles = sorted(quantiles)
+        self.min_interval = min_interval
+        self.timeout_factor = timeout_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._samples = deque(maxlen=window)
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._sorted = sorted(self._samples)
+
+    def quantile(self, q):
+        """Nearest-rank quantile of the recent render times; None without samples."""
+        ordered = self._sorted
+        if not ordered:
+            return None
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    def ready(self):
+        return self.enabled and len(self._sorted) >= self.min_samples
+
+    def next_delay(self, elapsed):
+        """Seconds until the next planned check of a task submitted ``elapsed`` seconds ago, or None."""
+        if not self.ready():
+            return None
+        checkpoints = [self.quantile(q) for q in self.quantiles]
+        checkpoints.insert(0, max(self.min_interval, checkpoints[0] * self.PROBE_FRACTION))
+        for checkpoint in checkpoints:
+            if checkpoint > elapsed:
+                return max(self.min_interval, checkpoint - elapsed)
+        return None
+
+    def timeout(self, default):
+        if not self.ready():
+            return default
+        return min(self.max_timeout, max(self.min_timeout, self.timeout_factor * self.quantile(0.99)))
+
+    def stats(self):
+        return {
+            "samples": len(self._sorted),
+            "quantiles": {q: self.quantile(q) for q in (0.5, 0.9, 0.99)},
+        }
+
+
+# Shared by the threaded poller and the asyncio engine.
+render_times = RenderTimeModel(**get_render_time_settings())
+
+
+class PollSchedule:
+    """When to check one Runway task, and when to give up on it.
+
+    ``submitted_at`` is the wall-clock submission time, kept on the task so a
+    render resumed after a restart keeps its age. A render that succeeds is
+    recorded in the model as finishing halfway between the last check that
+    still saw it running and the one that saw it done, or exactly when its
+    completion callback arrived. With ``fallback_interval`` set (completion
+    callbacks enabled) checks are only a slow sweep for missed callbacks.
+    """
+
+    def __init__(self, render_model, submitted_at, base_interval, max_interval, backoff, jitter, timeout,
+                 fallback_interval=None):
+        self.render_model = render_model
+        self.resumed = submitted_at is not None
+        self.submitted_at = submitted_at if submitted_at is not None else time.time()
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.timeout = timeout
+        self.fallback_interval = fallback_interval
+        self.polls = 0
+        self._backoff_polls = 0
+        self._last_running = None
+
+    def elapsed(self):
+        return time.time() - self.submitted_at
+
+    def next_delay(self):
+        if self.fallback_interval:
+            delay = self.fallback_interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            return min(delay, max(0, self.time_left()))
+        delay = self.render_model.next_delay(self.elapsed()) if self.render_model else None
+        if delay is None:
+            delay = backoff_delay(self._backoff_polls, self.base_interval, self.max_interval, self.backoff, self.jitter)
+            self._backoff_polls += 1
+        return min(delay, max(0, self.time_left()))
+
+    def time_left(self):
+        timeout = self.render_model.timeout(self.timeout) if self.render_model else self.timeout
+        return timeout - self.elapsed()
+
+    def record(self, status, delivered=False):
+        """Counts a status check that returned ``status``; ``delivered`` for a completion callback instead."""
+        elapsed = self.elapsed()
+        if not delivered:
+            self.polls += 1
+        if status not in RUNWAY_TERMINAL_STATUSES:
+            self._last_running = elapsed
+        elif status == "succeeded" and self.render_model:
+            if delivered:
+                self.render_model.observe(elapsed)
+            elif self._last_running is not None:
+                self.render_model.observe((self._last_running + elapsed) / 2)
+            elif not self.resumed:
+                # Done at the first check: only an upper bound is known. With a
+                # plan that check is the early probe, so the bound keeps halving
+                # while renders are faster than the plan expects.
+                self.render_model.observe(elapsed)
+
+
+class RunwayPollError(Exception):
+    """Raised through a watch future when a Runway task cannot be followed to completion."""
+
+
+class _PollEntry:
+    __slots__ = ("runway_task_id", "api_key", "future", "on_update", "schedule")
+
+    def __init__(self, runway_task_id, api_key, on_update, schedule):
+        self.runway_task_id = runway_task_id
+        self.api_key = api_key
+        self.future = Future()
+        self.on_update = on_update
+        self.schedule = schedule
+
+
+class RunwayPoller:
+    """Single background service that owns the status polling of every in-flight Runway task.
+
+    Due tasks are checked together in one sweep on a shared schedule. Each task
+    is checked at the times planned by ``render_model`` from recent render
+    times, or with its own jittered exponential backoff while there is no such
+    plan. Callers get a Future that resolves to the final status response
+    ("succeeded" or "failed"). A completion callback handed to ``deliver``
+    resolves it straight away; with callbacks enabled, pass
+    ``fallback_interval`` to only poll now and then for missed ones.
+    """
+
+    def __init__(self, check_status, base_interval=10, max_interval=30, backoff=1.5,
+                 jitter=0.2, timeout=300, max_parallel_checks=4, render_model=None, fallback_interval=None):
+        self._check_status = check_status
+        self.render_model = render_model
+        self.fallback_interval = fallback_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.timeout = timeout
+        self.max_parallel_checks = max_parallel_checks
+        self._heap = []
+        self._entries = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._stopped = False
+
+    def watch(self, runway_task_id, api_key, on_update=None, submitted_at=None):
+        """Starts tracking a Runway task; ``on_update`` is called with every status seen."""
+        schedule = PollSchedule(self.render_model, submitted_at, self.base_interval, self.max_interval,
+                                self.backoff, self.jitter, self.timeout, self.fallback_interval)
+        entry = _PollEntry(runway_task_id, api_key, on_update, schedule)
+        with self._cond:
+            self._ensure_started()
+            self._entries[runway_task_id] = entry
+            self._schedule(entry)
+            self._cond.notify()
+        return entry.future
+
+    def deliver(self, runway_task_id, response):
+        """Hands over a final status received by callback; False if this poller is not tracking the task."""
+        with self._cond:
+            entry = self._entries.get(runway_task_id)
+        if entry is None:
+            return False
+        self._handle(entry, response, delivered=True)
+        return True
+
+    def in_flight(self):
+        with self._cond:
+            return len(self._entries)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_parallel_checks, thread_name_prefix="runway-check")
+            self._thread = threading.Thread(target=self._run, name="runway-poller", daemon=True)
+            self._thread.start()
+
+    def _schedule(self, entry):
+        due = time.monotonic() + entry.schedule.next_delay()
+        heapq.heappush(self._heap, (due, next(self._seq), entry))
+
+    def _take_due(self):
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    due = []
+                    while self._heap and self._heap[0][0] <= now:
+                        entry = heapq.heappop(self._heap)[2]
+                        # Entries settled by a callback are dropped when they come due.
+                        if self._entries.get(entry.runway_task_id) is entry:
+                            due.append(entry)
+                    if due:
+                        return due
+                    continue
+                self._cond.wait(self._heap[0][0] - now if self._heap else None)
+            return None
+
+    def _run(self):
+        while True:
+            due = self._take_due()
+            if due is None:
+                return
+            for entry, response in zip(due, self._executor.map(self._check, due)):
+                self._handle(entry, response)
+
+    def _check(self, entry):
+        try:
+            return self._check_status(entry.runway_task_id, entry.api_key)
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _settle(self, entry):
+        """Stops tracking ``entry``; False if it was already settled by a check or a callback."""
+        with self._cond:
+            if self._entries.get(entry.runway_task_id) is not entry:
+                return False
+            del self._entries[entry.runway_task_id]
+            return True
+
+    def _handle(self, entry, response, delivered=False):
+        schedule = entry.schedule
+        if isinstance(response, dict) and "error" in response:
+            if self._settle(entry):
+                schedule.record(None)
+                polls_per_video.observe(schedule.polls)
+                entry.future.set_exception(RunwayPollError(f"RunwayML Status Check Error: {response['error']}"))
+            return
+        status = response.get("status")
+        finished = status in RUNWAY_TERMINAL_STATUSES
+        timed_out = not finished and schedule.time_left() <= 0
+        if (finished or timed_out) and not self._settle(entry):
+            return
+        schedule.record(status, delivered)
+        if entry.on_update:
+            try:
+                entry.on_update(status)
+            except Exception as e:
+                print(f"Runway status callback failed for {entry.runway_task_id}: {e}")
+        if finished:
+            polls_per_video.observe(schedule.polls)
+            entry.future.set_result(response)
+        elif timed_out:
+            polls_per_video.observe(schedule.polls)
+            entry.future.set_exception(RunwayPollError("RunwayML video generation timed out after polling."))
+        elif not delivered:
+            with self._cond:
+                self._schedule(entry)
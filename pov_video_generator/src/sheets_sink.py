@@ -0,0 +1,293 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Not on POSIX: each process keeps to its own spool and never claims others.
+    fcntl = None
+
+
+def get_sheets_sink_settings():
+    """Reads Google Sheets batching settings from the environment."""
+    return {
+        "max_batch": int(os.environ.get("POV_SHEETS_BATCH_SIZE", 50)),
+        "flush_interval": float(os.environ.get("POV_SHEETS_FLUSH_INTERVAL", 10)),
+        "max_retry_delay": float(os.environ.get("POV_SHEETS_MAX_RETRY_DELAY", 300)),
+        # Each process spools to "<path>.<pid>"; spools of processes that are gone are taken over on start.
+        "spool_path": os.environ.get("POV_SHEETS_SPOOL_PATH"),
+        # Rows kept in memory while Sheets is unavailable. Beyond this, rows wait only in the
+        # spool file, which has no limit; without a spool the oldest are dropped. 0: no limit.
+        "max_pending": int(os.environ.get("POV_SHEETS_MAX_PENDING", 10000)),
+    }
+
+
+class SheetsAppendSink:
+    """Buffers result rows and appends them to Google Sheets in batches.
+
+    Rows are flushed by a background thread when ``max_batch`` rows are waiting,
+    every ``flush_interval`` seconds, or on shutdown. A failed append keeps its
+    rows in the buffer and is retried with exponential backoff.
+
+    With a ``spool_path`` the buffer is mirrored to disk, so rows survive a
+    restart. Every process has its own spool file, which new rows are
+    appended to and which is rewritten only after a flush. At most
+    ``max_pending`` rows are held in memory; later ones wait only in the
+    spool (``spilled``) and are read back as flushes make room, so no row is
+    lost. Without a spool the oldest rows are dropped beyond ``max_pending``
+    and counted in ``dropped``.
+
+    A process holds a lock on its spool while it runs; on start, spools whose
+    lock is free belong to processes that are gone and are claimed by
+    renaming them, so exactly one process takes their rows over.
+    """
+
+    def __init__(self, append_rows, max_batch=50, flush_interval=10, max_retry_delay=300, spool_path=None, max_pending=10000):
+        self._append_rows = append_rows
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retry_delay = max_retry_delay
+        self.max_pending = max_pending
+        self.spool_path = f"{spool_path}.{os.getpid()}" if spool_path else None
+        self._spool_base = spool_path
+        self._spool_file = None
+        self._spool_lock = None
+        self._buffer = []
+        self.spilled = 0
+        self.dropped = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self._failures = 0
+        self._retry_at = 0
+        self._oldest_at = time.monotonic()
+        self.last_error = None
+        self._load_spool()
+
+    def add(self, spreadsheet_id, range_name, row):
+        with self._cond:
+            if not self._buffer:
+                self._oldest_at = time.monotonic()
+            item = (spreadsheet_id, range_name, list(row))
+            if self._spool_file is not None and (self.spilled or self._full()):
+                self.spilled += 1
+            else:
+                self._buffer.append(item)
+                self._drop_overflow()
+            self._append_spool([item])
+            self._ensure_started()
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._buffer) + self.spilled
+
+    def stats(self):
+        with self._cond:
+            return {"pending": len(self._buffer) + self.spilled, "spilled": self.spilled,
+                    "consecutive_failures": self._failures, "dropped": self.dropped}
+
+    def flush(self):
+        """Appends everything buffered now; returns False if an append failed."""
+        with self._flush_lock:
+            with self._cond:
+                batch = list(self._buffer)
+                dropped_before = self.dropped
+            if not batch:
+                return True
+            # Group rows per sheet, keeping submission order inside each group.
+            groups = OrderedDict()
+            for spreadsheet_id, range_name, row in batch:
+                groups.setdefault((spreadsheet_id, range_name), []).append(row)
+            sent = set()
+            ok = True
+            for (spreadsheet_id, range_name), rows in groups.items():
+                response = self._append_rows(spreadsheet_id, range_name, rows)
+                if isinstance(response, dict) and "error" in response:
+                    self.last_error = response["error"]
+                    print(f"Batched Google Sheets append failed, will retry: {response['error']}")
+                    ok = False
+                    continue
+                sent.add((spreadsheet_id, range_name))
+            with self._cond:
+                # Rows dropped meanwhile came off the front, i.e. out of this batch.
+                dropped = min(self.dropped - dropped_before, len(batch))
+                remaining = [item for item in batch[dropped:] if (item[0], item[1]) not in sent]
+                self._buffer = remaining + self._buffer[len(batch) - dropped:]
+                self._oldest_at = time.monotonic()
+                self._write_spool()
+            return ok
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+        with self._cond:
+            if self._spool_file is not None:
+                self._spool_file.close()
+                self._spool_file = None
+                if not self._buffer and not self.spilled:
+                    # Nothing left to hand over; the lock goes last, so no one adopts a half-removed spool.
+                    os.remove(self.spool_path)
+                    self._remove_leftovers(self.spool_path)
+            if self._spool_lock is not None:
+                os.close(self._spool_lock)
+                self._spool_lock = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sheets-sink", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = time.monotonic()
+                    if not self._buffer:
+                        self._cond.wait()
+                        continue
+                    ready_at = now if len(self._buffer) >= self.max_batch else self._oldest_at + self.flush_interval
+                    ready_at = max(ready_at, self._retry_at)
+                    if now >= ready_at:
+                        break
+                    self._cond.wait(ready_at - now)
+                if self._stopped:
+                    return
+            if self.flush():
+                self._failures = 0
+                self._retry_at = 0
+            else:
+                self._failures += 1
+                self._retry_at = time.monotonic() + min(self.max_retry_delay, 2 ** self._failures)
+
+    def _full(self):
+        return self.max_pending and len(self._buffer) >= self.max_pending
+
+    def _drop_overflow(self):
+        # Only without a spool: with one, rows beyond max_pending are spilled to it instead.
+        overflow = len(self._buffer) - self.max_pending
+        if self.max_pending and overflow > 0 and not self.spool_path:
+            del self._buffer[:overflow]
+            self.dropped += overflow
+            print(f"Google Sheets buffer is full, dropped the {overflow} oldest row(s).")
+
+    def _load_spool(self):
+        if not self.spool_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+        if fcntl is not None:
+            # Held until the process exits, which tells other processes this spool is in use.
+            self._spool_lock = os.open(f"{self.spool_path}.lock", os.O_CREAT | os.O_RDWR)
+            fcntl.flock(self._spool_lock, fcntl.LOCK_EX)
+        # A spool under this process's pid was left by an earlier process that had the same one.
+        for path in [f"{self.spool_path}.claimed", self.spool_path] + self._orphaned_spools():
+            claimed = f"{self.spool_path}.claimed"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue # Claimed by another process first
+            self._buffer.extend(self._read_spool(claimed))
+            self._write_spool()
+            os.remove(claimed)
+            if path != self.spool_path:
+                self._remove_leftovers(path)
+        self._write_spool()
+        if self.max_pending and len(self._buffer) > self.max_pending:
+            # Everything is in the spool file now; memory keeps only the oldest rows.
+            self.spilled = len(self._buffer) - self.max_pending
+            del self._buffer[self.max_pending:]
+        if self._buffer:
+            self._ensure_started()
+
+    @staticmethod
+    def _remove_leftovers(path):
+        """Removes the lock and temporary files of a spool whose process is gone."""
+        spool_path = path[:-len(".claimed")] if path.endswith(".claimed") else path
+        for leftover in (f"{spool_path}.lock", f"{spool_path}.tmp"):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+
+    def _orphaned_spools(self):
+        """Spool files of processes that are no longer running, plus one left by a single-file spool.
+
+        A process that died while taking spools over leaves their rows in a
+        "<spool>.<pid>.claimed" file, which is taken over as well.
+        """
+        directory = os.path.dirname(os.path.abspath(self._spool_base))
+        prefix = os.path.basename(self._spool_base)
+        paths = []
+        if os.path.exists(self._spool_base):
+            paths.append(self._spool_base)
+        if fcntl is None:
+            return paths
+        for entry in sorted(os.listdir(directory)):
+            pid = entry[len(prefix) + 1:] if entry.startswith(f"{prefix}.") else ""
+            if pid.endswith(".claimed"):
+                pid = pid[:-len(".claimed")]
+            if not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            path = os.path.join(directory, entry)
+            try:
+                lock = os.open(os.path.join(directory, f"{prefix}.{pid}.lock"), os.O_RDWR)
+            except FileNotFoundError:
+                paths.append(path)
+                continue
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                paths.append(path)
+            except BlockingIOError:
+                pass # Its process is still running
+            finally:
+                os.close(lock)
+        return paths
+
+    @staticmethod
+    def _read_spool(path):
+        rows = []
+        if not os.path.exists(path):
+            return rows
+        with open(path) as f:
+            for line in f:
+                try:
+                    spreadsheet_id, range_name, row = json.loads(line)
+                except ValueError:
+                    continue # Blank, or cut short by a crash mid-write
+                rows.append((spreadsheet_id, range_name, row))
+        return rows
+
+    def _append_spool(self, items):
+        if self._spool_file is None:
+            return
+        for item in items:
+            self._spool_file.write(json.dumps(item) + "\n")
+        self._spool_file.flush()
+
+    def _write_spool(self):
+        """Rewrites the spool with what is buffered and spilled now, reopens it for appending and refills the buffer."""
+        if not self.spool_path:
+            return
+        if self._spool_file is not None:
+            self._spool_file.close()
+        # Spilled rows are the last lines of the spool, after the buffered ones.
+        spilled = self._read_spool(self.spool_path)[-self.spilled:] if self.spilled else []
+        tmp_path = f"{self.spool_path}.tmp"
+        with open(tmp_path, "w") as f:
+            for item in self._buffer + spilled:
+                f.write(json.dumps(item) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.spool_path)
+        self._spool_file = open(self.spool_path, "a")
+        room = self.max_pending - len(self._buffer) if self.max_pending else len(spilled)
+        if spilled and room > 0:
+            self._buffer.extend(spilled[:room])
+            self.spilled -= min(room, len(spilled))
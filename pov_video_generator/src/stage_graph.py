@@ -0,0 +1,93 @@
+import asyncio
+import queue
+
+
+class StageGraph:
+    """Runs the stages of a workflow in dependency order, independent ones concurrently.
+
+    A stage is added with the names of the stages it needs (``after``) and is
+    called with their results, in that order, after ``args``. It starts as
+    soon as those have finished. The first stage to fail stops stages that
+    have not started yet; its error is raised once running stages are done.
+    """
+
+    def __init__(self):
+        self._stages = {}
+
+    def add(self, name, fn, *args, after=()):
+        missing = [dep for dep in after if dep not in self._stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {', '.join(missing)}")
+        self._stages[name] = (fn, args, tuple(after))
+        return self
+
+    def _ready(self, results, started):
+        return [name for name, (_, _, after) in self._stages.items()
+                if name not in started and all(dep in results for dep in after)]
+
+    def _call_args(self, name, results):
+        fn, args, after = self._stages[name]
+        return fn, args + tuple(results[dep] for dep in after)
+
+    def run(self, executor):
+        """Runs the graph on the calling thread plus ``executor``; returns {stage name: result}.
+
+        The calling thread runs one ready stage itself and hands any others to
+        the executor, so a chain of stages never leaves it.
+        """
+        results, started, running, error = {}, set(), 0, None
+        done = queue.Queue()
+
+        def run_stage(name, fn, args):
+            try:
+                done.put((name, fn(*args), None))
+            except Exception as e:
+                done.put((name, None, e))
+
+        while True:
+            ready = [] if error else self._ready(results, started)
+            started.update(ready)
+            for name in ready[1:]:
+                running += 1
+                executor.submit(run_stage, name, *self._call_args(name, results))
+            if ready:
+                try:
+                    fn, args = self._call_args(ready[0], results)
+                    results[ready[0]] = fn(*args)
+                except Exception as e:
+                    error = error or e
+            elif running:
+                name, result, stage_error = done.get()
+                running -= 1
+                if stage_error is not None:
+                    error = error or stage_error
+                else:
+                    results[name] = result
+            else:
+                break
+        if error is not None:
+            raise error
+        return results
+
+    async def run_async(self):
+        """Runs a graph of coroutine functions on the running event loop; returns {stage name: result}."""
+        results, started, running, error = {}, set(), {}, None
+        while True:
+            ready = [] if error else self._ready(results, started)
+            started.update(ready)
+            for name in ready:
+                fn, args = self._call_args(name, results)
+                running[asyncio.ensure_future(fn(*args))] = name
+            if not running:
+                break
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                if future.exception() is not None:
+                    error = error or future.exception()
+                else:
+                    results[name] = future.result()
+        if error is not None:
+            raise error
+        return results
+
@@ -0,0 +1,57 @@
+import threading
+
+
+class TaskEventBus:
+    """Wakes request handlers that are waiting for a task to change.
+
+    Only changes made in this process are signalled. Waiters in other gunicorn
+    workers fall back to re-reading the task store when their wait times out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}
+        self.closed = False
+
+    def subscribe(self, task_id):
+        """Registers interest in the next change of a task; check the store after subscribing."""
+        event = threading.Event()
+        with self._lock:
+            if self.closed:
+                event.set()
+            else:
+                self._waiters.setdefault(task_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, task_id, event):
+        with self._lock:
+            waiters = self._waiters.get(task_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[task_id]
+
+    def publish(self, task_id):
+        with self._lock:
+            waiters = self._waiters.pop(task_id, ())
+        for event in waiters:
+            event.set()
+
+    def close(self):
+        """Wakes every waiter for good, so open streams can end before the process exits."""
+        with self._lock:
+            self.closed = True
+            waiters, self._waiters = self._waiters, {}
+        for events in waiters.values():
+            for event in events:
+                event.set()
+
+    def wait(self, task_id, event, timeout):
+        """Blocks until ``event`` fires or ``timeout`` passes; always unsubscribes."""
+        try:
+            return event.wait(timeout)
+        finally:
+            self.unsubscribe(task_id, event)
+
+
+task_events = TaskEventBus()
@@ -0,0 +1,185 @@
+import threading
+from collections import OrderedDict
+
+# Step names and statuses are kept as indexes into these tuples; names that
+# are not listed are kept as they are.
+STEP_NAMES = (
+    "Starting workflow",
+    "Credential Check",
+    "Attached to in-flight task",
+    "GPT-4 Prompt Generation",
+    "FLUX Image Generation",
+    "RunwayML Video Generation",
+    "RunwayML Video Processing",
+    "Video Post-processing",
+    "Google Sheets Update",
+    "Gmail Notification",
+    "Resumed after restart",
+    "Workflow Finished",
+    "Workflow Error",
+    "Workflow Initialization Error",
+)
+STEP_STATUSES = ("processing", "polling", "submitted", "queued", "completed", "warning", "error", "interrupted")
+# Step fields holding free-form text from providers
+STEP_TEXT_FIELDS = ("message",)
+
+_NAME_CODES = {name: code for code, name in enumerate(STEP_NAMES)}
+_STATUS_CODES = {status: code for code, status in enumerate(STEP_STATUSES)}
+
+SHARED_TEXTS_MAX = 1024
+_shared_texts = OrderedDict()
+_shared_texts_lock = threading.Lock()
+
+
+def compact_text(value, limit):
+    """Cuts text longer than ``limit`` characters and returns one shared copy of recently seen text.
+
+    Many tasks failing on the same provider error then hold a single string.
+    """
+    if not isinstance(value, str):
+        return value
+    if limit and len(value) > limit:
+        value = f"{value[:limit]}... [{len(value) - limit} more characters]"
+    with _shared_texts_lock:
+        shared = _shared_texts.get(value)
+        if shared is not None:
+            _shared_texts.move_to_end(value)
+            return shared
+        _shared_texts[value] = value
+        if len(_shared_texts) > SHARED_TEXTS_MAX:
+            _shared_texts.popitem(last=False)
+    return value
+
+
+def compact_step_fields(fields, limit):
+    return {key: compact_text(value, limit) if key in STEP_TEXT_FIELDS else value for key, value in fields.items()}
+
+
+# Marks a slot whose field was never set, so that a field set to None still shows up.
+_UNSET = object()
+
+
+class StepRecord:
+    """A workflow step with enumerated name and status.
+
+    The fields most steps have get a slot; any others live in ``extra``.
+    """
+
+    __slots__ = ("name", "status", "timestamp", "output", "duration", "message", "extra")
+    FIELDS = ("output", "duration", "message")
+
+    def __init__(self, step):
+        self.name = self.status = self.timestamp = None
+        self.output = self.duration = self.message = _UNSET
+        self.extra = None
+        self.update(step)
+
+    def update(self, fields):
+        for key, value in fields.items():
+            if key == "name":
+                self.name = _NAME_CODES.get(value, value)
+            elif key == "status":
+                self.status = _STATUS_CODES.get(value, value)
+            elif key == "timestamp":
+                self.timestamp = value
+            elif key in self.FIELDS:
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def to_dict(self):
+        step = {
+            "name": STEP_NAMES[self.name] if isinstance(self.name, int) else self.name,
+            "status": STEP_STATUSES[self.status] if isinstance(self.status, int) else self.status,
+            "timestamp": self.timestamp,
+        }
+        for key in self.FIELDS:
+            value = getattr(self, key)
+            if value is not _UNSET:
+                step[key] = value
+        if self.extra:
+            step.update(self.extra)
+        return step
+
+
+class TaskRecord:
+    """A task as the memory store keeps it.
+
+    The workflow outputs every task has get a slot; other fields live in
+    ``data``. Only the last ``max_steps`` steps are kept, with
+    ``steps_dropped`` counting the older ones.
+    """
+
+    __slots__ = ("id", "status", "description", "result", "error", "batch_id", "created_at", "updated_at", "version",
+                 "client", "priority", "prompt", "image_url", "runway_task_id", "runway_submitted_at", "video_url",
+                 "max_steps", "steps", "steps_dropped", "data")
+    FIELDS = ("status", "description", "result", "error", "batch_id", "created_at", "updated_at", "version")
+    OUTPUT_FIELDS = ("client", "priority", "prompt", "image_url", "runway_task_id", "runway_submitted_at", "video_url")
+
+    def __init__(self, task_id, description, max_steps, now):
+        self.id = task_id
+        self.status = "pending"
+        self.description = description
+        self.result = self.error = self.batch_id = None
+        self.created_at = self.updated_at = now
+        self.version = 0
+        for key in self.OUTPUT_FIELDS:
+            setattr(self, key, _UNSET)
+        self.max_steps = max_steps
+        self.steps = []
+        self.steps_dropped = 0
+        self.data = None
+
+    def get(self, key, default=None):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if key in self.OUTPUT_FIELDS:
+            value = getattr(self, key)
+            return default if value is _UNSET else value
+        return (self.data or {}).get(key, default)
+
+    def update(self, fields):
+        for key, value in fields.items():
+            if key in self.FIELDS or key in self.OUTPUT_FIELDS:
+                setattr(self, key, value)
+            else:
+                if self.data is None:
+                    self.data = {}
+                self.data[key] = value
+
+    def append_step(self, step):
+        # A list trimmed from the front: for a handful of steps it is far smaller than a deque.
+        if self.max_steps and len(self.steps) >= self.max_steps:
+            del self.steps[0]
+            self.steps_dropped += 1
+        self.steps.append(StepRecord(step))
+
+    def update_last_step(self, fields):
+        self.steps[-1].update(fields)
+
+    def to_dict(self, include_steps=True):
+        task = {}
+        for key in self.OUTPUT_FIELDS:
+            value = getattr(self, key)
+            if value is not _UNSET:
+                task[key] = value
+        if self.data:
+            task.update(self.data)
+        task.update({
+            "id": self.id,
+            "status": self.status,
+            "description": self.description,
+            "result": self.result,
+            "error": self.error,
+            "batch_id": self.batch_id,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "version": self.version,
+        })
+        if include_steps:
+            task["steps"] = [step.to_dict() for step in self.steps]
+        if self.steps_dropped:
+            task["steps_dropped"] = self.steps_dropped
+        return task
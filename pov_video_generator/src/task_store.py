@@ -0,0 +1,472 @@
+import os
+import threading
+import time
+import uuid
+
+from src.models.task import Task, db
+from src.task_records import TaskRecord, compact_step_fields, compact_text
+
+FINISHED_STATUSES = ("completed", "error")
+
+
+def get_task_store_settings():
+    """Reads task store backend and retention settings from the environment."""
+    return {
+        "backend": os.environ.get("POV_TASK_STORE", "sqlite"),
+        "ttl": float(os.environ.get("POV_TASK_TTL", 7 * 24 * 3600)),
+        "purge_interval": float(os.environ.get("POV_TASK_PURGE_INTERVAL", 600)),
+        "lease_ttl": float(os.environ.get("POV_TASK_LEASE_TTL", 90)),
+        "heartbeat_interval": float(os.environ.get("POV_TASK_HEARTBEAT_INTERVAL", 30)),
+        # Steps kept per task (older ones are dropped) and longest error text kept
+        "max_steps": int(os.environ.get("POV_TASK_MAX_STEPS", 32)),
+        "max_error_chars": int(os.environ.get("POV_TASK_MAX_ERROR_CHARS", 2000)),
+    }
+
+
+class BaseTaskStore:
+    """Interface shared by the task store backends.
+
+    Task records are plain dicts: ``id``, ``status``, ``description``,
+    ``result``, ``error``, ``batch_id``, ``steps``, ``created_at``, ``updated_at``,
+    ``version`` (bumped on every change) plus any workflow outputs set through
+    ``update``. Finished tasks older than ``ttl``
+    seconds are purged, at most once every ``purge_interval`` seconds.
+
+    Only the last ``max_steps`` steps are kept, with ``steps_dropped``
+    counting older ones, and error text is cut to ``max_error_chars``.
+    """
+
+    def __init__(self, ttl, purge_interval, max_steps=32, max_error_chars=2000):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.max_steps = max_steps
+        self.max_error_chars = max_error_chars
+        self._last_purge = time.monotonic()
+
+    def _compact(self, fields):
+        if fields.get("error") is not None:
+            fields = dict(fields, error=compact_text(fields["error"], self.max_error_chars))
+        return fields
+
+    def _compact_step(self, step):
+        return compact_step_fields(step, self.max_error_chars)
+
+    def create(self, description, **fields):
+        raise NotImplementedError
+
+    def get(self, task_id):
+        raise NotImplementedError
+
+    def update(self, task_id, **fields):
+        raise NotImplementedError
+
+    def version(self, task_id):
+        """Returns the task's ``version`` without loading the task, or None if it does not exist."""
+        raise NotImplementedError
+
+    def append_step(self, task_id, step):
+        raise NotImplementedError
+
+    def update_last_step(self, task_id, **fields):
+        raise NotImplementedError
+
+    def delete(self, task_id):
+        raise NotImplementedError
+
+    def list_tasks(self, status=None, after_id=None, limit=None, updated_since=None, summary=False, batch_id=None):
+        """Returns tasks ordered by id; ``summary`` leaves out the steps list."""
+        raise NotImplementedError
+
+    def change_marker(self, status=None):
+        """Returns a cheap (count, latest updated_at, sum of versions) tuple that changes whenever the listing would."""
+        raise NotImplementedError
+
+    def count_by_status(self):
+        """Returns {status: number of tasks}."""
+        raise NotImplementedError
+
+    def purge_expired(self):
+        raise NotImplementedError
+
+    def find_by_runway_task_id(self, runway_task_id):
+        """Returns the task a Runway task id was recorded on, or None."""
+        raise NotImplementedError
+
+    def take_over(self, task_id):
+        """Moves the lease on an unfinished task to this process; returns the task.
+
+        Returns None when it lost the race, and when this process already
+        owns the task: its own workflow picks up the result then.
+        """
+        # Without leases the store is process-local, so this process owns every task.
+        return None
+
+    def hold(self, task_id):
+        """Renews this process's lease on a task; False if another process took it over."""
+        return True
+
+    def heartbeat(self):
+        """Renews the lease on every unfinished task owned by this process."""
+
+    def claim_stale(self, cutoff):
+        """Takes over unfinished tasks whose lease was last renewed before ``cutoff``; returns them."""
+        return []
+
+    def release_leases(self):
+        """Gives up this process's leases so another process can adopt its tasks right away."""
+
+    def _maybe_purge(self):
+        if self.ttl and time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            self.purge_expired()
+
+
+class MemoryTaskStore(BaseTaskStore):
+    """Process-local store; tasks are lost on restart and not shared between workers.
+
+    Tasks are kept as slotted TaskRecords and copied out as dicts on read.
+    """
+
+    def __init__(self, ttl=0, purge_interval=600, max_steps=32, max_error_chars=2000):
+        super().__init__(ttl, purge_interval, max_steps, max_error_chars)
+        self._tasks = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def create(self, description, **fields):
+        self._maybe_purge()
+        now = time.time()
+        with self._lock:
+            task_id = self._next_id
+            self._next_id += 1
+            task = TaskRecord(task_id, description, self.max_steps, now)
+            task.update(self._compact(fields))
+            self._tasks[task_id] = task
+            return task.to_dict()
+
+    def get(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return task.to_dict() if task else None
+
+    def version(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return task.version if task else None
+
+    def update(self, task_id, **fields):
+        fields = self._compact(fields)
+        with self._lock:
+            task = self._tasks[task_id]
+            task.update(fields)
+            task.updated_at = time.time()
+            task.version += 1
+
+    def append_step(self, task_id, step):
+        step = self._compact_step(step)
+        with self._lock:
+            task = self._tasks[task_id]
+            task.append_step(step)
+            task.updated_at = time.time()
+            task.version += 1
+
+    def update_last_step(self, task_id, **fields):
+        fields = self._compact_step(fields)
+        with self._lock:
+            task = self._tasks[task_id]
+            task.update_last_step(fields)
+            task.updated_at = time.time()
+            task.version += 1
+
+    def delete(self, task_id):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def _matching(self, status=None, updated_since=None, batch_id=None):
+        for task in self._tasks.values():
+            if status is not None and task.status != status:
+                continue
+            if batch_id is not None and task.batch_id != batch_id:
+                continue
+            if updated_since is not None and task.updated_at <= updated_since:
+                continue
+            yield task
+
+    def list_tasks(self, status=None, after_id=None, limit=None, updated_since=None, summary=False, batch_id=None):
+        with self._lock:
+            result = []
+            for task in sorted(self._matching(status, updated_since, batch_id), key=lambda task: task.id):
+                if after_id is not None and task.id <= after_id:
+                    continue
+                if limit is not None and len(result) >= limit:
+                    break
+                result.append(task.to_dict(include_steps=not summary))
+            return result
+
+    def change_marker(self, status=None):
+        with self._lock:
+            matching = list(self._matching(status))
+            return (len(matching), max((task.updated_at for task in matching), default=None),
+                    sum(task.version for task in matching))
+
+    def count_by_status(self):
+        with self._lock:
+            counts = {}
+            for task in self._tasks.values():
+                counts[task.status] = counts.get(task.status, 0) + 1
+            return counts
+
+    def find_by_runway_task_id(self, runway_task_id):
+        with self._lock:
+            for task in self._tasks.values():
+                if task.get("runway_task_id") == runway_task_id:
+                    return task.to_dict()
+            return None
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [task_id for task_id, task in self._tasks.items()
+                       if task.status in FINISHED_STATUSES and task.updated_at < cutoff]
+            for task_id in expired:
+                del self._tasks[task_id]
+        return len(expired)
+
+
+class SqlTaskStore(BaseTaskStore):
+    """Stores tasks in the Flask-SQLAlchemy database (SQLite by default).
+
+    Ids come from the table's autoincrement primary key, so several gunicorn
+    workers can share one database without handing out the same id. Each
+    unfinished task is leased by the process that runs it (``owner``), so
+    tasks of a process that died can be adopted by another one.
+    """
+
+    _TASK_COLUMNS = ("status", "description", "result", "error", "batch_id", "steps", "runway_task_id")
+
+    def __init__(self, app, ttl=0, purge_interval=600, max_steps=32, max_error_chars=2000):
+        super().__init__(ttl, purge_interval, max_steps, max_error_chars)
+        self.app = app
+        self.owner = uuid.uuid4().hex
+
+    def _split_fields(self, row, fields):
+        data = None
+        for key, value in self._compact(fields).items():
+            if key in self._TASK_COLUMNS:
+                setattr(row, key, value)
+            else:
+                if data is None:
+                    data = dict(row.data or {})
+                data[key] = value
+        if data is not None:
+            row.data = data
+
+    def create(self, description, **fields):
+        self._maybe_purge()
+        now = time.time()
+        with self.app.app_context():
+            row = Task(status="pending", description=description, steps=[], data={}, created_at=now, updated_at=now,
+                       version=0, owner=self.owner, heartbeat_at=now)
+            self._split_fields(row, fields)
+            db.session.add(row)
+            db.session.commit()
+            return row.to_dict()
+
+    def get(self, task_id):
+        with self.app.app_context():
+            row = db.session.get(Task, task_id)
+            return row.to_dict() if row else None
+
+    _VERSION_QUERY = db.select(Task.version).where(Task.id == db.bindparam("task_id"))
+
+    def version(self, task_id):
+        # Runs on every status poll: a pooled connection skips the session setup, most of a get()'s cost.
+        with self.app.app_context(), db.engine.connect() as connection:
+            return connection.execute(self._VERSION_QUERY, {"task_id": task_id}).scalar()
+
+    def _modify(self, task_id, change):
+        with self.app.app_context():
+            row = db.session.get(Task, task_id)
+            if row is None:
+                raise KeyError(task_id)
+            change(row)
+            row.updated_at = time.time()
+            row.version = (row.version or 0) + 1
+            db.session.commit()
+
+    def update(self, task_id, **fields):
+        self._modify(task_id, lambda row: self._split_fields(row, fields))
+
+    def append_step(self, task_id, step):
+        step = self._compact_step(step)
+        def change(row):
+            steps = list(row.steps or []) + [dict(step)]
+            if self.max_steps and len(steps) > self.max_steps:
+                dropped = len(steps) - self.max_steps
+                steps = steps[dropped:]
+                row.data = dict(row.data or {}, steps_dropped=(row.data or {}).get("steps_dropped", 0) + dropped)
+            row.steps = steps
+        self._modify(task_id, change)
+
+    def update_last_step(self, task_id, **fields):
+        fields = self._compact_step(fields)
+        def change(row):
+            steps = list(row.steps or [])
+            steps[-1] = dict(steps[-1], **fields)
+            row.steps = steps
+        self._modify(task_id, change)
+
+    def delete(self, task_id):
+        with self.app.app_context():
+            Task.query.filter_by(id=task_id).delete()
+            db.session.commit()
+
+    def list_tasks(self, status=None, after_id=None, limit=None, updated_since=None, summary=False, batch_id=None):
+        with self.app.app_context():
+            query = Task.query
+            if status is not None:
+                query = query.filter(Task.status == status)
+            if batch_id is not None:
+                query = query.filter(Task.batch_id == batch_id)
+            if after_id is not None:
+                query = query.filter(Task.id > after_id)
+            if updated_since is not None:
+                query = query.filter(Task.updated_at > updated_since)
+            if summary:
+                query = query.options(db.defer(Task.steps))
+            query = query.order_by(Task.id)
+            if limit is not None:
+                query = query.limit(limit)
+            return [row.to_dict(include_steps=not summary) for row in query.all()]
+
+    def change_marker(self, status=None):
+        with self.app.app_context():
+            query = db.session.query(db.func.count(Task.id), db.func.max(Task.updated_at), db.func.sum(Task.version))
+            if status is not None:
+                query = query.filter(Task.status == status)
+            count, latest, versions = query.one()
+            return count, latest, versions or 0
+
+    def count_by_status(self):
+        with self.app.app_context():
+            return dict(db.session.query(Task.status, db.func.count(Task.id)).group_by(Task.status).all())
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        with self.app.app_context():
+            deleted = Task.query.filter(Task.status.in_(FINISHED_STATUSES), Task.updated_at < cutoff).delete(synchronize_session=False)
+            db.session.commit()
+            return deleted
+
+    def find_by_runway_task_id(self, runway_task_id):
+        with self.app.app_context():
+            row = Task.query.filter_by(runway_task_id=runway_task_id).first()
+            return row.to_dict() if row else None
+
+    def take_over(self, task_id):
+        with self.app.app_context():
+            row = db.session.get(Task, task_id)
+            if row is None or row.status in FINISHED_STATUSES or row.owner == self.owner:
+                return None
+            # Fenced on the heartbeat too: an owner that renews its lease first (see hold) keeps the task.
+            won = Task.query.filter(Task.id == task_id, Task.owner == row.owner, Task.heartbeat_at == row.heartbeat_at,
+                                    Task.status.notin_(FINISHED_STATUSES)).update(
+                {"owner": self.owner, "heartbeat_at": time.time()}, synchronize_session=False)
+            db.session.commit()
+            if not won:
+                return None
+            return db.session.get(Task, task_id).to_dict()
+
+    def hold(self, task_id):
+        with self.app.app_context():
+            held = Task.query.filter(Task.id == task_id, Task.owner == self.owner).update(
+                {"heartbeat_at": time.time()}, synchronize_session=False)
+            db.session.commit()
+            return bool(held)
+
+    def heartbeat(self):
+        with self.app.app_context():
+            Task.query.filter(Task.owner == self.owner, Task.status.notin_(FINISHED_STATUSES)).update(
+                {"heartbeat_at": time.time()}, synchronize_session=False)
+            db.session.commit()
+
+    def claim_stale(self, cutoff):
+        with self.app.app_context():
+            stale = db.or_(Task.heartbeat_at.is_(None), Task.heartbeat_at < cutoff)
+            candidates = [task_id for (task_id,) in db.session.query(Task.id).filter(Task.status.notin_(FINISHED_STATUSES), stale)]
+            claimed = []
+            for task_id in candidates:
+                # Conditional update so that only one process wins each task.
+                won = Task.query.filter(Task.id == task_id, stale).update(
+                    {"owner": self.owner, "heartbeat_at": time.time()}, synchronize_session=False)
+                db.session.commit()
+                if won:
+                    claimed.append(db.session.get(Task, task_id).to_dict())
+            return claimed
+
+    def release_leases(self):
+        with self.app.app_context():
+            Task.query.filter(Task.owner == self.owner, Task.status.notin_(FINISHED_STATUSES)).update(
+                {"heartbeat_at": 0}, synchronize_session=False)
+            db.session.commit()
+
+
+class LeaseKeeper:
+    """Renews this process's task leases and adopts tasks left behind by processes that stopped.
+
+    ``resume`` is called with the record of every adopted task. The first pass
+    runs on start, which is how a restarted server picks up unfinished work.
+    """
+
+    def __init__(self, resume, lease_ttl=90, interval=30):
+        self._resume = resume
+        self.lease_ttl = lease_ttl
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="task-lease-keeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def tick(self):
+        store = get_task_store()
+        store.heartbeat()
+        for task in store.claim_stale(time.time() - self.lease_ttl):
+            try:
+                self._resume(task)
+            except Exception as e:
+                print(f"Could not resume task {task['id']}: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Task lease keeper error: {e}")
+            if self._stopped.wait(self.interval):
+                return
+
+
+_store = MemoryTaskStore()
+
+def get_task_store():
+    return _store
+
+def set_task_store(store):
+    global _store
+    _store = store
+
+def create_task_store(app):
+    """Builds the store selected by POV_TASK_STORE ("sqlite" or "memory")."""
+    settings = get_task_store_settings()
+    limits = (settings["max_steps"], settings["max_error_chars"])
+    if settings["backend"] == "memory":
+        return MemoryTaskStore(settings["ttl"], settings["purge_interval"], *limits)
+    return SqlTaskStore(app, settings["ttl"], settings["purge_interval"], *limits)
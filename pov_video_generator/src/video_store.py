@@ -0,0 +1,219 @@
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from src.image_store import BASE_DIR
+
+VIDEO_ROUTE = "/api/videos/"
+VIDEO_EXTENSIONS = {"video/mp4": "mp4", "video/webm": "webm", "video/quicktime": "mov"}
+# Video hosts often label files generically; those are stored as mp4.
+GENERIC_CONTENT_TYPES = ("application/octet-stream", "binary/octet-stream", "")
+# "<sha256>.<ext>" for a downloaded video, "<sha256>-poster.jpg" and "<sha256>-<height>p.mp4" for files made from it
+_VIDEO_NAME = re.compile(r"^[0-9a-f]{64}(\.(mp4|webm|mov)|-poster\.jpg|-[0-9]{3,4}p\.mp4)$")
+
+
+def parse_renditions(spec):
+    """Turns "720:2500k,480:1000k" into [(720, "2500k"), (480, "1000k")]: frame height and video bitrate."""
+    renditions = []
+    for item in spec.split(","):
+        if item.strip():
+            height, _, bitrate = item.strip().partition(":")
+            renditions.append((int(height), bitrate or "1000k"))
+    return renditions
+
+
+def get_video_store_settings():
+    """Reads whether Runway videos are kept locally, where, and which files are made from them."""
+    return {
+        # Download finished videos instead of passing on Runway's expiring URL
+        "enabled": os.environ.get("POV_VIDEO_POSTPROCESS", "false").lower() == "true",
+        "root": os.environ.get("POV_VIDEO_STORE_DIR", os.path.join(BASE_DIR, "storage", "videos")),
+        "public_base_url": os.environ.get("POV_PUBLIC_BASE_URL", "").rstrip("/"),
+        "max_bytes": int(os.environ.get("POV_VIDEO_MAX_BYTES", 512 * 1024 * 1024)),
+        "chunk_size": int(os.environ.get("POV_VIDEO_DOWNLOAD_CHUNK_SIZE", 1024 * 1024)),
+        # Posters and renditions need ffmpeg; without it only the video itself is kept.
+        "ffmpeg": os.environ.get("POV_FFMPEG_PATH", "ffmpeg"),
+        "transcode_workers": int(os.environ.get("POV_VIDEO_TRANSCODE_WORKERS", 2)),
+        "transcode_timeout": float(os.environ.get("POV_VIDEO_TRANSCODE_TIMEOUT", 600)),
+        "poster_height": int(os.environ.get("POV_VIDEO_POSTER_HEIGHT", 720)),
+        "renditions": parse_renditions(os.environ.get("POV_VIDEO_RENDITIONS", "720:2500k,480:1000k")),
+    }
+
+
+class VideoTooLargeError(Exception):
+    """Raised when a streamed video exceeds the configured size limit."""
+
+
+class TranscodeError(Exception):
+    """Raised when ffmpeg fails to make a poster or rendition."""
+
+
+def poster_command(ffmpeg, source, target, height):
+    # The thumbnail filter picks a representative frame from the first ones rather than a black first frame.
+    return [ffmpeg, "-nostdin", "-v", "error", "-y", "-i", source,
+            "-vf", f"thumbnail=50,scale=-2:{height}", "-frames:v", "1", "-q:v", "3", "-f", "image2", target]
+
+
+def rendition_command(ffmpeg, source, target, height, bitrate):
+    return [ffmpeg, "-nostdin", "-v", "error", "-y", "-i", source,
+            "-vf", f"scale=-2:{height}", "-c:v", "libx264", "-preset", "veryfast", "-b:v", bitrate,
+            "-maxrate", bitrate, "-bufsize", bitrate, "-c:a", "aac", "-b:a", "96k",
+            # Index up front, so players can start and seek before the whole file is in
+            "-movflags", "+faststart", "-f", "mp4", target]
+
+
+class LocalVideoStore:
+    """Content-addressed videos on local disk, with posters and lower-bitrate renditions.
+
+    Like images, videos are named by the sha256 of their bytes and written to
+    disk as they arrive, so a video is never held in memory. Posters and
+    renditions are made by ffmpeg processes in the background, at most
+    ``transcode_workers`` at a time, and skipped when they already exist.
+    """
+
+    def __init__(self, root, public_base_url="", max_bytes=512 * 1024 * 1024, ffmpeg="ffmpeg", transcode_workers=2,
+                 transcode_timeout=600, poster_height=720, renditions=()):
+        self.root = root
+        self.public_base_url = public_base_url
+        self.max_bytes = max_bytes
+        self.ffmpeg = shutil.which(ffmpeg)
+        self.transcode_workers = transcode_workers
+        self.transcode_timeout = transcode_timeout
+        self.poster_height = poster_height
+        self.renditions = list(renditions)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def path_for(self, name):
+        if not _VIDEO_NAME.match(name):
+            return None
+        return os.path.join(self.root, name[:2], name)
+
+    def put_stream(self, chunks, content_type):
+        """Stores a video from an iterable of byte chunks and returns its name ("<sha256>.<ext>")."""
+        extension = VIDEO_EXTENSIONS.get(content_type, "mp4")
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise VideoTooLargeError(f"Video is larger than {self.max_bytes} bytes.")
+                    digest.update(chunk)
+                    f.write(chunk)
+            name = f"{digest.hexdigest()}.{extension}"
+            path = self.path_for(name)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return name
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def url_for(self, name):
+        """URL the file is served at; relative to this backend unless a public base URL is set."""
+        return f"{self.public_base_url}{VIDEO_ROUTE}{name}"
+
+    def _transcode_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.transcode_workers, thread_name_prefix="pov-transcode")
+            return self._pool
+
+    def _run_ffmpeg(self, name, command_for):
+        """Makes file ``name`` with the ffmpeg command ``command_for(target)`` unless it exists."""
+        path = self.path_for(name)
+        if os.path.exists(path):
+            return name
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        os.close(fd)
+        try:
+            result = subprocess.run(command_for(tmp_path), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE, timeout=self.transcode_timeout)
+            if result.returncode != 0:
+                raise TranscodeError(f"ffmpeg exited with {result.returncode}: {result.stderr.decode(errors='replace').strip()[-500:]}")
+            os.replace(tmp_path, path)
+            return name
+        except subprocess.TimeoutExpired:
+            raise TranscodeError(f"ffmpeg took longer than {self.transcode_timeout} seconds.")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def derive(self, name, on_done):
+        """Starts making the poster and renditions of a stored video and returns right away.
+
+        ``on_done(derived)`` is called on a transcode thread once all of them
+        are made, with {"poster": name or None, "renditions": {"480p": name, ...},
+        "errors": [...]}; a file that could not be made is reported in
+        ``errors`` and left out.
+        """
+        if self.ffmpeg is None:
+            on_done({"poster": None, "renditions": {}, "errors": ["ffmpeg is not installed; no poster or renditions were made."]})
+            return
+        source = self.path_for(name)
+        digest = name.split(".", 1)[0]
+        pool = self._transcode_pool()
+        jobs = {"poster": pool.submit(self._run_ffmpeg, f"{digest}-poster.jpg",
+                                      lambda target: poster_command(self.ffmpeg, source, target, self.poster_height))}
+        for height, bitrate in self.renditions:
+            jobs[f"{height}p"] = pool.submit(
+                self._run_ffmpeg, f"{digest}-{height}p.mp4",
+                lambda target, height=height, bitrate=bitrate: rendition_command(self.ffmpeg, source, target, height, bitrate),
+            )
+        remaining = [len(jobs)]
+        remaining_lock = threading.Lock()
+
+        def job_done(_):
+            with remaining_lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            on_done(self._collect(jobs))
+
+        for job in list(jobs.values()):
+            job.add_done_callback(job_done)
+
+    @staticmethod
+    def _collect(jobs):
+        derived = {"poster": None, "renditions": {}, "errors": []}
+        for label, job in jobs.items():
+            try:
+                if label == "poster":
+                    derived["poster"] = job.result()
+                else:
+                    derived["renditions"][label] = job.result()
+            except CancelledError:
+                derived["errors"].append(f"{label}: cancelled at shutdown")
+            except (TranscodeError, OSError) as e:
+                derived["errors"].append(f"{label}: {e}")
+        return derived
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_store = None
+
+def get_video_store():
+    global _store
+    if _store is None:
+        settings = get_video_store_settings()
+        _store = LocalVideoStore(settings["root"], settings["public_base_url"], settings["max_bytes"], settings["ffmpeg"],
+                                 settings["transcode_workers"], settings["transcode_timeout"], settings["poster_height"],
+                                 settings["renditions"])
+    return _store
@@ -0,0 +1,52 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+
+
+def get_webhook_settings():
+    """Reads provider callback settings from the environment; callbacks are off without a secret."""
+    return {
+        "runway_secret": os.environ.get("POV_RUNWAY_WEBHOOK_SECRET", ""),
+        # Signatures older than this many seconds are rejected (replay protection).
+        "tolerance": float(os.environ.get("POV_WEBHOOK_TOLERANCE", 300)),
+        # Status checks still made while callbacks are on, to catch missed events.
+        "fallback_interval": float(os.environ.get("POV_RUNWAY_WEBHOOK_FALLBACK_INTERVAL", 120)),
+    }
+
+
+def sign_payload(secret, body, timestamp=None):
+    """Signature header value for ``body``: "t=<unix time>,v1=<hex HMAC-SHA256 of '<t>.<body>'>"."""
+    timestamp = int(time.time() if timestamp is None else timestamp)
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(secret, header, body, tolerance=300):
+    """Checks a signature made by sign_payload; returns False if it is malformed, wrong or too old."""
+    fields = dict(part.split("=", 1) for part in header.split(",") if "=" in part)
+    try:
+        timestamp = int(fields["t"])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    expected = sign_payload(secret, body, timestamp).split("v1=", 1)[1]
+    # Compared as bytes: compare_digest raises on non-ASCII strings, which a forged header may hold.
+    return hmac.compare_digest(expected.encode(), fields.get("v1", "").encode("latin-1", "replace"))
+
+
+_events = {}
+_events_lock = threading.Lock()
+
+def record_event(provider, outcome):
+    with _events_lock:
+        _events[(provider, outcome)] = _events.get((provider, outcome), 0) + 1
+
+def get_event_counts():
+    """Returns {(provider, outcome): number of callbacks received}."""
+    with _events_lock:
+        return dict(_events)
@@ -0,0 +1,416 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from src.metrics import Histogram, HistogramFamily
+
+# Interactive work (single videos) is served ahead of bulk work (batches) by weight.
+PRIORITIES = ("interactive", "bulk")
+
+
+def get_worker_settings():
+    """Reads worker pool and per-stage concurrency settings from the environment."""
+    return {
+        "engine": os.environ.get("POV_WORKFLOW_ENGINE", "threads"),
+        "workers": int(os.environ.get("POV_WORKERS", 4)),
+        "queue_size": int(os.environ.get("POV_QUEUE_SIZE", 32)),
+        "async_max_pipelines": int(os.environ.get("POV_ASYNC_MAX_PIPELINES", 1000)),
+        # Threads the asyncio engine makes task store and result cache calls on
+        "async_store_workers": int(os.environ.get("POV_ASYNC_STORE_WORKERS", 4)),
+        "batch_max_size": int(os.environ.get("POV_BATCH_MAX_SIZE", 500)),
+        "batch_prompt_chunk": int(os.environ.get("POV_BATCH_PROMPT_CHUNK", 10)),
+        # Threads for workflow stages that run next to the one a worker runs itself
+        "side_stage_workers": int(os.environ.get("POV_SIDE_STAGE_WORKERS", 4)),
+        # Weighted round-robin between priority classes
+        "priority_weights": {
+            "interactive": int(os.environ.get("POV_INTERACTIVE_WEIGHT", 4)),
+            "bulk": int(os.environ.get("POV_BULK_WEIGHT", 1)),
+        },
+        # Workflows one client may have started and not yet finished (0 = no limit)
+        "client_max_in_flight": int(os.environ.get("POV_CLIENT_MAX_IN_FLIGHT", 8)),
+        # Share of the admission queue one client may fill
+        "client_queue_share": float(os.environ.get("POV_CLIENT_QUEUE_SHARE", 0.5)),
+        # Seconds a stopping process waits for running workflows before handing them off
+        "shutdown_timeout": float(os.environ.get("POV_SHUTDOWN_TIMEOUT", 25)),
+        "stage_limits": {
+            "openai": int(os.environ.get("POV_OPENAI_CONCURRENCY", 4)),
+            "flux": int(os.environ.get("POV_FLUX_CONCURRENCY", 4)),
+            "runway": int(os.environ.get("POV_RUNWAY_CONCURRENCY", 2)),
+            # Downloads of finished videos from Runway's storage
+            "video": int(os.environ.get("POV_VIDEO_DOWNLOAD_CONCURRENCY", 2)),
+        },
+        # Requests per second and burst size per provider; a rate of 0 disables the limit.
+        "stage_rates": {
+            "openai": (float(os.environ.get("POV_OPENAI_RATE", 8)), int(os.environ.get("POV_OPENAI_BURST", 16))),
+            "flux": (float(os.environ.get("POV_FLUX_RATE", 0)), int(os.environ.get("POV_FLUX_BURST", 8))),
+            "runway": (float(os.environ.get("POV_RUNWAY_RATE", 5)), int(os.environ.get("POV_RUNWAY_BURST", 10))),
+        },
+    }
+
+
+class QueueFullError(Exception):
+    """Raised when the admission queue cannot accept another workflow."""
+
+    def __init__(self, queue_depth, max_queue_size):
+        super().__init__(f"Admission queue is full ({queue_depth}/{max_queue_size}).")
+        self.queue_depth = queue_depth
+        self.max_queue_size = max_queue_size
+
+
+class ClientQuotaError(Exception):
+    """Raised when one client already has as much work queued or running as it may."""
+
+    def __init__(self, client, limit):
+        super().__init__(f"Client {client} has reached its limit of {limit} queued videos.")
+        self.client = client
+        self.limit = limit
+
+
+class PoolClosedError(Exception):
+    """Raised when work is submitted to a pool that is shutting down."""
+
+
+class FairQueue:
+    """Pending work shared out across priority classes and clients.
+
+    Classes take turns by weighted round-robin (``weights``, e.g. 4 interactive
+    items for every bulk one while both are waiting) and, within a class,
+    clients take turns, so a burst from one client does not delay the others.
+    A dispatched item with a ``ticket`` counts against its client until
+    ``release`` is called; clients at ``max_in_flight`` are skipped meanwhile.
+    Not thread-safe; WorkerPool guards it with its lock.
+    """
+
+    def __init__(self, weights, max_in_flight=0):
+        self.max_in_flight = max_in_flight
+        self._turns = [priority for priority in PRIORITIES for _ in range(max(1, weights.get(priority, 1)))]
+        self._turn = 0
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._in_flight = {}
+        self._tickets = {}
+        self._queued_by_client = {}
+        self._size = 0
+        self.admission_depth = 0
+
+    def __len__(self):
+        return self._size
+
+    def queued_for(self, client):
+        """Admission-lane items of ``client`` still waiting."""
+        return self._queued_by_client.get(client, 0)
+
+    def push(self, item, client=None, priority="interactive", ticket=None, admitted=False):
+        """Queues ``item``; ``admitted`` work (e.g. the tasks of an accepted batch) does not count as admission depth."""
+        self._queues[priority].setdefault(client, deque()).append((item, ticket, admitted))
+        self._size += 1
+        if not admitted:
+            self.admission_depth += 1
+            self._queued_by_client[client] = self._queued_by_client.get(client, 0) + 1
+
+    def pop(self):
+        """Returns (item, priority) of the next item to run, or None if every waiting client is at its quota."""
+        for offset in range(len(self._turns)):
+            priority = self._turns[(self._turn + offset) % len(self._turns)]
+            clients = self._queues[priority]
+            for client in list(clients):
+                if self.max_in_flight and self._in_flight.get(client, 0) >= self.max_in_flight:
+                    continue
+                items = clients[client]
+                item, ticket, admitted = items.popleft()
+                if items:
+                    clients.move_to_end(client)
+                else:
+                    del clients[client]
+                self._turn = (self._turn + offset + 1) % len(self._turns)
+                self._size -= 1
+                if not admitted:
+                    self.admission_depth -= 1
+                    self._queued_by_client[client] -= 1
+                    if not self._queued_by_client[client]:
+                        del self._queued_by_client[client]
+                if ticket is not None and ticket not in self._tickets:
+                    self._tickets[ticket] = client
+                    self._in_flight[client] = self._in_flight.get(client, 0) + 1
+                return item, priority
+        return None
+
+    def release(self, ticket):
+        """Ends the in-flight count of a dispatched ticket; unknown tickets are ignored."""
+        if ticket not in self._tickets:
+            return False
+        client = self._tickets.pop(ticket)
+        self._in_flight[client] -= 1
+        if not self._in_flight[client]:
+            del self._in_flight[client]
+        return True
+
+    def clear(self):
+        for clients in self._queues.values():
+            clients.clear()
+        self._queued_by_client.clear()
+        self._size = 0
+        self.admission_depth = 0
+
+    def stats(self):
+        return {
+            "queued": {priority: sum(len(items) for items in self._queues[priority].values()) for priority in PRIORITIES},
+            "queued_clients": len({client for clients in self._queues.values() for client in clients}),
+            "in_flight": len(self._tickets),
+            "in_flight_clients": len(self._in_flight),
+        }
+
+
+class WorkerPool:
+    """Fixed number of worker threads fed from a bounded admission queue.
+
+    Submissions are served fairly across clients and priority classes (see
+    FairQueue). Continuations of workflows that were already admitted (see
+    ``resume``) skip the admission limit and are picked up before new
+    submissions.
+    """
+
+    def __init__(self, num_workers, max_queue_size, name="pov-worker", priority_weights=None,
+                 client_max_in_flight=0, client_queue_share=1.0):
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.client_max_queued = max(1, int(max_queue_size * client_queue_share))
+        self.name = name
+        self._pending = FairQueue(priority_weights or {}, client_max_in_flight)
+        self._continuations = deque()
+        self._threads = []
+        self._cond = threading.Condition()
+        self._busy = 0
+        self._closed = False
+        self._stopping = False
+        self.queue_wait = Histogram()
+        self.continuation_wait = Histogram()
+        self.priority_wait = HistogramFamily()
+
+    def _ensure_started(self):
+        # Threads are started on first use so importing the app (e.g. in a
+        # gunicorn master before fork) does not spawn workers.
+        if self._threads:
+            return
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn, *args, client=None, priority="interactive", ticket=None, admitted=False):
+        """Queues ``fn(*args)`` for ``client``.
+
+        ``ticket`` (a task id) keeps the work counted against the client's
+        in-flight quota until ``release``. ``admitted`` work was accepted as
+        part of something already queued and skips the admission limits.
+        """
+        with self._cond:
+            if self._closed:
+                raise PoolClosedError("Worker pool is shutting down.")
+            if not admitted:
+                if self._pending.admission_depth >= self.max_queue_size:
+                    raise QueueFullError(self._pending.admission_depth, self.max_queue_size)
+                if client is not None and self._pending.queued_for(client) >= self.client_max_queued:
+                    raise ClientQuotaError(client, self.client_max_queued)
+            self._ensure_started()
+            self._pending.push((fn, args, {}, time.monotonic()), client, priority, ticket, admitted)
+            self._cond.notify()
+
+    def release(self, ticket):
+        """Marks the work submitted with ``ticket`` as finished, freeing a slot of its client's quota."""
+        with self._cond:
+            if self._pending.release(ticket):
+                self._cond.notify()
+
+    def resume(self, fn, *args, **kwargs):
+        """Schedules the next stage of an already admitted workflow."""
+        with self._cond:
+            self._ensure_started()
+            self._continuations.append((fn, args, kwargs, time.monotonic()))
+            self._cond.notify()
+
+    def queue_depth(self):
+        with self._cond:
+            return self._pending.admission_depth
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.num_workers,
+                "busy_workers": self._busy,
+                "queue_depth": len(self._pending),
+                "continuations": len(self._continuations),
+                "max_queue_size": self.max_queue_size,
+                "scheduling": self._pending.stats(),
+            }
+
+    def idle(self):
+        with self._cond:
+            return not self._busy and not self._pending and not self._continuations
+
+    def close(self):
+        """Refuses new submissions; admitted work, continuations included, still runs."""
+        with self._cond:
+            self._closed = True
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stops accepting work and lets workers drain what is already queued.
+
+        With a ``timeout``, gives up waiting after that many seconds and
+        returns the number of queued items that were not started.
+        """
+        with self._cond:
+            self._closed = True
+            self._stopping = True
+            self._cond.notify_all()
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for thread in self._threads:
+                thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        with self._cond:
+            abandoned = len(self._pending) + len(self._continuations)
+            self._pending.clear()
+            self._continuations.clear()
+            return abandoned
+
+    def _next_item(self):
+        with self._cond:
+            while True:
+                if self._continuations:
+                    fn, args, kwargs, queued_at = self._continuations.popleft()
+                    self.continuation_wait.observe(time.monotonic() - queued_at)
+                    break
+                # Items of clients at their in-flight quota stay queued until release() wakes a worker.
+                scheduled = self._pending.pop() if self._pending else None
+                if scheduled is not None:
+                    (fn, args, kwargs, queued_at), priority = scheduled
+                    self.queue_wait.observe(time.monotonic() - queued_at)
+                    self.priority_wait.labels(priority).observe(time.monotonic() - queued_at)
+                    break
+                if self._stopping:
+                    return None
+                self._cond.wait()
+            self._busy += 1
+            return fn, args, kwargs
+
+    def _worker_loop(self):
+        while True:
+            item = self._next_item()
+            if item is None:
+                return
+            fn, args, kwargs = item
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Unhandled error in {threading.current_thread().name}: {e}")
+            finally:
+                with self._cond:
+                    self._busy -= 1
+
+
+class TokenBucket:
+    """Request rate limit: ``rate`` tokens per second, bursts of up to ``burst``.
+
+    ``reserve`` always takes a token and returns how long the caller must wait
+    before using it, so blocking and asyncio callers can share one bucket and
+    are served in arrival order.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def available(self):
+        with self._lock:
+            return min(self.burst, self._tokens + (time.monotonic() - self._updated) * self.rate)
+
+
+class StageLimiter:
+    """Per-provider governor: caps concurrent calls and, optionally, their request rate.
+
+    Callers wait for both a concurrency slot and a rate token instead of
+    failing, so bursts are smoothed out before they turn into 429s. Limits are
+    per process; divide them by the number of gunicorn workers.
+    """
+
+    def __init__(self, limits, rates=None):
+        self.limits = dict(limits)
+        self._semaphores = {stage: threading.BoundedSemaphore(limit) for stage, limit in limits.items()}
+        self.buckets = {stage: TokenBucket(rate, burst) for stage, (rate, burst) in (rates or {}).items() if rate > 0}
+        self._lock = threading.Lock()
+        self._in_use = dict.fromkeys(limits, 0)
+        self._waiting = dict.fromkeys(limits, 0)
+        self._throttled = dict.fromkeys(limits, 0)
+        self._calls = dict.fromkeys(limits, 0)
+        self.wait_times = {stage: Histogram() for stage in limits}
+
+    @contextmanager
+    def slot(self, stage):
+        semaphore = self._semaphores.get(stage)
+        if semaphore is None:
+            yield
+            return
+        started = self.begin_wait(stage)
+        with semaphore:
+            time.sleep(self.reserve(stage))
+            self.end_wait(stage, started)
+            try:
+                yield
+            finally:
+                self.release(stage)
+
+    # Accounting hooks, also used by the asyncio engine around its own semaphores.
+
+    def begin_wait(self, stage):
+        with self._lock:
+            self._waiting[stage] += 1
+        return time.monotonic()
+
+    def reserve(self, stage):
+        """Takes a rate token for ``stage``; returns the seconds to wait before calling out."""
+        bucket = self.buckets.get(stage)
+        delay = bucket.reserve() if bucket else 0
+        if delay:
+            with self._lock:
+                self._throttled[stage] += 1
+        return delay
+
+    def end_wait(self, stage, started):
+        self.wait_times[stage].observe(time.monotonic() - started)
+        with self._lock:
+            self._waiting[stage] -= 1
+            self._in_use[stage] += 1
+            self._calls[stage] += 1
+
+    def release(self, stage):
+        with self._lock:
+            self._in_use[stage] -= 1
+
+    def stats(self):
+        """Saturation per provider: slots in use and waiting, calls made and calls delayed by the rate limit."""
+        with self._lock:
+            stats = {
+                stage: {
+                    "limit": limit,
+                    "in_use": self._in_use[stage],
+                    "waiting": self._waiting[stage],
+                    "calls": self._calls[stage],
+                    "throttled": self._throttled[stage],
+                }
+                for stage, limit in self.limits.items()
+            }
+        for stage, bucket in self.buckets.items():
+            stats[stage].update(rate=bucket.rate, burst=bucket.burst, tokens=round(bucket.available(), 2))
+        return stats
@@ -0,0 +1,672 @@
+import atexit
+import os
+import threading
+import time
+import uuid
+import json # Ensure json is imported for error details
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from src.integrations import (
+    generate_prompt_with_gpt4,
+    generate_prompts_with_gpt4,
+    generate_image_with_flux,
+    create_video_with_runway,
+    check_runway_video_status,
+    download_runway_video,
+    append_rows_to_google_sheet,
+    send_email_with_gmail,
+    prepare_gmail_service
+)
+from src.credentials_manager import get_credentials
+from src.http_client import close_sessions
+from src.metrics import HistogramFamily
+from src.sheets_sink import SheetsAppendSink, get_sheets_sink_settings
+from src.result_cache import InFlightRegistry, get_result_cache, prompt_cache_key, image_cache_key, video_cache_key
+from src.task_events import task_events
+from src.task_store import FINISHED_STATUSES, LeaseKeeper, get_task_store, get_task_store_settings
+from src.runway_poller import RUNWAY_TERMINAL_STATUSES, RunwayPoller, get_poller_settings, render_times
+from src.stage_graph import StageGraph
+from src.video_store import get_video_store, get_video_store_settings
+from src.webhooks import get_webhook_settings
+from src.worker_pool import PoolClosedError, WorkerPool, StageLimiter, get_worker_settings
+
+worker_settings = get_worker_settings()
+workflow_pool = WorkerPool(worker_settings["workers"], worker_settings["queue_size"],
+                           priority_weights=worker_settings["priority_weights"],
+                           client_max_in_flight=worker_settings["client_max_in_flight"],
+                           client_queue_share=worker_settings["client_queue_share"])
+stage_limiter = StageLimiter(worker_settings["stage_limits"], worker_settings["stage_rates"])
+# Runs workflow stages that can go on next to the one a worker is running itself.
+side_stage_pool = ThreadPoolExecutor(worker_settings["side_stage_workers"], thread_name_prefix="pov-stage")
+sheets_sink = SheetsAppendSink(append_rows_to_google_sheet, **get_sheets_sink_settings())
+in_flight = InFlightRegistry()
+video_store_settings = get_video_store_settings()
+
+# Steps that map to a pipeline stage get their duration recorded per stage.
+STAGE_NAMES = {
+    "GPT-4 Prompt Generation": "gpt4_prompt",
+    "FLUX Image Generation": "flux_image",
+    "RunwayML Video Generation": "runway_submit",
+    "RunwayML Video Processing": "runway_render",
+    "Video Post-processing": "video_postprocess",
+    "Gmail Notification": "gmail",
+}
+STAGE_DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+STEP_END_STATUSES = ("completed", "error", "warning", "submitted", "interrupted")
+stage_durations = HistogramFamily(STAGE_DURATION_BUCKETS)
+task_durations = HistogramFamily(STAGE_DURATION_BUCKETS)
+# task id -> (step name, monotonic start) of the open step, for steps started in this process
+_open_steps = {}
+
+# Task record helpers. Both the threaded workflow below and the asyncio one in
+# async_workflow.py go through these, so task records look the same either way.
+
+def create_task(scene_description, client=None, priority="interactive"):
+    return get_task_store().create(scene_description, client=client, priority=priority)["id"]
+
+def discard_task(task_id):
+    get_task_store().delete(task_id)
+
+def update_task(task_id, **fields):
+    get_task_store().update(task_id, **fields)
+    task_events.publish(task_id)
+
+def start_step(task_id, name, status="processing", **fields):
+    step = {"name": name, "status": status, "timestamp": time.time()}
+    step.update(fields)
+    if status in ("processing", "polling"):
+        _open_steps[task_id] = (name, time.monotonic())
+    get_task_store().append_step(task_id, step)
+    task_events.publish(task_id)
+
+def update_step(task_id, **fields):
+    if fields.get("status") in STEP_END_STATUSES:
+        open_step = _open_steps.pop(task_id, None)
+        if open_step is not None:
+            name, started = open_step
+            duration = time.monotonic() - started
+            fields["duration"] = round(duration, 3)
+            if name in STAGE_NAMES:
+                stage_durations.labels(STAGE_NAMES[name]).observe(duration)
+    get_task_store().update_last_step(task_id, **fields)
+    task_events.publish(task_id)
+
+def record_task_duration(task, status):
+    task_durations.labels(status).observe(time.time() - task["created_at"])
+
+def settle_followers(task_id):
+    """Gives tasks deduplicated onto ``task_id`` the same outcome once it has finished."""
+    followers = in_flight.release(task_id)
+    if not followers:
+        return
+    store = get_task_store()
+    leader = store.get(task_id)
+    for follower_id in followers:
+        if store.version(follower_id) is None:
+            continue # Discarded after it attached, e.g. with a batch that was turned away
+        if leader["status"] == "completed":
+            update_step(follower_id, status="completed")
+            update_task(follower_id, prompt=leader.get("prompt"), image_url=leader.get("image_url"), video_url=leader.get("video_url"))
+            finish_task(follower_id, leader["result"])
+        else:
+            fail_workflow(follower_id, leader["error"])
+
+def hand_off_task(task_id):
+    """Lets go of a task another process took over after a Runway callback.
+
+    That process finishes it, but the tasks deduplicated onto it are only
+    known here. They are restarted on their own from the task's prompt and
+    image, and get the video from the cache if it is stored by then.
+    """
+    print(f"Task {task_id} was taken over by another worker after a Runway callback.")
+    _open_steps.pop(task_id, None)
+    workflow_pool.release(task_id)
+    followers = in_flight.release(task_id)
+    if not followers:
+        return
+    store = get_task_store()
+    leader = store.get(task_id)
+    for follower_id in followers:
+        follower = store.get(follower_id)
+        if follower is None or follower["status"] in FINISHED_STATUSES:
+            continue
+        update_step(follower_id, status="interrupted")
+        workflow_pool.resume(run_pov_workflow, follower_id, follower["description"], leader.get("prompt"), leader.get("image_url"))
+
+def fail_workflow(task_id, error_str):
+    update_task(task_id, status="error", error=error_str)
+    task = get_task_store().get(task_id)
+    record_task_duration(task, "error")
+    # Ensure the last processing/polling step is marked as error
+    steps = task["steps"]
+    if steps:
+        if steps[-1]["status"] in ["processing", "polling", "submitted"]:
+            update_step(task_id, status="error", message=error_str)
+        else: # If last step was already completed or errored, add a new error step
+            start_step(task_id, "Workflow Error", status="error", message=error_str)
+    else: # No steps initiated yet
+        start_step(task_id, "Workflow Initialization Error", status="error", message=error_str)
+    workflow_pool.release(task_id)
+    settle_followers(task_id)
+
+def begin_workflow(task_id, credentials):
+    """Marks the task as running and checks credentials; returns False if it cannot proceed."""
+    update_task(task_id, status="processing")
+    start_step(task_id, "Starting workflow", status="completed")
+    if not all([credentials.get("openai"), credentials.get("runwayml")]):
+        error_msg = "Missing API credentials for OpenAI or RunwayML."
+        update_task(task_id, status="error", error=error_msg)
+        start_step(task_id, "Credential Check", status="error", message=error_msg)
+        workflow_pool.release(task_id)
+        settle_followers(task_id)
+        return False
+    return True
+
+def extract_video_url(status_response):
+    """Returns the video URL of a finished Runway task or raises with the provider's reason."""
+    if status_response.get("status") == "failed":
+        error_message = status_response.get('error_message', status_response.get('error', 'Unknown RunwayML error'))
+        raise Exception(f"RunwayML Video Generation Failed: {error_message} - Full Response: {json.dumps(status_response)}")
+
+    video_url = status_response.get("outputs", [{}])[0].get("video") # Adjusted based on typical RunwayML Gen-2 response
+    if not video_url:
+        video_url = status_response.get("url") # Fallback for older or different formats
+    if not video_url:
+        raw_output = status_response.get("output") # Another fallback
+        if isinstance(raw_output, str) and raw_output.startswith("http"):
+            video_url = raw_output
+    if not video_url:
+        # If status is succeeded but no URL, log the response for debugging
+        raise Exception(f"RunwayML Succeeded but no video URL found. Response: {json.dumps(status_response)}")
+    return video_url
+
+def should_update_sheet(credentials):
+    return bool(credentials.get("google_spreadsheet_id") and os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"))
+
+def should_send_email(credentials):
+    return bool(credentials.get("gmail_recipient") and os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"))
+
+def build_sheet_row(scene_description, detailed_prompt, image_url, video_url):
+    return [scene_description, detailed_prompt, image_url, video_url, "Completed", time.ctime()]
+
+def build_notification_email(scene_description, detailed_prompt, image_url, video_url):
+    email_subject = f"POV Video Generated: {scene_description[:30]}..."
+    email_body = f"Your POV video for the scene '{scene_description}' has been generated.\n\nPrompt: {detailed_prompt}\nImage URL: {image_url}\nVideo URL: {video_url}"
+    return email_subject, email_body
+
+def queue_sheet_row(task_id, credentials, scene_description, detailed_prompt, image_url, video_url):
+    # Rows are appended in batches by sheets_sink, so the workflow does not wait on Sheets.
+    start_step(task_id, "Google Sheets Update", status="queued")
+    sheets_sink.add(
+        credentials["google_spreadsheet_id"],
+        "Sheet1",
+        build_sheet_row(scene_description, detailed_prompt, image_url, video_url)
+    )
+
+def record_notification_result(task_id, response, label):
+    if isinstance(response, dict) and "error" in response:
+        update_step(task_id, status="warning", message=f"{label} Error: {response['error']}")
+    else:
+        update_step(task_id, status="completed")
+
+def complete_stage(task_id, output, cached=False):
+    if cached:
+        update_step(task_id, status="completed", output=output, cached=True)
+    else:
+        update_step(task_id, status="completed", output=output)
+
+def record_derived_videos(task_id, derived):
+    store = get_video_store()
+    fields = {
+        "poster_url": store.url_for(derived["poster"]) if derived["poster"] else None,
+        "renditions": {label: store.url_for(rendition) for label, rendition in derived["renditions"].items()},
+    }
+    if derived["errors"]:
+        fields["postprocess_errors"] = derived["errors"]
+    try:
+        update_task(task_id, **fields)
+    except KeyError:
+        pass # Purged or discarded while ffmpeg ran
+
+def keep_stored_video(task_id, video_url, name):
+    """Records a downloaded video on the task and starts making its poster and renditions; returns the URL to hand out.
+
+    The poster and renditions are made in the background, so the workflow does
+    not wait on ffmpeg; they show up as ``poster_url`` and ``renditions`` once
+    ready. When the download failed (``name`` is an error dict) the task goes
+    on with Runway's URL and the step is marked as a warning.
+    """
+    if isinstance(name, dict):
+        update_step(task_id, status="warning", message=name["error"])
+        return video_url
+    store = get_video_store()
+    local_url = store.url_for(name)
+    update_task(task_id, runway_video_url=video_url)
+    update_step(task_id, status="completed", output=local_url)
+    store.derive(name, lambda derived: record_derived_videos(task_id, derived))
+    return local_url
+
+def store_runway_video(task_id, video_url):
+    # Runway's URL expires; with POV_VIDEO_POSTPROCESS the video is kept and served by this backend.
+    start_step(task_id, "Video Post-processing")
+    with stage_limiter.slot("video"):
+        name = download_runway_video(video_url)
+    return keep_stored_video(task_id, video_url, name)
+
+def finish_task(task_id, video_url):
+    update_task(task_id, status="completed", result=video_url)
+    start_step(task_id, "Workflow Finished", status="completed")
+    record_task_duration(get_task_store().get(task_id), "completed")
+    workflow_pool.release(task_id)
+    settle_followers(task_id)
+
+def _check_runway_status_limited(runway_task_id, runway_api_key):
+    with stage_limiter.slot("runway"):
+        return check_runway_video_status(runway_task_id, runway_api_key)
+
+webhook_settings = get_webhook_settings()
+# With completion callbacks enabled, status checks are only a slow sweep for missed callbacks.
+runway_fallback_interval = webhook_settings["fallback_interval"] if webhook_settings["runway_secret"] else None
+runway_poller = RunwayPoller(_check_runway_status_limited, render_model=render_times, fallback_interval=runway_fallback_interval,
+                             **get_poller_settings())
+
+def run_pov_workflow(task_id, scene_description, detailed_prompt=None, image_url=None):
+    try:
+        credentials = get_credentials()
+        if not begin_workflow(task_id, credentials):
+            return
+        openai_api_key = credentials.get("openai")
+        huggingface_api_key = credentials.get("huggingface")
+        runway_api_key = credentials.get("runwayml")
+
+        cache = get_result_cache()
+
+        # 1. Generate Prompt with GPT-4 (already done when the task came in a batch)
+        def prompt_stage():
+            start_step(task_id, "GPT-4 Prompt Generation")
+            if detailed_prompt is not None:
+                complete_stage(task_id, detailed_prompt)
+                prompt = detailed_prompt
+            else:
+                prompt_key = prompt_cache_key(scene_description)
+                prompt = cache.get("prompt", prompt_key)
+                if prompt is None:
+                    with stage_limiter.slot("openai"):
+                        prompt = generate_prompt_with_gpt4(scene_description, openai_api_key)
+                    if isinstance(prompt, dict) and "error" in prompt:
+                        raise Exception(f"GPT-4 Error: {prompt['error']}")
+                    cache.put("prompt", prompt_key, prompt)
+                    complete_stage(task_id, prompt)
+                else:
+                    complete_stage(task_id, prompt, cached=True)
+            update_task(task_id, prompt=prompt)
+            return prompt
+
+        # 2. Generate Image with HuggingFace FLUX (already done when resuming a task)
+        def image_stage(prompt):
+            start_step(task_id, "FLUX Image Generation")
+            if image_url is not None:
+                complete_stage(task_id, image_url)
+                image = image_url
+            else:
+                image_key = image_cache_key(prompt)
+                image = cache.get("image", image_key)
+                if image is None:
+                    with stage_limiter.slot("flux"):
+                        image = generate_image_with_flux(prompt, huggingface_api_key)
+                    if isinstance(image, dict) and "error" in image:
+                        raise Exception(f"FLUX Image Generation Error: {image['error']}")
+                    cache.put("image", image_key, image)
+                    complete_stage(task_id, image)
+                else:
+                    complete_stage(task_id, image, cached=True)
+            update_task(task_id, image_url=image)
+            return image
+
+        # 3. Create Video with RunwayML
+        def video_stage(prompt, image):
+            start_step(task_id, "RunwayML Video Generation")
+            video_url = cache.get("video", video_cache_key(image, prompt))
+            if video_url is not None:
+                complete_stage(task_id, video_url, cached=True)
+                update_task(task_id, video_url=video_url)
+                notify_and_finish(task_id, credentials, scene_description, prompt, image, video_url)
+                return
+            with stage_limiter.slot("runway"):
+                runway_task_obj = create_video_with_runway(image, prompt, runway_api_key)
+            if isinstance(runway_task_obj, dict) and "error" in runway_task_obj:
+                # The error from create_video_with_runway should now be more detailed
+                raise Exception(f"RunwayML Video Creation Error: {runway_task_obj['error']}")
+            runway_task_id = runway_task_obj.get("id") or runway_task_obj.get("uuid")
+            if not runway_task_id:
+                raise Exception(f"RunwayML Video Creation did not return a task ID. Response: {json.dumps(runway_task_obj)}")
+            runway_submitted_at = time.time()
+            update_step(task_id, status="submitted", runway_task_id=runway_task_id)
+            update_task(task_id, runway_task_id=runway_task_id, runway_submitted_at=runway_submitted_at)
+
+            # 4. Check RunwayML Video Status (Polling)
+            start_step(task_id, "RunwayML Video Processing", status="polling")
+            watch_runway_task(task_id, scene_description, prompt, image, runway_task_id, runway_api_key, runway_submitted_at)
+
+        if should_send_email(credentials):
+            # Build the Gmail client while the video is made, not after it; nothing waits for this.
+            side_stage_pool.submit(prepare_gmail_service)
+        # Each stage needs the one before, so they run in turn on this worker;
+        # batches overlap their prompts with the tasks' images (see run_pov_batch).
+        prompt = prompt_stage()
+        video_stage(prompt, image_stage(prompt))
+
+    except Exception as e:
+        fail_workflow(task_id, str(e))
+
+def watch_runway_task(task_id, scene_description, detailed_prompt, image_url, runway_task_id, runway_api_key, submitted_at=None):
+    # The shared poller owns the task from here on; the calling worker is
+    # released and finish_pov_workflow is resumed on the pool once Runway is done.
+    last_status = [None]
+
+    def record_runway_status(current_runway_status):
+        # Only changes are written; most checks see the same status again.
+        if current_runway_status != last_status[0]:
+            last_status[0] = current_runway_status
+            update_step(task_id, current_runway_status=current_runway_status) # Log current status
+
+    runway_future = runway_poller.watch(runway_task_id, runway_api_key, on_update=record_runway_status, submitted_at=submitted_at)
+    runway_future.add_done_callback(
+        lambda future: workflow_pool.resume(finish_pov_workflow, task_id, scene_description, detailed_prompt, image_url, future)
+    )
+
+def finish_pov_workflow(task_id, scene_description, detailed_prompt, image_url, runway_future):
+    try:
+        if not get_task_store().hold(task_id):
+            hand_off_task(task_id)
+            return
+        update_task(task_id, runway_result_at=time.time())
+        credentials = get_credentials()
+        video_url = extract_video_url(runway_future.result())
+        update_step(task_id, status="completed", output=video_url)
+        if video_store_settings["enabled"]:
+            video_url = store_runway_video(task_id, video_url)
+        get_result_cache().put("video", video_cache_key(image_url, detailed_prompt), video_url)
+        update_task(task_id, video_url=video_url)
+        notify_and_finish(task_id, credentials, scene_description, detailed_prompt, image_url, video_url)
+
+    except Exception as e:
+        fail_workflow(task_id, str(e))
+
+def notify_and_finish(task_id, credentials, scene_description, detailed_prompt, image_url, video_url):
+    # 5. Add to Google Sheets
+    if should_update_sheet(credentials):
+        queue_sheet_row(task_id, credentials, scene_description, detailed_prompt, image_url, video_url)
+
+    # 6. Send Email with Gmail
+    if should_send_email(credentials):
+        start_step(task_id, "Gmail Notification")
+        email_subject, email_body = build_notification_email(scene_description, detailed_prompt, image_url, video_url)
+        email_response = send_email_with_gmail(
+            credentials["gmail_recipient"],
+            email_subject,
+            email_body
+        )
+        record_notification_result(task_id, email_response, "Gmail")
+
+    finish_task(task_id, video_url)
+
+def resume_pov_workflow(task):
+    """Continues an unfinished task adopted after a restart from its last checkpoint.
+
+    Checkpoints are the task's ``prompt``, ``image_url``, ``runway_task_id`` and
+    ``video_url`` fields, so completed stages are not paid for twice: a task
+    that already has a Runway id is only watched again. Resumed tasks run on
+    the threaded pool whatever the configured engine.
+    """
+    task_id = task["id"]
+    steps = task.get("steps") or []
+    if steps and steps[-1]["status"] in ["processing", "polling", "submitted", "queued"]:
+        update_step(task_id, status="interrupted")
+    start_step(task_id, "Resumed after restart", status="completed")
+    scene_description = task["description"]
+    detailed_prompt = task.get("prompt")
+    image_url = task.get("image_url")
+
+    if task.get("video_url"):
+        workflow_pool.resume(resume_notifications, task_id, scene_description, detailed_prompt, image_url, task["video_url"])
+    elif task.get("runway_task_id"):
+        update_task(task_id, status="processing")
+        start_step(task_id, "RunwayML Video Processing", status="polling", runway_task_id=task["runway_task_id"])
+        watch_runway_task(task_id, scene_description, detailed_prompt, image_url, task["runway_task_id"], get_credentials().get("runwayml"),
+                          task.get("runway_submitted_at"))
+    else:
+        workflow_pool.resume(run_pov_workflow, task_id, scene_description, detailed_prompt, image_url)
+
+def handle_runway_callback(event):
+    """Advances the task of a Runway completion callback (the Runway task object, with ``id`` and ``status``).
+
+    Returns what happened: "delivered" to the poller of this process,
+    "resumed" after taking over a task owned by another (or a dead) worker,
+    "owned" when this process or a live owner will pick the result up,
+    "ignored" for non-final events and for tasks that are finished or whose
+    result a workflow has already taken, or "unknown" when no task has this
+    Runway id.
+    """
+    runway_task_id = event.get("id")
+    if event.get("status") not in RUNWAY_TERMINAL_STATUSES:
+        return "ignored"
+    if runway_poller.deliver(runway_task_id, event):
+        return "delivered"
+    if worker_settings["engine"] == "asyncio":
+        from src.async_workflow import deliver_runway_callback
+        if deliver_runway_callback(runway_task_id, event):
+            return "delivered"
+    store = get_task_store()
+    task = store.find_by_runway_task_id(runway_task_id)
+    if task is None:
+        return "unknown"
+    if task["status"] in FINISHED_STATUSES or task.get("video_url") or task.get("runway_result_at"):
+        # Repeated deliveries of a result a workflow has already picked up
+        return "ignored"
+    task = store.take_over(task["id"])
+    if task is None:
+        return "owned"
+    if task.get("runway_submitted_at") and event["status"] == "succeeded":
+        render_times.observe(time.time() - task["runway_submitted_at"])
+    runway_future = Future()
+    runway_future.set_result(event)
+    update_step(task["id"], current_runway_status=event["status"])
+    workflow_pool.resume(finish_pov_workflow, task["id"], task["description"], task.get("prompt"), task.get("image_url"), runway_future)
+    return "resumed"
+
+def resume_notifications(task_id, scene_description, detailed_prompt, image_url, video_url):
+    try:
+        notify_and_finish(task_id, get_credentials(), scene_description, detailed_prompt, image_url, video_url)
+    except Exception as e:
+        fail_workflow(task_id, str(e))
+
+_lease_settings = get_task_store_settings()
+lease_keeper = LeaseKeeper(resume_pov_workflow, _lease_settings["lease_ttl"], _lease_settings["heartbeat_interval"])
+
+def attach_to_in_flight(task_id, scene_description):
+    """Attaches the task to a running pipeline for the same scene; returns False if it has to run itself.
+
+    Only done while the result cache is enabled. The attached task finishes
+    together with the one it follows (see settle_followers).
+    """
+    if not get_result_cache().enabled:
+        return False
+    leader_id = in_flight.claim(prompt_cache_key(scene_description), task_id)
+    if leader_id is None:
+        return False
+    update_task(task_id, status="processing", deduplicated_from=leader_id)
+    start_step(task_id, "Attached to in-flight task", leader_id=leader_id)
+    return True
+
+def abandon_followers(task_id):
+    for follower_id in in_flight.release(task_id):
+        fail_workflow(follower_id, "The deduplicated task could not be admitted, try again later.")
+
+def submit_workflow(task_id, scene_description, client=None, priority="interactive"):
+    """Hands a new task to the configured engine; raises QueueFullError/ClientQuotaError/PoolClosedError when it cannot be admitted."""
+    if attach_to_in_flight(task_id, scene_description):
+        return
+    try:
+        if worker_settings["engine"] == "asyncio":
+            from src.async_workflow import get_async_engine, run_pov_workflow_async
+            get_async_engine().submit(run_pov_workflow_async, task_id, scene_description, client=client)
+        else:
+            workflow_pool.submit(run_pov_workflow, task_id, scene_description, client=client, priority=priority, ticket=task_id)
+    except Exception:
+        abandon_followers(task_id)
+        raise
+
+def create_batch(scene_descriptions, client=None, priority="bulk"):
+    """Creates one task per scene under a new batch id; returns (batch_id, task_ids)."""
+    batch_id = uuid.uuid4().hex
+    task_ids = [get_task_store().create(scene_description, batch_id=batch_id, client=client, priority=priority)["id"]
+                for scene_description in scene_descriptions]
+    return batch_id, task_ids
+
+def submit_batch(batch_id, task_ids, scene_descriptions, client=None, priority="bulk"):
+    """Admits a whole batch as one queue item; raises like submit_workflow.
+
+    Once its prompts are expanded, the batch's tasks are queued as already
+    admitted work of ``client``, so they take turns with other clients' work.
+    """
+    items = [(task_id, scene_description) for task_id, scene_description in zip(task_ids, scene_descriptions)
+             if not attach_to_in_flight(task_id, scene_description)]
+    try:
+        workflow_pool.submit(run_pov_batch, batch_id, items, client, priority, client=client, priority=priority)
+    except Exception:
+        # The caller discards the whole batch, so its followers must not be settled later.
+        leaders = {task_id for task_id, _ in items}
+        for task_id in task_ids:
+            if task_id not in leaders:
+                in_flight.detach(task_id)
+        for task_id in leaders:
+            abandon_followers(task_id)
+        raise
+
+def expand_batch_prompts(scene_descriptions, openai_api_key, on_prompt=None):
+    """Returns one prompt (or None) per scene, packing cache misses into chunked GPT-4 calls.
+
+    The chunks are requested concurrently. ``on_prompt(index, prompt)`` is
+    called for each prompt as soon as it is known, while the rest of its
+    chunk is still streaming.
+    """
+    cache = get_result_cache()
+    prompts = [cache.get("prompt", prompt_cache_key(scene_description)) for scene_description in scene_descriptions]
+    missing = [index for index, prompt in enumerate(prompts) if prompt is None]
+    if on_prompt:
+        for index, prompt in enumerate(prompts):
+            if prompt is not None:
+                on_prompt(index, prompt)
+
+    def expand_chunk(chunk):
+        def on_chunk_prompt(position, prompt):
+            if on_prompt:
+                on_prompt(chunk[position], prompt)
+        with stage_limiter.slot("openai"):
+            expanded = generate_prompts_with_gpt4([scene_descriptions[index] for index in chunk], openai_api_key, on_chunk_prompt)
+        if isinstance(expanded, dict) and "error" in expanded:
+            # Leave these scenes to the per-task GPT-4 call in run_pov_workflow.
+            print(f"Batch prompt expansion failed, falling back to one call per scene: {expanded['error']}")
+            return
+        for index, prompt in zip(chunk, expanded):
+            prompts[index] = prompt
+            cache.put("prompt", prompt_cache_key(scene_descriptions[index]), prompt)
+
+    chunk_size = worker_settings["batch_prompt_chunk"]
+    graph = StageGraph()
+    for start in range(0, len(missing), chunk_size):
+        graph.add(f"chunk-{start}", expand_chunk, missing[start:start + chunk_size])
+    graph.run(side_stage_pool)
+    return prompts
+
+def run_pov_batch(batch_id, items, client=None, priority="bulk"):
+    """Expands the batch's prompts and queues each task as soon as its prompt is ready.
+
+    Scenes whose prompt could not be expanded are queued without one and get
+    it from their own GPT-4 call.
+    """
+    dispatched = set()
+    dispatch_lock = threading.Lock()
+
+    def dispatch(index, detailed_prompt):
+        with dispatch_lock:
+            if index in dispatched:
+                return
+            dispatched.add(index)
+        task_id, scene_description = items[index]
+        try:
+            if worker_settings["engine"] == "asyncio":
+                from src.async_workflow import get_async_engine, run_pov_workflow_async
+                get_async_engine().submit(run_pov_workflow_async, task_id, scene_description, detailed_prompt, client=client, admitted=True)
+            else:
+                workflow_pool.submit(run_pov_workflow, task_id, scene_description, detailed_prompt,
+                                     client=client, priority=priority, ticket=task_id, admitted=True)
+        except PoolClosedError:
+            pass # Shutting down: the task stays pending and is resumed by the next process.
+        except Exception as e:
+            fail_workflow(task_id, str(e))
+
+    prompts = [None] * len(items)
+    try:
+        credentials = get_credentials()
+        if credentials.get("openai"):
+            prompts = expand_batch_prompts([scene_description for _, scene_description in items], credentials["openai"], dispatch)
+    except Exception as e:
+        print(f"Batch {batch_id} prompt expansion failed: {e}")
+    # Prompts that were not streamed (e.g. with POV_GPT4_STREAM=false) are handed over here.
+    for index in range(len(items)):
+        dispatch(index, prompts[index])
+
+_shutdown_lock = threading.Lock()
+_shut_down = False
+
+def begin_shutdown():
+    """Stops admitting workflows and ends open task streams; running workflows carry on."""
+    workflow_pool.close()
+    task_events.close()
+    if worker_settings["engine"] == "asyncio":
+        from src.async_workflow import get_async_engine
+        get_async_engine().close()
+
+def shutdown_workflows(timeout=None):
+    """Drains this process's workflows before it exits.
+
+    Running workflows get up to ``timeout`` seconds (POV_SHUTDOWN_TIMEOUT) to
+    finish. Anything still unfinished then has its lease released, so
+    another worker resumes it from its last checkpoint right away.
+    """
+    global _shut_down
+    with _shutdown_lock:
+        if _shut_down:
+            return
+        _shut_down = True
+    if timeout is None:
+        timeout = worker_settings["shutdown_timeout"]
+    deadline = time.monotonic() + timeout
+    begin_shutdown()
+    lease_keeper.stop()
+
+    engine = None
+    if worker_settings["engine"] == "asyncio":
+        from src.async_workflow import get_async_engine
+        engine = get_async_engine()
+    while time.monotonic() < deadline:
+        if workflow_pool.idle() and runway_poller.in_flight() == 0 and (engine is None or engine.stats()["in_flight"] == 0):
+            break
+        time.sleep(0.5)
+
+    runway_poller.stop()
+    abandoned = workflow_pool.shutdown(timeout=max(0, deadline - time.monotonic()))
+    side_stage_pool.shutdown(wait=False, cancel_futures=True)
+    if video_store_settings["enabled"]:
+        get_video_store().close()
+    if engine is not None:
+        engine.shutdown()
+    sheets_sink.shutdown()
+    get_task_store().release_leases()
+    close_sessions()
+    if abandoned or runway_poller.in_flight():
+        print(f"Shutdown handed off unfinished workflows ({abandoned} queued, {runway_poller.in_flight()} rendering).")
+
+atexit.register(shutdown_workflows)
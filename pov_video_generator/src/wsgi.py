@@ -0,0 +1,4 @@
+"""WSGI entry point for production servers: ``gunicorn -c gunicorn.conf.py src.wsgi:app``."""
+from src.main import create_app
+
+app = create_app()
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.task import db
+from src.result_cache import get_result_cache, set_result_cache
+from src.task_store import get_task_store, set_task_store
+
+
+@pytest.fixture
+def app(tmp_path):
+    """A Flask app bound to a fresh SQLite database."""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'tasks.db'}"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"check_same_thread": False}}
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """A test client of the backend app on a fresh SQLite database."""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv("POV_RESUME_TASKS", "false")
+    from src.json_responses import SnapshotCache
+    from src.main import create_app
+    # Task ids start over with every database, so encodings cached by earlier tests must not be served.
+    monkeypatch.setattr("src.main.snapshots", SnapshotCache(1000))
+    monkeypatch.setattr("src.main.task_pages", SnapshotCache(64))
+    previous = get_task_store(), get_result_cache()
+    app = create_app()
+    yield app.test_client()
+    set_task_store(previous[0])
+    set_result_cache(previous[1])
@@ -0,0 +1,36 @@
+from src import integrations, workflow
+
+
+class RecordingPool:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted.append(args)
+
+
+def test_batch_tasks_get_prompts_that_were_not_streamed(monkeypatch):
+    calls = []
+
+    def generate_prompts(scenes, api_key, on_prompt=None):
+        # A non-streamed completion: no per-prompt callbacks, only the result.
+        calls.append(scenes)
+        return [f"detailed {scene}" for scene in scenes]
+
+    pool = RecordingPool()
+    monkeypatch.setattr(workflow, "generate_prompts_with_gpt4", generate_prompts)
+    monkeypatch.setattr(workflow, "get_credentials", lambda: {"openai": "key"})
+    monkeypatch.setattr(workflow, "workflow_pool", pool)
+    monkeypatch.setitem(workflow.worker_settings, "engine", "threads")
+    items = [(1, "beach"), (2, "forest"), (3, "city")]
+    workflow.run_pov_batch("batch", items)
+    assert calls == [["beach", "forest", "city"]]
+    assert sorted(pool.submitted) == [(1, "beach", "detailed beach"), (2, "forest", "detailed forest"), (3, "city", "detailed city")]
+
+
+def test_only_batch_prompts_are_streamed(monkeypatch):
+    monkeypatch.setattr(integrations, "GPT4_STREAM", True)
+    _, single = integrations.build_gpt4_prompt_request("beach", "key")
+    _, batch = integrations.build_gpt4_batch_prompt_request(["beach", "forest"], "key")
+    assert "stream" not in single
+    assert batch["stream"]
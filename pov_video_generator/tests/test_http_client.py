@@ -0,0 +1,9 @@
+from src import http_client
+
+
+def test_provider_sessions_cap_backoff_and_spare_posts():
+    retry = http_client.get_session("test-provider").get_adapter("https://example.com").max_retries
+    assert retry.backoff_max == http_client.get_http_settings()["max_backoff"]
+    assert retry.is_retry("GET", 503)
+    assert retry.is_retry("POST", 429)
+    assert not retry.is_retry("POST", 503)
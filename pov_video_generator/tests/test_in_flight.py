@@ -0,0 +1,103 @@
+import pytest
+
+from src import workflow
+from src.result_cache import ResultCache, get_result_cache, set_result_cache
+from src.task_store import MemoryTaskStore, get_task_store, set_task_store
+from src.worker_pool import QueueFullError
+
+
+class FullPool:
+    def submit(self, fn, *args, **kwargs):
+        raise QueueFullError(1, 1)
+
+    def release(self, ticket):
+        return False
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """A memory task store with deduplication on, and a fresh in-flight registry."""
+    previous = get_task_store(), get_result_cache()
+    set_task_store(MemoryTaskStore())
+    set_result_cache(ResultCache(enabled=True))
+    monkeypatch.setattr(workflow, "in_flight", workflow.InFlightRegistry())
+    yield get_task_store()
+    set_task_store(previous[0])
+    set_result_cache(previous[1])
+
+
+def test_rejected_batch_leaves_no_followers_behind(store, monkeypatch):
+    monkeypatch.setattr(workflow, "workflow_pool", FullPool())
+    leader = workflow.create_task("a beach at dawn")
+    assert not workflow.attach_to_in_flight(leader, "a beach at dawn")
+    scenes = ["A beach at  dawn", "a forest"]
+    batch_id, task_ids = workflow.create_batch(scenes)
+    with pytest.raises(QueueFullError):
+        workflow.submit_batch(batch_id, task_ids, scenes)
+    for task_id in task_ids:
+        workflow.discard_task(task_id)
+
+    workflow.finish_task(leader, "https://videos.example/a.mp4")
+    task = store.get(leader)
+    assert task["status"] == "completed" and task["error"] is None
+    assert workflow.in_flight.release(leader) == []
+
+
+def attached_pair(scene="a beach at dawn"):
+    leader = workflow.create_task(scene)
+    assert not workflow.attach_to_in_flight(leader, scene)
+    follower = workflow.create_task(scene.upper())
+    assert workflow.attach_to_in_flight(follower, scene.upper())
+    return leader, follower
+
+
+def test_identical_scene_attaches_to_the_running_task(store):
+    leader, follower = attached_pair()
+    task = store.get(follower)
+    assert task["status"] == "processing" and task["deduplicated_from"] == leader
+    assert task["steps"][-1]["name"] == "Attached to in-flight task"
+    assert not workflow.attach_to_in_flight(workflow.create_task("a forest"), "a forest")
+
+
+def test_follower_finishes_with_its_leader(store):
+    leader, follower = attached_pair()
+    workflow.update_task(leader, prompt="p", image_url="https://images.example/a.png", video_url="https://videos.example/a.mp4")
+    workflow.finish_task(leader, "https://videos.example/a.mp4")
+    task = store.get(follower)
+    assert task["status"] == "completed" and task["result"] == "https://videos.example/a.mp4"
+    assert (task["prompt"], task["video_url"]) == ("p", "https://videos.example/a.mp4")
+    assert [step["status"] for step in task["steps"]][-2:] == ["completed", "completed"]
+    # The scene is free again: the next identical request runs on its own.
+    assert not workflow.attach_to_in_flight(workflow.create_task("a beach at dawn"), "a beach at dawn")
+
+
+def test_follower_fails_with_its_leader(store):
+    leader, follower = attached_pair()
+    workflow.fail_workflow(leader, "FLUX Image Generation Error: down")
+    task = store.get(follower)
+    assert task["status"] == "error" and task["error"] == "FLUX Image Generation Error: down"
+
+
+def test_no_deduplication_with_the_cache_disabled(store):
+    set_result_cache(ResultCache(enabled=False))
+    workflow.create_task("scene")
+    assert not workflow.attach_to_in_flight(workflow.create_task("scene"), "scene")
+    assert not workflow.attach_to_in_flight(workflow.create_task("scene"), "scene")
+
+
+def test_rejected_leader_fails_its_followers(store, monkeypatch):
+    followers = []
+
+    class RacedPool(FullPool):
+        def submit(self, fn, *args, **kwargs):
+            # Another request attaches between the claim and the rejection.
+            followers.append(workflow.create_task("scene"))
+            assert workflow.attach_to_in_flight(followers[-1], "scene")
+            super().submit(fn, *args, **kwargs)
+
+    monkeypatch.setattr(workflow, "workflow_pool", RacedPool())
+    monkeypatch.setitem(workflow.worker_settings, "engine", "threads")
+    with pytest.raises(QueueFullError):
+        workflow.submit_workflow(workflow.create_task("scene"), "scene")
+    task = store.get(followers[0])
+    assert task["status"] == "error" and "could not be admitted" in task["error"]
@@ -0,0 +1,40 @@
+import io
+
+import requests
+
+from src import integrations
+
+
+class CountingBody(io.BytesIO):
+    read_bytes = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.read_bytes += len(data)
+        return data
+
+
+def streamed_response(status, content_type, body):
+    response = requests.Response()
+    response.status_code = status
+    response.reason = "Bad Gateway" if status >= 400 else "OK"
+    response.url = integrations.FLUX_ENDPOINT
+    response.headers["Content-Type"] = content_type
+    response.raw = CountingBody(body)
+    return response
+
+
+def test_flux_reads_only_the_start_of_an_unexpected_body(monkeypatch):
+    response = streamed_response(200, "text/html", b"<html>" + b"x" * 5_000_000)
+    monkeypatch.setattr(integrations, "http_request", lambda *args, **kwargs: response)
+    result = integrations.generate_image_with_flux("a prompt", "key")
+    assert result["error"].startswith("FLUX endpoint did not return an image (text/html): <html>xxx")
+    assert response.raw.read_bytes <= integrations.ERROR_BODY_PREVIEW_BYTES
+
+
+def test_flux_error_details_are_bounded(monkeypatch):
+    response = streamed_response(502, "application/json", b'{"error": "' + b"y" * 5_000_000 + b'"}')
+    monkeypatch.setattr(integrations, "http_request", lambda *args, **kwargs: response)
+    result = integrations.generate_image_with_flux("a prompt", "key")
+    assert result["error"].startswith("FLUX API request failed with HTTPError: 502")
+    assert response.raw.read_bytes <= integrations.ERROR_BODY_PREVIEW_BYTES
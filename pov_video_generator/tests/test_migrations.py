@@ -0,0 +1,40 @@
+import sqlite3
+
+from flask import Flask
+
+from src.migrations import upgrade_schema
+from src.models.task import db
+from src.task_store import SqlTaskStore
+
+# The tasks table as the first version of the task store created it
+FIRST_TASKS_TABLE = """
+CREATE TABLE tasks (
+    id INTEGER NOT NULL, status VARCHAR(20) NOT NULL, description TEXT NOT NULL, result TEXT, error TEXT,
+    steps JSON NOT NULL, data JSON NOT NULL, created_at FLOAT NOT NULL, updated_at FLOAT NOT NULL, PRIMARY KEY (id)
+);
+CREATE INDEX ix_tasks_status ON tasks (status);
+CREATE INDEX ix_tasks_status_created_at ON tasks (status, created_at);
+INSERT INTO tasks VALUES (1, 'completed', 'old scene', 'https://videos.example/1.mp4', NULL, '[]', '{"prompt": "p"}', 1.0, 2.0);
+INSERT INTO tasks VALUES (2, 'completed', 'newest scene', NULL, NULL, '[]', '{}', 1.0, 2.0);
+"""
+
+
+def test_tables_of_an_earlier_version_are_upgraded(tmp_path):
+    path = tmp_path / "app.db"
+    with sqlite3.connect(path) as connection:
+        connection.executescript(FIRST_TASKS_TABLE)
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        changes = upgrade_schema(db.engine, db.metadata)
+        assert {"tasks.batch_id", "tasks.owner", "tasks.runway_task_id", "tasks.version", "tasks:autoincrement"} <= set(changes)
+        assert upgrade_schema(db.engine, db.metadata) == []
+
+    store = SqlTaskStore(app)
+    old = store.get(1)
+    assert old["description"] == "old scene" and old["prompt"] == "p" and old["batch_id"] is None
+    store.delete(2)
+    assert store.create("new scene", batch_id="b")["id"] == 3
+    assert [task["id"] for task in store.list_tasks(batch_id="b")] == [3]
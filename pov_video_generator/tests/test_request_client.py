@@ -0,0 +1,28 @@
+import pytest
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from src import main
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+    app.add_url_rule("/who", "who", lambda: main.request_client())
+    return app
+
+
+def test_client_is_the_address_the_proxy_appended(app):
+    client = app.test_client()
+    first = client.get("/who", headers={"X-Forwarded-For": "1.1.1.1, 203.0.113.7"}).text
+    second = client.get("/who", headers={"X-Forwarded-For": "2.2.2.2, 203.0.113.7"}).text
+    assert first == second == "ip:203.0.113.7"
+
+
+def test_only_known_api_keys_identify_a_client(app, monkeypatch):
+    monkeypatch.setattr(main, "CLIENT_API_KEYS", ["partner-key"])
+    client = app.test_client()
+    headers = {"X-Forwarded-For": "203.0.113.7"}
+    assert client.get("/who", headers=dict(headers, **{"X-API-Key": "made-up"})).text == "ip:203.0.113.7"
+    assert client.get("/who", headers=dict(headers, **{"X-API-Key": "partner-key"})).text.startswith("key:")
@@ -0,0 +1,92 @@
+import pytest
+
+from src import workflow
+from src.task_store import MemoryTaskStore, SqlTaskStore, get_task_store, set_task_store
+
+
+def succeeded(runway_task_id):
+    return {"id": runway_task_id, "status": "succeeded", "outputs": [{"video": "https://runway.example/video.mp4"}]}
+
+
+@pytest.fixture
+def stores(app):
+    """The store of a worker that submitted a render, and the one of this process."""
+    previous = get_task_store()
+    other, mine = SqlTaskStore(app), SqlTaskStore(app)
+    set_task_store(mine)
+    yield other, mine
+    set_task_store(previous)
+
+
+def submitted_task(store, runway_task_id="rw-1"):
+    task = store.create("A walk through the rain", prompt="prompt", image_url="https://images.example/a.png")
+    store.update(task["id"], runway_task_id=runway_task_id, status="processing")
+    store.append_step(task["id"], {"name": "RunwayML Video Processing", "status": "polling", "timestamp": 0})
+    return task["id"]
+
+
+def finished_steps(task_id):
+    return [step for step in get_task_store().get(task_id)["steps"] if step["name"] == "Workflow Finished"]
+
+
+def test_take_over_skips_tasks_this_process_owns(stores):
+    other, mine = stores
+    task_id = submitted_task(other)
+    assert other.take_over(task_id) is None
+    assert mine.take_over(task_id)["id"] == task_id
+    assert mine.take_over(task_id) is None
+    assert not other.hold(task_id)
+
+
+def test_memory_store_never_takes_over():
+    store = MemoryTaskStore()
+    task_id = store.create("scene")["id"]
+    assert store.take_over(task_id) is None
+
+
+def test_repeated_callback_before_finish_runs(stores, monkeypatch):
+    other, _ = stores
+    task_id = submitted_task(other)
+    resumed = []
+    monkeypatch.setattr(workflow.workflow_pool, "resume", lambda fn, *args: resumed.append(args))
+    assert workflow.handle_runway_callback(succeeded("rw-1")) == "resumed"
+    assert workflow.handle_runway_callback(succeeded("rw-1")) == "owned"
+    assert len(resumed) == 1
+
+
+def test_repeated_callback_after_finish_is_ignored(stores, monkeypatch):
+    other, _ = stores
+    task_id = submitted_task(other)
+    monkeypatch.setattr(workflow.workflow_pool, "resume", lambda fn, *args: fn(*args))
+    assert workflow.handle_runway_callback(succeeded("rw-1")) == "resumed"
+    assert get_task_store().get(task_id)["status"] == "completed"
+    assert workflow.handle_runway_callback(succeeded("rw-1")) == "ignored"
+    assert len(finished_steps(task_id)) == 1
+
+
+def test_callback_ignored_once_result_is_consumed(stores, monkeypatch):
+    other, _ = stores
+    task_id = submitted_task(other)
+    other.update(task_id, runway_result_at=1.0)
+    monkeypatch.setattr(workflow.workflow_pool, "resume", lambda fn, *args: pytest.fail("finished twice"))
+    assert workflow.handle_runway_callback(succeeded("rw-1")) == "ignored"
+
+
+def test_taken_over_leader_hands_its_followers_back(stores, monkeypatch):
+    other, mine = stores
+    task_id = submitted_task(mine)
+    follower_id = mine.create("A walk through the rain")["id"]
+    mine.append_step(follower_id, {"name": "Attached to in-flight task", "status": "processing", "timestamp": 0})
+    registry = workflow.InFlightRegistry()
+    monkeypatch.setattr(workflow, "in_flight", registry)
+    assert registry.claim("scene", task_id) is None
+    assert registry.claim("scene", follower_id) == task_id
+    assert other.take_over(task_id)["id"] == task_id
+
+    resumed = []
+    monkeypatch.setattr(workflow.workflow_pool, "resume", lambda fn, *args: resumed.append((fn, args)))
+    workflow.finish_pov_workflow(task_id, "A walk through the rain", "prompt", "https://images.example/a.png", None)
+    assert resumed == [(workflow.run_pov_workflow, (follower_id, "A walk through the rain", "prompt", "https://images.example/a.png"))]
+    assert registry.claim("scene", 99) is None
+    assert mine.get(follower_id)["steps"][-1]["status"] == "interrupted"
+    assert mine.get(task_id)["status"] == "processing"
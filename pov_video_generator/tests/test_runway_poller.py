@@ -0,0 +1,33 @@
+from src import runway_poller
+from src.runway_poller import PollSchedule, RenderTimeModel
+
+
+def run_render(model, render_seconds, monkeypatch):
+    """Polls one simulated render on the model's plan; returns the number of checks."""
+    clock = [1000.0]
+    monkeypatch.setattr(runway_poller.time, "time", lambda: clock[0])
+    schedule = PollSchedule(model, None, 10, 30, 1.5, 0, 600)
+    while True:
+        clock[0] += schedule.next_delay()
+        status = "succeeded" if clock[0] - 1000.0 >= render_seconds else "running"
+        schedule.record(status)
+        if status == "succeeded":
+            return schedule.polls
+
+
+def test_plan_learns_that_renders_got_faster(monkeypatch):
+    model = RenderTimeModel(window=20, min_samples=5)
+    for _ in range(20):
+        model.observe(40)
+    for _ in range(30):
+        run_render(model, 10, monkeypatch)
+    assert model.quantile(0.5) < 20
+
+
+def test_plan_keeps_slow_renders(monkeypatch):
+    model = RenderTimeModel(window=20, min_samples=5)
+    for _ in range(20):
+        model.observe(40)
+    for _ in range(30):
+        run_render(model, 40, monkeypatch)
+    assert 30 <= model.quantile(0.5) <= 45
@@ -0,0 +1,130 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from src.sheets_sink import SheetsAppendSink
+
+
+class FakeSheets:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.rows = []
+
+    def __call__(self, spreadsheet_id, range_name, rows):
+        if self.fail:
+            return {"error": "Sheets is down"}
+        self.rows.extend(rows)
+        return {}
+
+
+def spool_rows(path):
+    with open(path) as f:
+        return [json.loads(line)[2] for line in f]
+
+
+def test_rows_are_appended_to_a_spool_per_process(tmp_path):
+    base = str(tmp_path / "sheets.spool")
+    sink = SheetsAppendSink(FakeSheets(fail=True), flush_interval=3600, spool_path=base)
+    sink.add("sheet", "A1", ["one"])
+    sink.add("sheet", "A1", ["two"])
+    assert sink.spool_path == f"{base}.{os.getpid()}"
+    assert spool_rows(sink.spool_path) == [["one"], ["two"]]
+    assert not os.path.exists(base)
+
+
+def test_flush_rewrites_the_spool_without_sent_rows(tmp_path):
+    sheets = FakeSheets()
+    sink = SheetsAppendSink(sheets, flush_interval=3600, spool_path=str(tmp_path / "sheets.spool"))
+    sink.add("sheet", "A1", ["one"])
+    assert sink.flush()
+    sink.add("sheet", "A1", ["two"])
+    assert sheets.rows == [["one"]]
+    assert spool_rows(sink.spool_path) == [["two"]]
+
+
+def test_rows_beyond_the_limit_wait_in_the_spool(tmp_path):
+    sheets = FakeSheets(fail=True)
+    sink = SheetsAppendSink(sheets, flush_interval=3600, max_pending=2, spool_path=str(tmp_path / "sheets.spool"))
+    for value in ("one", "two", "three", "four", "five"):
+        sink.add("sheet", "A1", [value])
+    assert sink.stats() == {"pending": 5, "spilled": 3, "consecutive_failures": 0, "dropped": 0}
+    assert not sink.flush()
+    assert spool_rows(sink.spool_path) == [["one"], ["two"], ["three"], ["four"], ["five"]]
+    sheets.fail = False
+    assert sink.flush()
+    assert sheets.rows == [["one"], ["two"]]
+    assert sink.stats()["spilled"] == 1
+    sink.add("sheet", "A1", ["six"])
+    while sink.pending():
+        assert sink.flush()
+    assert sheets.rows == [["one"], ["two"], ["three"], ["four"], ["five"], ["six"]]
+    assert spool_rows(sink.spool_path) == []
+
+
+def test_buffer_without_a_spool_drops_the_oldest_rows(tmp_path):
+    sheets = FakeSheets()
+    sink = SheetsAppendSink(sheets, flush_interval=3600, max_pending=2)
+    for value in ("one", "two", "three"):
+        sink.add("sheet", "A1", [value])
+    assert sink.stats()["dropped"] == 1
+    assert sink.flush()
+    assert sheets.rows == [["two"], ["three"]]
+
+
+def test_adopting_a_spool_beyond_the_limit_keeps_every_row(tmp_path):
+    orphan = tmp_path / "sheets.spool.999999"
+    orphan.write_text("".join(json.dumps(["sheet", "A1", [str(n)]]) + "\n" for n in range(5)))
+    sheets = FakeSheets()
+    sink = SheetsAppendSink(sheets, flush_interval=3600, max_pending=2, spool_path=str(tmp_path / "sheets.spool"))
+    assert sink.stats()["spilled"] == 3
+    while sink.pending():
+        assert sink.flush()
+    assert sheets.rows == [[str(n)] for n in range(5)]
+
+
+def test_spool_of_a_stopped_process_is_taken_over(tmp_path):
+    base = tmp_path / "sheets.spool"
+    orphan = tmp_path / "sheets.spool.999999"
+    orphan.write_text(json.dumps(["sheet", "A1", ["left behind"]]) + "\n")
+    (tmp_path / "sheets.spool.999999.lock").write_text("")
+    (tmp_path / "sheets.spool.999998.claimed").write_text(json.dumps(["sheet", "A1", ["mid takeover"]]) + "\n")
+    sink = SheetsAppendSink(FakeSheets(fail=True), flush_interval=3600, spool_path=str(base))
+    assert sink.pending() == 2
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(sink.spool_path), os.path.basename(sink.spool_path) + ".lock"])
+    assert sorted(spool_rows(sink.spool_path)) == [["left behind"], ["mid takeover"]]
+
+
+def test_empty_spool_is_removed_on_shutdown(tmp_path):
+    sink = SheetsAppendSink(FakeSheets(), flush_interval=3600, spool_path=str(tmp_path / "sheets.spool"))
+    sink.add("sheet", "A1", ["one"])
+    sink.shutdown()
+    assert os.listdir(tmp_path) == []
+
+
+def test_spool_of_a_running_process_is_left_alone(tmp_path):
+    base = str(tmp_path / "sheets.spool")
+    code = (
+        "import sys, time\n"
+        "sys.path.insert(0, sys.argv[2])\n"
+        "from src.sheets_sink import SheetsAppendSink\n"
+        "sink = SheetsAppendSink(lambda *args: {'error': 'down'}, flush_interval=3600, spool_path=sys.argv[1])\n"
+        "sink.add('sheet', 'A1', ['busy'])\n"
+        "print('ready', flush=True)\n"
+        "time.sleep(30)\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    other = subprocess.Popen([sys.executable, "-c", code, base, root], stdout=subprocess.PIPE, text=True)
+    try:
+        assert other.stdout.readline().strip() == "ready"
+        sink = SheetsAppendSink(FakeSheets(fail=True), flush_interval=3600, spool_path=base)
+        assert sink.pending() == 0
+        assert spool_rows(f"{base}.{other.pid}") == [["busy"]]
+        sink.shutdown()
+    finally:
+        other.kill()
+        other.wait()
+    time.sleep(0.05)
+    sink = SheetsAppendSink(FakeSheets(fail=True), flush_interval=3600, spool_path=base)
+    assert sink.pending() == 1
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from src.task_store import MemoryTaskStore, get_task_store, set_task_store
+
+
+@pytest.fixture
+def store(client):
+    set_task_store(MemoryTaskStore(max_steps=2))
+    return get_task_store()
+
+
+def step(name, status="processing"):
+    return {"name": name, "status": status, "timestamp": 0}
+
+
+def read_events(stream, count):
+    """Parses the next ``count`` server-sent events into (event, id, data) tuples."""
+    events = []
+    while len(events) < count:
+        message = next(stream).decode()
+        if message.startswith(":"):
+            continue
+        fields = dict(line.split(": ", 1) for line in message.strip().split("\n"))
+        events.append((fields["event"], fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+def test_stream_sends_only_what_changed(client, store):
+    task_id = store.create("scene")["id"]
+    store.append_step(task_id, step("Starting workflow", "completed"))
+    stream = iter(client.get(f"/api/tasks/{task_id}/events").response)
+    [(event, event_id, snapshot)] = read_events(stream, 1)
+    assert event == "snapshot" and int(event_id) == snapshot["version"]
+
+    store.update(task_id, status="processing")
+    store.append_step(task_id, step("GPT-4 Prompt Generation"))
+    events = read_events(stream, 2)
+    assert events[0][0::2] == ("step", {"index": 1, "step": step("GPT-4 Prompt Generation")})
+    assert events[1][0::2] == ("status", {"status": "processing", "result": None, "error": None})
+
+    # The oldest step drops out of the kept history; indexes still count from the first one.
+    store.update_last_step(task_id, status="completed")
+    store.append_step(task_id, step("FLUX Image Generation"))
+    events = read_events(stream, 2)
+    assert [(event, data["index"], data["step"]["status"]) for event, _, data in events] == [
+        ("step", 1, "completed"), ("step", 2, "processing")]
+
+    store.update(task_id, status="error", error="FLUX down")
+    events = read_events(stream, 2)
+    assert [event for event, _, _ in events] == ["status", "end"]
+    assert events[1][2] == {"status": "error"}
+
+
+def test_stream_of_a_finished_task_ends_after_the_snapshot(client, store):
+    task_id = store.create("scene")["id"]
+    store.update(task_id, status="completed", result="https://videos.example/a.mp4")
+    body = client.get(f"/api/tasks/{task_id}/events").get_data(as_text=True)
+    assert [line for line in body.split("\n") if line.startswith("event:")] == ["event: snapshot", "event: end"]
+    assert client.get("/api/tasks/999/events").status_code == 404
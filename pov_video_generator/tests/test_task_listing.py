@@ -0,0 +1,18 @@
+from src.task_store import get_task_store
+
+
+def test_listing_without_limit_or_cursor_returns_every_task(client, monkeypatch):
+    monkeypatch.setattr("src.main.TASKS_PAGE_SIZE", 2)
+    for i in range(5):
+        get_task_store().create(f"scene {i}")
+    response = client.get("/api/tasks")
+    assert len(response.get_json()) == 5
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_listing_pages_with_limit_and_cursor(client):
+    ids = [get_task_store().create(f"scene {i}")["id"] for i in range(5)]
+    first = client.get("/api/tasks?limit=2")
+    assert [task["id"] for task in first.get_json()] == ids[:2]
+    second = client.get(f"/api/tasks?limit=2&cursor={first.headers['X-Next-Cursor']}")
+    assert [task["id"] for task in second.get_json()] == ids[2:4]
@@ -0,0 +1,85 @@
+import gzip
+import json
+
+import pytest
+
+from src import main
+from src.json_responses import SnapshotCache
+
+from src.task_store import MemoryTaskStore, get_task_store, set_task_store
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, client):
+    if request.param == "memory":
+        set_task_store(MemoryTaskStore())
+    return get_task_store()
+
+
+def test_changes_within_one_clock_tick_get_a_new_etag(client, store, monkeypatch):
+    monkeypatch.setattr("src.task_store.time.time", lambda: 1000.0)
+    task_id = store.create("scene")["id"]
+    first = client.get(f"/api/tasks/{task_id}")
+    store.update(task_id, status="processing")
+    second = client.get(f"/api/tasks/{task_id}")
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.get_json()["status"] == "processing"
+    assert second.get_json()["updated_at"] == first.get_json()["updated_at"]
+
+
+def test_unchanged_task_gets_304(client, store):
+    task_id = store.create("scene")["id"]
+    etag = client.get(f"/api/tasks/{task_id}").headers["ETag"]
+    assert client.get(f"/api/tasks/{task_id}", headers={"If-None-Match": etag}).status_code == 304
+    store.append_step(task_id, {"name": "Starting workflow", "status": "completed", "timestamp": 0})
+    changed = client.get(f"/api/tasks/{task_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.get_json()["steps"][0]["name"] == "Starting workflow"
+
+
+def test_listing_etag_changes_within_one_clock_tick(client, store, monkeypatch):
+    monkeypatch.setattr("src.task_store.time.time", lambda: 1000.0)
+    task_id = store.create("scene")["id"]
+    etag = client.get("/api/tasks").headers["ETag"]
+    store.update(task_id, status="processing")
+    listing = client.get("/api/tasks", headers={"If-None-Match": etag})
+    assert listing.status_code == 200
+    assert listing.get_json()[0]["status"] == "processing"
+
+
+def test_wait_returns_once_the_version_moves(client, store):
+    task_id = store.create("scene")["id"]
+    version = client.get(f"/api/tasks/{task_id}").get_json()["version"]
+    assert client.get(f"/api/tasks/{task_id}/wait?version={version}&timeout=0").status_code == 304
+    store.update(task_id, status="processing")
+    response = client.get(f"/api/tasks/{task_id}/wait?version={version}&timeout=0")
+    assert response.status_code == 200
+    assert response.get_json()["version"] == version + 1
+
+
+def test_snapshot_cache_encodes_a_version_once():
+    cache = SnapshotCache(2)
+    task = {"id": 1, "version": 0, "status": "pending"}
+    first = cache.encode((1, "full"), task)
+    assert cache.encode((1, "full"), dict(task, status="ignored")) is first
+    assert cache.encode((1, "full"), dict(task, version=1)) is not first
+    cache.encode((2, "full"), {"id": 2, "version": 0})
+    cache.encode((3, "full"), {"id": 3, "version": 0})
+    assert cache.get((1, "full"), 1) is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_polling_an_unchanged_task_reuses_its_encoding(client, store):
+    task_id = store.create("scene")["id"]
+    client.get(f"/api/tasks/{task_id}")
+    hits = main.snapshots.stats()["hits"]
+    client.get(f"/api/tasks/{task_id}")
+    assert main.snapshots.stats()["hits"] == hits + 1
+
+
+def test_large_bodies_are_compressed(client, store):
+    task_id = store.create("scene " * 500)["id"]
+    response = client.get(f"/api/tasks/{task_id}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(gzip.decompress(response.data))["description"].startswith("scene scene")
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from src import workflow
+from src.task_store import LeaseKeeper, MemoryTaskStore, SqlTaskStore, get_task_store, set_task_store
+
+
+def test_ids_of_deleted_tasks_are_not_handed_out_again(app):
+    store = SqlTaskStore(app)
+    store.create("first")
+    newest = store.create("second")["id"]
+    store.delete(newest)
+    assert store.create("third")["id"] > newest
+
+
+def test_stale_tasks_are_claimed_by_one_process(app):
+    dead, first, second = SqlTaskStore(app), SqlTaskStore(app), SqlTaskStore(app)
+    stale = dead.create("left behind")["id"]
+    finished = dead.create("done")["id"]
+    dead.update(finished, status="completed")
+    cutoff = time.time() + 1
+    assert [task["id"] for task in first.claim_stale(cutoff)] == [stale]
+    assert second.claim_stale(time.time() - 60) == []
+    assert not dead.hold(stale) and first.hold(stale)
+
+
+def test_released_leases_are_claimed_right_away(app):
+    stopping, other = SqlTaskStore(app), SqlTaskStore(app)
+    task_id = stopping.create("scene")["id"]
+    stopping.heartbeat()
+    assert other.claim_stale(time.time() - 60) == []
+    stopping.release_leases()
+    assert [task["id"] for task in other.claim_stale(time.time() - 60)] == [task_id]
+
+
+def test_lease_keeper_resumes_what_it_claims(app):
+    dead = SqlTaskStore(app)
+    task_id = dead.create("scene")["id"]
+    dead.release_leases()
+    previous = get_task_store()
+    set_task_store(SqlTaskStore(app))
+    resumed = []
+    try:
+        LeaseKeeper(resumed.append, lease_ttl=60).tick()
+    finally:
+        set_task_store(previous)
+    assert [task["id"] for task in resumed] == [task_id]
+
+
+@pytest.fixture
+def resumed(monkeypatch):
+    """Runs resume_pov_workflow on a memory store and records what it hands on."""
+    previous = get_task_store()
+    set_task_store(MemoryTaskStore())
+    calls = []
+    monkeypatch.setattr(workflow.workflow_pool, "resume", lambda fn, *args: calls.append((fn.__name__,) + args))
+    monkeypatch.setattr(workflow, "watch_runway_task", lambda *args: calls.append(("watch_runway_task",) + args))
+    monkeypatch.setattr(workflow, "get_credentials", lambda: {"runwayml": "key"})
+    yield calls
+    set_task_store(previous)
+
+
+def interrupted_task(**fields):
+    store = get_task_store()
+    task_id = store.create("scene", **fields)["id"]
+    store.append_step(task_id, {"name": "FLUX Image Generation", "status": "processing", "timestamp": 0})
+    return store.get(task_id)
+
+
+def test_resume_starts_from_the_last_checkpoint(resumed):
+    task = interrupted_task(prompt="p")
+    workflow.resume_pov_workflow(task)
+    assert resumed == [("run_pov_workflow", task["id"], "scene", "p", None)]
+    steps = get_task_store().get(task["id"])["steps"]
+    assert [(step["name"], step["status"]) for step in steps] == [("FLUX Image Generation", "interrupted"), ("Resumed after restart", "completed")]
+
+
+def test_resume_watches_a_submitted_render_again(resumed):
+    task = interrupted_task(prompt="p", image_url="i", runway_task_id="rw-1", runway_submitted_at=5.0)
+    workflow.resume_pov_workflow(task)
+    assert resumed == [("watch_runway_task", task["id"], "scene", "p", "i", "rw-1", "key", 5.0)]
+
+
+def test_resume_only_notifies_once_the_video_exists(resumed):
+    task = interrupted_task(prompt="p", image_url="i", runway_task_id="rw-1", video_url="v")
+    workflow.resume_pov_workflow(task)
+    assert resumed == [("resume_notifications", task["id"], "scene", "p", "i", "v")]
@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+
+import pytest
+
+from src import workflow
+from src.task_store import MemoryTaskStore, get_task_store, set_task_store
+from src.video_store import LocalVideoStore, parse_renditions, rendition_command
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    """An ffmpeg stand-in that writes its output file once ``release`` exists; fails for 480p renditions."""
+    release = tmp_path / "release"
+    script = tmp_path / "ffmpeg"
+    script.write_text(f"""#!/bin/sh
+while [ ! -e {release} ]; do sleep 0.01; done
+for target; do :; done
+case "$*" in *scale=-2:480*) echo "no encoder" >&2; exit 1;; esac
+echo frame > "$target"
+""")
+    script.chmod(0o755)
+    return str(script), release
+
+
+def derived_of(store, name):
+    done = threading.Event()
+    result = {}
+    store.derive(name, lambda derived: (result.update(derived), done.set()))
+    return done, result
+
+
+def test_put_stream_names_videos_by_content(tmp_path):
+    store = LocalVideoStore(str(tmp_path / "videos"), max_bytes=10)
+    name = store.put_stream([b"abc", b"def"], "video/webm")
+    assert name.endswith(".webm")
+    assert store.put_stream([b"abcdef"], "video/webm") == name
+    with open(store.path_for(name), "rb") as f:
+        assert f.read() == b"abcdef"
+    assert store.path_for("../etc/passwd") is None
+
+
+def test_derive_reports_each_rendition(tmp_path, fake_ffmpeg):
+    ffmpeg, release = fake_ffmpeg
+    store = LocalVideoStore(str(tmp_path / "videos"), ffmpeg=ffmpeg, renditions=[(720, "2500k"), (480, "1000k")])
+    name = store.put_stream([b"video"], "video/mp4")
+    done, derived = derived_of(store, name)
+    assert not done.wait(0.2)
+    release.touch()
+    assert done.wait(5)
+    digest = name.split(".")[0]
+    assert derived["poster"] == f"{digest}-poster.jpg"
+    assert derived["renditions"] == {"720p": f"{digest}-720p.mp4"}
+    assert len(derived["errors"]) == 1 and derived["errors"][0].startswith("480p: ffmpeg exited with 1")
+    assert os.path.exists(store.path_for(f"{digest}-720p.mp4"))
+    assert not [f for f in os.listdir(os.path.dirname(store.path_for(name))) if f.endswith(".part")]
+    store.close()
+
+
+def test_stored_video_is_handed_out_before_renditions_are_made(tmp_path, fake_ffmpeg, monkeypatch):
+    ffmpeg, release = fake_ffmpeg
+    store = LocalVideoStore(str(tmp_path / "videos"), ffmpeg=ffmpeg, renditions=[(720, "2500k")])
+    monkeypatch.setattr(workflow, "get_video_store", lambda: store)
+    previous = get_task_store()
+    set_task_store(MemoryTaskStore())
+    try:
+        task_id = workflow.create_task("scene")
+        workflow.start_step(task_id, "Video Post-processing")
+        name = store.put_stream([b"video"], "video/mp4")
+        local_url = workflow.keep_stored_video(task_id, "https://runway.example/v.mp4", name)
+        assert local_url == f"/api/videos/{name}"
+        task = get_task_store().get(task_id)
+        assert task["steps"][-1]["status"] == "completed" and "renditions" not in task
+        release.touch()
+        for _ in range(500):
+            if "renditions" in get_task_store().get(task_id):
+                break
+            time.sleep(0.01)
+        task = get_task_store().get(task_id)
+        assert task["renditions"] == {"720p": f"/api/videos/{name.split('.')[0]}-720p.mp4"}
+        assert task["poster_url"].endswith("-poster.jpg")
+    finally:
+        set_task_store(previous)
+        store.close()
+
+
+def test_parse_renditions():
+    assert parse_renditions("720:2500k, 480") == [(720, "2500k"), (480, "1000k")]
+    assert parse_renditions("") == []
+
+
+def test_renditions_are_scaled_and_start_fast():
+    command = rendition_command("ffmpeg", "in.mp4", "out.part", 480, "1000k")
+    assert "scale=-2:480" in command and command[command.index("-b:v") + 1] == "1000k"
+    assert command[command.index("-movflags") + 1] == "+faststart"
+
+
+def test_videos_are_served_with_range_support(client, tmp_path, monkeypatch):
+    store = LocalVideoStore(str(tmp_path / "videos"))
+    monkeypatch.setattr("src.main.get_video_store", lambda: store)
+    name = store.put_stream([bytes(range(256)) * 4], "video/mp4")
+    response = client.get(f"/api/videos/{name}", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.data == bytes(range(10, 20))
+    assert response.headers["Content-Range"] == "bytes 10-19/1024"
+    assert client.get(f"/api/videos/{name}").data == bytes(range(256)) * 4
+    assert client.get("/api/videos/not-a-video.mp4").status_code == 404
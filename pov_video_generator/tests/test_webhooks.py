@@ -0,0 +1,19 @@
+from src.webhooks import sign_payload, verify_signature
+
+BODY = b'{"id": "rw-1", "status": "succeeded"}'
+
+
+def test_valid_signature_is_accepted():
+    assert verify_signature("secret", sign_payload("secret", BODY), BODY)
+
+
+def test_wrong_or_old_signatures_are_rejected():
+    assert not verify_signature("other", sign_payload("secret", BODY), BODY)
+    assert not verify_signature("secret", sign_payload("secret", BODY, timestamp=0), BODY)
+    assert not verify_signature("secret", "garbage", BODY)
+
+
+def test_non_ascii_signature_is_rejected_not_raised():
+    timestamp = sign_payload("secret", BODY).split(",")[0]
+    assert not verify_signature("secret", f"{timestamp},v1=é", BODY)
+    assert not verify_signature("secret", f"{timestamp},v1=€", BODY)
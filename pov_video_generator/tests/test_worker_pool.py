@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+
+from src import worker_pool, workflow
+from src.task_store import MemoryTaskStore, get_task_store, set_task_store
+from src.worker_pool import ClientQuotaError, FairQueue, StageLimiter, TokenBucket, WorkerPool
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_fair_queue_holds_clients_at_their_quota():
+    queue = FairQueue({"interactive": 1}, max_in_flight=1)
+    for ticket in ("a1", "a2"):
+        queue.push(ticket, client="a", ticket=ticket)
+    queue.push("b1", client="b", ticket="b1")
+    assert queue.pop() == ("a1", "interactive")
+    assert queue.pop() == ("b1", "interactive")
+    assert queue.pop() is None
+    assert queue.release("a1")
+    assert queue.pop() == ("a2", "interactive")
+    assert not queue.release("unknown")
+
+
+def test_fair_queue_takes_priority_classes_by_weight():
+    queue = FairQueue({"interactive": 2, "bulk": 1})
+    for i in range(3):
+        queue.push(f"bulk{i}", client="batch", priority="bulk")
+        queue.push(f"interactive{i}", client="user", priority="interactive")
+    order = [queue.pop()[0] for _ in range(6)]
+    assert order[:3] == ["interactive0", "interactive1", "bulk0"]
+
+
+def test_worker_pool_rejects_clients_over_their_queue_share():
+    pool = WorkerPool(1, 4, client_queue_share=0.5)
+    gate = threading.Event()
+    pool.submit(gate.wait, client="other")
+    pool.submit(gate.wait, client="a")
+    pool.submit(gate.wait, client="a")
+    with pytest.raises(ClientQuotaError):
+        pool.submit(gate.wait, client="a")
+    gate.set()
+    pool.shutdown()
+
+
+def test_worker_pool_runs_next_item_once_ticket_is_released():
+    pool = WorkerPool(2, 8, client_max_in_flight=1)
+    ran = []
+    for i in range(3):
+        pool.submit(ran.append, i, client="a", ticket=i)
+    wait_until(lambda: ran == [0])
+    time.sleep(0.05)
+    assert ran == [0]
+    pool.release(0)
+    wait_until(lambda: ran == [0, 1])
+    pool.release(1)
+    wait_until(lambda: ran == [0, 1, 2])
+    pool.shutdown()
+
+
+@pytest.fixture
+def memory_store():
+    previous = get_task_store()
+    set_task_store(MemoryTaskStore())
+    yield get_task_store()
+    set_task_store(previous)
+
+
+def test_missing_credentials_release_the_client_slot(memory_store, monkeypatch):
+    pool = WorkerPool(2, 8, client_max_in_flight=1)
+    monkeypatch.setattr(workflow, "workflow_pool", pool)
+    monkeypatch.setattr(workflow, "get_credentials", lambda: {})
+    task_ids = [memory_store.create(f"scene {i}")["id"] for i in range(3)]
+    for i, task_id in enumerate(task_ids):
+        workflow.submit_workflow(task_id, f"scene {i}", client="a")
+    wait_until(lambda: all(memory_store.get(task_id)["status"] == "error" for task_id in task_ids))
+    assert pool.stats()["scheduling"]["in_flight"] == 0
+    pool.shutdown()
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping moves the clock on."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_allows_a_burst_then_spaces_calls(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(worker_pool, "time", clock)
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.reserve() for _ in range(5)] == [0, 0, 0, 0.5, 1.0]
+    clock.now += 1
+    assert bucket.available() == 0
+    assert bucket.reserve() == 0.5
+    clock.now += 10
+    assert bucket.available() == 3
+
+
+def test_stage_limiter_waits_for_rate_tokens(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(worker_pool, "time", clock)
+    limiter = StageLimiter({"openai": 1}, {"openai": (1, 1)})
+    for _ in range(3):
+        with limiter.slot("openai"):
+            pass
+    assert clock.slept == [0, 1.0, 1.0]
+    stats = limiter.stats()["openai"]
+    assert (stats["calls"], stats["throttled"], stats["in_use"]) == (3, 2, 0)
+
+
+def test_stage_limiter_caps_concurrent_calls():
+    limiter = StageLimiter({"flux": 2})
+    gate = threading.Event()
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call():
+        with limiter.slot("flux"):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            gate.wait()
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: limiter.stats()["flux"]["waiting"] == 3)
+    assert limiter.stats()["flux"]["in_use"] == 2
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert limiter.stats()["flux"]["calls"] == 5
+
+
+def test_stage_limiter_passes_unlimited_stages_through():
+    limiter = StageLimiter({"flux": 1})
+    with limiter.slot("gmail"):
+        with limiter.slot("gmail"):
+            pass